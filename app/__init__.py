@@ -1,16 +1,42 @@
 from flask import Flask
 from app.config import Config
-from app.commands.create_admin_user import create_admin
-from app.extensions import db
+from app.commands import COMMANDS, LazyAppGroup
+from app.utils.db_instrumentation import init_db_instrumentation
+from app.utils.engine_profiles import apply_engine_profile, init_engine_profile
+from app.utils.json_provider import init_json_provider
+from app.utils.metrics import init_metrics
+from app.utils.migrations import check_schema
+from app.utils.query_budget import init_query_budget
+from app.utils.request_log import init_request_log
+from app.extensions import db, expiry_sweeper, idempotency_keys, outbox_dispatcher, password_hasher, plan_catalog, principal_cache, read_replica, response_cache
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
     app.config.from_object(Config)
+    if config:
+        app.config.update(config)
+    init_json_provider(app)
+    apply_engine_profile(app)
     db.init_app(app)
+    principal_cache.init_app(app)
+    plan_catalog.init_app(app)
+    expiry_sweeper.init_app(app)
+    password_hasher.init_app(app)
+    read_replica.init_app(app)
+    response_cache.init_app(app)
+    idempotency_keys.init_app(app)
+    outbox_dispatcher.init_app(app)
 
+    # the schema is created and upgraded by "flask db upgrade" at deploy time, workers
+    # only check its version (see app/utils/migrations.py)
     with app.app_context():
-        from . import models
-        db.create_all()
+        for engine in db.engines.values():
+            init_engine_profile(app, engine)
+        check_schema(app)
+        init_db_instrumentation(app, db.engines.values())
+        init_metrics(app, db.engine)
+    init_query_budget(app)
+    init_request_log(app)
 
     from .routes.auth import bp as auth_bp
     app.register_blueprint(auth_bp)
@@ -18,5 +44,11 @@ def create_app():
     from .routes.subscriptions import bp as subscriptions_bp
     app.register_blueprint(subscriptions_bp)
 
-    app.cli.add_command(create_admin)
+    from .routes.analytics import bp as analytics_bp
+    app.register_blueprint(analytics_bp)
+
+    from .routes.metrics import bp as metrics_bp
+    app.register_blueprint(metrics_bp)
+
+    app.cli = LazyAppGroup(lazy_commands=COMMANDS)
     return app
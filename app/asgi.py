@@ -0,0 +1,355 @@
+"""
+async serving mode: the app as an ASGI application, for uvicorn (or any ASGI server)
+
+    uvicorn --factory app.asgi:create_asgi_app --workers 4 --port 5000
+
+GET /api/subscriptions/active, /history and /plans are served by coroutines reading
+through SQLAlchemy's async engine (aiosqlite for SQLite, asyncmy for MySQL), so a worker
+keeps serving while their queries wait on the database, instead of holding a thread per
+request like gunicorn's sync workers. they share the token checks (AuthUtils), the
+queries and bodies (app/routes/subscriptions.py), the principal cache, the response cache,
+the plan catalog and the replica routing with the Flask routes, so the envelopes, ETags
+and JWT semantics are the same.
+
+every other request runs the Flask app on a pool of ASGI_WSGI_THREADS threads, streamed
+responses (the exports) included.
+"""
+import asyncio
+import io
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qsl
+from sqlalchemy.engine import make_url
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_etags
+from app import create_app
+from app.extensions import plan_catalog, principal_cache, read_replica, response_cache
+from app.routes.subscriptions import active_body, active_query, history_body, history_request
+from app.utils.auth_utils import AuthUtils, principal_query
+from app.utils.engine_profiles import bind_config, init_engine_profile
+from app.utils.metrics import observe_request
+from app.utils.read_replica import REPLICA_BIND
+from app.utils.response import render_body
+
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "mysql": "asyncmy",
+    "mariadb": "asyncmy",
+    "postgresql": "asyncpg",
+}
+
+# chunks of a streamed Flask response buffered ahead of the client
+_STREAM_BUFFER = 16
+
+
+def async_database_url(url):
+    """
+    url with the async driver of its database, e.g. mysql://... -> mysql+asyncmy://...
+    """
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"no async driver for {backend} databases, set ASYNC_DATABASE_URL")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+
+class _ClientGone(Exception):
+    pass
+
+
+class AsyncReadApp:
+    """
+    ASGI application serving the read endpoints asynchronously and the rest of the Flask
+    app from threads. the async engines are created on first use, in the event loop of
+    the worker, and disposed at lifespan shutdown
+    """
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.engines = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=flask_app.config["ASGI_WSGI_THREADS"], thread_name_prefix="asgi-wsgi"
+        )
+        self._flights = {}
+        self.routes = {
+            "/api/subscriptions/active": self.active,
+            "/api/subscriptions/history": self.history,
+            "/api/subscriptions/plans": self.plans,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            handler = self.routes.get(scope["path"]) if scope["method"] == "GET" else None
+            if handler is None:
+                await self.call_wsgi(scope, receive, send)
+            else:
+                await self.serve(handler, scope, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def close(self):
+        for engine in self.engines.values():
+            await engine.dispose()
+        self.engines.clear()
+        self._executor.shutdown(wait=False)
+
+    def engine(self, name):
+        engine = self.engines.get(name)
+        if engine is None:
+            from sqlalchemy.ext.asyncio import create_async_engine
+
+            config = self.flask_app.config
+            if name == REPLICA_BIND:
+                url, options = bind_config(self.flask_app, REPLICA_BIND)
+                url = config["ASYNC_DATABASE_REPLICA_URL"] or async_database_url(url)
+            else:
+                url, options = bind_config(self.flask_app)
+                url = config["ASYNC_DATABASE_URL"] or async_database_url(url)
+            engine = create_async_engine(url, **options)
+            init_engine_profile(self.flask_app, engine.sync_engine)
+            self.engines[name] = engine
+        return engine
+
+    def read_engine(self, user_id):
+        # the same routing as the replica_reads decorator
+        if read_replica.enabled and not read_replica.is_pinned(user_id):
+            return REPLICA_BIND
+        return "primary"
+
+    async def serve(self, handler, scope, send):
+        started = time.perf_counter()
+        with self.flask_app.app_context():
+            try:
+                status, body, etag = await handler(scope)
+            except Exception:
+                self.flask_app.logger.exception("error serving %s", scope["path"])
+                status, body, etag = 500, render_body(message="Internal server error"), None
+            headers = [(b"content-type", b"application/json")]
+            if etag is not None:
+                headers += [(b"etag", f'"{etag}"'.encode()), (b"cache-control", b"no-cache")]
+                if parse_etags(_header(scope, b"if-none-match")).contains(etag):
+                    status, body = 304, ""
+            body = body.encode()
+            if status != 304:
+                headers.append((b"content-length", str(len(body)).encode()))
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+        observe_request("GET", scope["path"], status, time.perf_counter() - started)
+
+    async def authenticate(self, scope):
+        """
+        returns (user_id, None) or (None, the 401 message), like the jwt_required decorator.
+        principal cache misses are read from the primary
+        """
+        token, error = AuthUtils.bearer_token(_header(scope, b"authorization") or None)
+        if error:
+            return None, error
+        user_id, payload = AuthUtils.token_claims(token)
+        if user_id is None:
+            return None, "Invalid token"
+        principal = principal_cache.get(user_id)
+        if principal is None:
+            async with self.engine("primary").connect() as conn:
+                row = (await conn.execute(principal_query, {"uid": user_id})).first()
+            principal = AuthUtils.principal_from_row(row)
+        if AuthUtils.authorize(payload, principal) is None:
+            return None, "Invalid token"
+        return user_id, None
+
+    async def active(self, scope):
+        user_id, error = await self.authenticate(scope)
+        if error:
+            return 401, render_body(message=error), None
+
+        async def load(engine_name):
+            async with self.engine(engine_name).connect() as conn:
+                result = await conn.execute(active_query(), {"uid": user_id, "now": datetime.now()})
+                return active_body(result.first())
+
+        cached = await self.cached(user_id, "active", load)
+        return 200, cached.body, cached.etag
+
+    async def history(self, scope):
+        user_id, error = await self.authenticate(scope)
+        if error:
+            return 401, render_body(message=error), None
+        args = MultiDict(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True))
+        try:
+            query, params, page_size, cache_kind = history_request(user_id, args)
+        except ValueError:
+            return 400, render_body(message="Invalid cursor"), None
+
+        async def load(engine_name):
+            async with self.engine(engine_name).connect() as conn:
+                rows = (await conn.execute(query, params)).fetchall()
+            return history_body(rows, page_size), None
+
+        if cache_kind is None:
+            body, _ = await load(self.read_engine(user_id))
+            return 200, body, None
+        cached = await self.cached(user_id, cache_kind, load)
+        return 200, cached.body, cached.etag
+
+    async def plans(self, scope):
+        snapshot = plan_catalog.fresh_snapshot()
+        if snapshot is None:
+            # a reload is one query on the plans table, made by the catalog on a thread
+            snapshot = await asyncio.get_running_loop().run_in_executor(self._executor, self._load_plans)
+        return 200, snapshot.body, snapshot.etag
+
+    def _load_plans(self):
+        with self.flask_app.app_context():
+            return plan_catalog.snapshot()
+
+    async def cached(self, user_id, kind, load):
+        """
+        the response cache's get_or_load for coroutines: concurrent misses of the same
+        entry in this worker wait for the first one's load (single-flight)
+        """
+        cached, version = response_cache.peek(user_id, kind)
+        if cached is not None:
+            return cached
+        key = (user_id, kind, version)
+        flight = self._flights.get(key)
+        if flight is not None:
+            cached = await asyncio.shield(flight)
+            if cached is not None:
+                return cached
+        flight = self._flights[key] = asyncio.get_running_loop().create_future()
+        cached = None
+        try:
+            engine_name = self.read_engine(user_id)
+            body, expires_at = await load(engine_name)
+            # the replica may not have caught up with the version yet
+            cached = response_cache.put(user_id, kind, version, body, expires_at, store=engine_name != REPLICA_BIND)
+            return cached
+        finally:
+            # the waiters load on their own when this load failed
+            flight.set_result(cached)
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    async def call_wsgi(self, scope, receive, send):
+        """
+        runs the Flask app for the request on a thread, the response is passed back chunk
+        by chunk so that streamed responses are not buffered
+        """
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(_STREAM_BUFFER)
+        gone = threading.Event()
+        environ = _environ(scope, bytes(body))
+
+        def put(item):
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+            while True:
+                try:
+                    return future.result(timeout=1)
+                except TimeoutError:
+                    if gone.is_set():
+                        future.cancel()
+                        raise _ClientGone() from None
+
+        def run():
+            def start_response(status, headers, exc_info=None):
+                response_start["status"] = int(status.split(" ", 1)[0])
+                response_start["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+            response_start = {}
+            try:
+                chunks = self.flask_app(environ, start_response)
+                try:
+                    put(("start", response_start))
+                    for chunk in chunks:
+                        if chunk:
+                            put(("body", chunk))
+                finally:
+                    if hasattr(chunks, "close"):
+                        chunks.close()
+                put(("end", None))
+            except _ClientGone:
+                pass
+            except BaseException as e:
+                try:
+                    put(("error", e))
+                except _ClientGone:
+                    pass
+
+        done = loop.run_in_executor(self._executor, run)
+        try:
+            kind, value = await queue.get()
+            if kind == "error":
+                # Flask answers the errors of the views itself, this is a failure around them
+                self.flask_app.logger.error("error serving %s", scope["path"], exc_info=value)
+                value = {"status": 500, "headers": [(b"content-type", b"text/plain")]}
+            await send({"type": "http.response.start", "status": value["status"], "headers": value["headers"]})
+            while kind != "error":
+                kind, value = await queue.get()
+                if kind == "end":
+                    break
+                if kind == "error":
+                    # the headers are out, closing the connection is all that is left
+                    raise value
+                await send({"type": "http.response.body", "body": value, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            gone.set()
+            await done
+
+
+def _header(scope, name):
+    values = [value.decode("latin-1") for key, value in scope["headers"] if key == name]
+    return ",".join(values)
+
+
+def _environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = f"HTTP_{name}"
+        value = value.decode("latin-1")
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+def create_asgi_app(config=None):
+    return AsyncReadApp(create_app(config))
@@ -0,0 +1,37 @@
+"""
+the flask CLI commands. they are imported when the CLI looks one up, so web workers, which
+never run them, do not import them (and the modules behind them) at startup
+"""
+import importlib
+from flask.cli import AppGroup
+
+COMMANDS = {
+    "create-admin": "app.commands.create_admin_user:create_admin",
+    "current-subscriptions": "app.commands.current_subscriptions:current_subscriptions",
+    "db": "app.commands.db:db_commands",
+    "expire-subscriptions": "app.commands.expire_subscriptions:expire_subscriptions",
+    "explain-queries": "app.commands.explain_queries:explain_queries",
+    "idempotency-keys": "app.commands.idempotency_keys:idempotency_keys_commands",
+    "outbox": "app.commands.outbox:outbox_commands",
+    "revoke-tokens": "app.commands.revoke_tokens:revoke_tokens",
+    "rollups": "app.commands.rollups:rollups_commands",
+    "seed": "app.commands.seed:seed",
+}
+
+
+class LazyAppGroup(AppGroup):
+    """
+    app.cli with commands given as "module:attribute", imported on first use
+    """
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = dict(lazy_commands or {})
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, name):
+        if name in self.lazy_commands and name not in self.commands:
+            module, _, attribute = self.lazy_commands[name].partition(":")
+            self.add_command(getattr(importlib.import_module(module), attribute), name)
+        return super().get_command(ctx, name)
@@ -0,0 +1,28 @@
+import click
+from flask import current_app
+from app.utils import current_subscriptions as projection
+
+@click.group("current-subscriptions")
+def current_subscriptions():
+    """Used to maintain the current_subscriptions projection behind /active."""
+
+@current_subscriptions.command("rebuild")
+def rebuild():
+    """Recomputes the projection from the subscriptions table."""
+    with current_app.app_context():
+        count = projection.rebuild()
+        click.echo(f"Rebuilt current_subscriptions with {count} rows.", color="green")
+
+@current_subscriptions.command("verify")
+def verify():
+    """Reports drift between the projection and the subscriptions table."""
+    with current_app.app_context():
+        report = projection.verify()
+        click.echo(f"Checked {report.checked} users with an active subscription.")
+        for label, user_ids in (("missing", report.missing), ("stale", report.stale), ("extra", report.extra)):
+            if user_ids:
+                preview = ", ".join(str(uid) for uid in user_ids[:20])
+                click.echo(f"{len(user_ids)} {label} rows (user ids: {preview}{', ...' if len(user_ids) > 20 else ''})", color="red")
+        if report.missing or report.stale or report.extra:
+            raise SystemExit(1)
+        click.echo("No drift found.", color="green")
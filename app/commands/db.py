@@ -0,0 +1,36 @@
+import click
+from flask import current_app
+from app.extensions import db
+from app.utils import migrations
+
+@click.group("db")
+def db_commands():
+    """Used to version the database schema, run "flask db upgrade" at deploy time."""
+
+@db_commands.command("upgrade")
+@click.option("--to", "target", type=int, default=None, help="Stop at this version instead of the latest.")
+def upgrade(target):
+    """Applies the migrations the database has not seen yet."""
+    with current_app.app_context():
+        done = migrations.upgrade(db.engine, target=target, progress=lambda m: click.echo(f"Applying {m.version:04d} {m.name}..."))
+        with db.engine.connect() as conn:
+            version = migrations.current_version(conn)
+        click.echo(f"Applied {len(done)} migrations, the schema is at version {version}.", color="green")
+
+@db_commands.command("status")
+def status():
+    """Lists the migrations and whether they were applied, exits with status 1 when some are pending."""
+    with current_app.app_context():
+        with db.engine.connect() as conn:
+            applied = migrations.applied(conn)
+        pending = 0
+        for migration in migrations.available():
+            if migration.version in applied:
+                click.echo(f"{migration.version:04d} {migration.name:<45} applied {applied[migration.version]:%Y-%m-%d %H:%M:%S}")
+            else:
+                pending += 1
+                click.echo(f"{migration.version:04d} {migration.name:<45} pending")
+        if pending:
+            click.echo(f'{pending} pending migrations, run "flask db upgrade".', color="red")
+            raise SystemExit(1)
+        click.echo("The schema is up to date.", color="green")
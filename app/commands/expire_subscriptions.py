@@ -0,0 +1,16 @@
+import click
+from flask import current_app
+from app.extensions import expiry_sweeper
+
+@click.command("expire-subscriptions")
+@click.option("--batch-size", type=int, default=None, help="Rows expired per committed batch.")
+@click.option("--max-batches", type=int, default=None, help="Stop after this many batches.")
+def expire_subscriptions(batch_size, max_batches):
+    """Used to move lapsed active subscriptions to 'expired' in bounded batches."""
+    with current_app.app_context():
+        report = expiry_sweeper.run(batch_size=batch_size, max_batches=max_batches)
+        rate = report.expired / report.seconds if report.seconds else 0
+        click.echo(
+            f"Expired {report.expired} subscriptions in {report.batches} batches "
+            f"({rate:.0f} rows/s), {report.pending} still pending."
+        )
@@ -0,0 +1,27 @@
+import click
+from flask import current_app
+from app.utils.query_plans import check_all
+
+@click.command("explain-queries")
+@click.option("--analyze", is_flag=True, help="Refresh the planner statistics (ANALYZE) first.")
+@click.option("--verbose", "-v", is_flag=True, help="Print the SQL and plan of every statement.")
+def explain_queries(analyze, verbose):
+    """Used to check the query plans of the registered SQL statements, exits with status 1 on scans or temp sorts."""
+    with current_app.app_context():
+        checks = check_all(analyze=analyze)
+        failed = [check for check in checks if not check.ok]
+        for check in checks:
+            status = "ok" if check.ok else "FAIL"
+            allowed = f" (allowed: {', '.join(sorted(check.allow))})" if check.allow and check.findings else ""
+            click.echo(f"{status:<4} {check.name}{allowed}")
+            if verbose or not check.ok:
+                click.echo(f"       {check.sql}")
+                for step in check.plan:
+                    click.echo(f"       | {step}")
+            for finding in check.failures:
+                click.echo(f"       {finding.kind} on {finding.table}: {finding.detail}")
+            for suggestion in check.suggestions:
+                click.echo(f"       suggestion: {suggestion}")
+        click.echo(f"{len(checks)} statements checked, {len(failed)} failed.")
+        if failed:
+            raise SystemExit(1)
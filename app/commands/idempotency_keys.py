@@ -0,0 +1,15 @@
+import click
+from flask import current_app
+from app.extensions import idempotency_keys
+
+@click.group("idempotency-keys")
+def idempotency_keys_commands():
+    """Used to maintain the Idempotency-Key records of the subscription writes."""
+
+@idempotency_keys_commands.command("purge")
+@click.option("--batch-size", type=int, default=None, help="Keys deleted per statement (IDEMPOTENCY_PURGE_BATCH_SIZE by default).")
+def purge(batch_size):
+    """Deletes the expired idempotency keys."""
+    with current_app.app_context():
+        deleted = idempotency_keys.purge(batch_size=batch_size)
+        click.echo(f"Deleted {deleted} expired idempotency keys.", color="green")
@@ -0,0 +1,60 @@
+import time
+import click
+from flask import current_app
+from app.extensions import outbox_dispatcher
+
+@click.group("outbox")
+def outbox_commands():
+    """Used to deliver and maintain the outbox of subscription changes."""
+
+def _echo_report(report):
+    rate = report.delivered / report.seconds if report.seconds else 0
+    click.echo(
+        f"Delivered {report.delivered} events in {report.batches} batches "
+        f"({rate:.0f} events/s), lag {report.lag:.1f}s."
+    )
+    if report.error:
+        click.echo(f"Delivery failed, retried after a backoff: {report.error}", color="red")
+
+@outbox_commands.command("dispatch")
+@click.option("--max-batches", type=int, default=None, help="Stop after this many batches.")
+@click.option("--follow", is_flag=True, help="Keep dispatching every OUTBOX_DISPATCH_INTERVAL seconds (1 if unset).")
+def dispatch(max_batches, follow):
+    """Delivers the pending outbox events to OUTBOX_SINK."""
+    if outbox_dispatcher.sink is None:
+        raise click.ClickException("No outbox sink configured, set OUTBOX_SINK.")
+    with current_app.app_context():
+        last_purge = time.monotonic()
+        while True:
+            report = outbox_dispatcher.run(max_batches=max_batches)
+            if report.delivered or report.error or not follow:
+                _echo_report(report)
+            if not follow:
+                break
+            # purged like by the workers' dispatcher thread, which this process replaces
+            if time.monotonic() - last_purge >= outbox_dispatcher.purge_every:
+                last_purge = time.monotonic()
+                outbox_dispatcher.purge()
+            time.sleep(outbox_dispatcher.interval or 1)
+
+@outbox_commands.command("status")
+def status():
+    """Shows the consumer's checkpoint, pending events and lag."""
+    with current_app.app_context():
+        state = outbox_dispatcher.status()
+        click.echo(
+            f"Consumer {state.consumer}: delivered up to event {state.last_event_id}, "
+            f"{state.pending} pending, lag {state.lag:.1f}s."
+        )
+        if state.gaps:
+            click.echo(f"{state.gaps} skipped event ids are watched, their events are delivered if they commit.")
+        if state.last_error:
+            click.echo(f"{state.attempts} failed attempts, next at {state.next_attempt_at}: {state.last_error}", color="red")
+
+@outbox_commands.command("purge")
+@click.option("--batch-size", type=int, default=1000, help="Events deleted per statement.")
+def purge(batch_size):
+    """Deletes the delivered events older than OUTBOX_RETENTION."""
+    with current_app.app_context():
+        deleted = outbox_dispatcher.purge(batch_size=batch_size)
+        click.echo(f"Deleted {deleted} outbox events.", color="green")
@@ -0,0 +1,22 @@
+import click
+from flask import current_app
+from app.models.users import User
+from app.extensions import db
+from app.utils.auth_utils import AuthUtils
+
+@click.command("revoke-tokens")
+@click.argument("email")
+@click.option("--demote", is_flag=True, help="Also remove admin rights from the user.")
+def revoke_tokens(email, demote):
+    """Used to revoke every token issued to a user, optionally removing admin rights."""
+    with current_app.app_context():
+        user = db.session.query(User).filter_by(email=email).first()
+        if not user:
+            click.echo(f"User with email {email} does not exist.", color="red")
+            return
+
+        AuthUtils.revoke_user_tokens(user)
+        if demote:
+            user.is_admin = False
+        db.session.commit()
+        click.echo(f"Tokens for {email} revoked.", color="green")
@@ -0,0 +1,28 @@
+import click
+from flask import current_app
+from app.utils import rollups
+
+@click.group("rollups")
+def rollups_commands():
+    """Used to maintain the analytics rollups behind /api/analytics."""
+
+@rollups_commands.command("backfill")
+def backfill():
+    """Rebuilds the rollups from the subscriptions history."""
+    with current_app.app_context():
+        plans, days = rollups.rebuild()
+        click.echo(f"Rebuilt the rollups of {plans} plans and {days} days.", color="green")
+
+@rollups_commands.command("verify")
+def verify():
+    """Reports drift between the rollups and the subscriptions table."""
+    with current_app.app_context():
+        report = rollups.verify()
+        click.echo(f"Checked {report.plans} plans and {report.days} days.")
+        for label, keys in (("plans", report.stale_plans), ("days", report.stale_days)):
+            if keys:
+                preview = ", ".join(str(key) for key in keys[:20])
+                click.echo(f"{len(keys)} stale {label} ({preview}{', ...' if len(keys) > 20 else ''})", color="red")
+        if report.stale_plans or report.stale_days:
+            raise SystemExit(1)
+        click.echo("No drift found.", color="green")
@@ -0,0 +1,39 @@
+import os
+import click
+from flask import current_app
+from app.extensions import password_hasher, plan_catalog
+from app.utils import seed_data
+
+@click.command("seed")
+@click.option("--users", type=int, default=100000, show_default=True, help="Users to add.")
+@click.option("--plans", type=int, default=5, show_default=True, help="Plans to spread the subscriptions over.")
+@click.option("--chunk-size", type=int, default=5000, show_default=True, help="Users generated and committed per batch.")
+@click.option("--workers", type=int, default=os.cpu_count() or 1, show_default=True, help="Generator processes.")
+@click.option("--password", default="password", show_default=True, help="Password of every seeded user.")
+@click.option("--seed", "random_seed", type=int, default=0, show_default=True, help="Random seed, the same seed gives the same data.")
+@click.option("--active-ratio", type=float, default=0.6, show_default=True, help="Share of users whose latest subscription is active.")
+@click.option("--lapsed-ratio", type=float, default=0.02, show_default=True, help="Share of active subscriptions already past ends_at.")
+@click.option("--history-alpha", type=float, default=1.5, show_default=True, help="Pareto shape of the history lengths, lower is more skewed.")
+@click.option("--max-history", type=int, default=50, show_default=True, help="Most subscriptions per user.")
+def seed(users, plans, chunk_size, workers, password, random_seed, active_ratio, lapsed_ratio, history_alpha, max_history):
+    """Used to bulk generate users, plans and subscription histories for load testing."""
+    with current_app.app_context():
+        def progress(written_users, written_subscriptions, seconds):
+            click.echo(f"  {written_users}/{users} users, {written_subscriptions} subscriptions, {seconds:.1f}s")
+
+        # every seeded user shares one hash, computed once
+        report = seed_data.seed(
+            users, plans=plans, chunk_size=chunk_size, workers=workers,
+            password_hash=password_hasher.hash(password), random_seed=random_seed,
+            active_ratio=active_ratio, lapsed_ratio=lapsed_ratio,
+            history_alpha=history_alpha, max_history=max_history, progress=progress,
+        )
+        plan_catalog.invalidate()
+        rows = report.users + report.subscriptions
+        rate = rows / report.seconds if report.seconds else 0
+        click.echo(
+            f"Seeded {report.users} users and {report.subscriptions} subscriptions "
+            f"({report.statuses['active']} active, {report.statuses['cancelled']} cancelled, "
+            f"{report.statuses['expired']} expired) over {report.plans} plans in {report.seconds:.1f}s "
+            f"({rate:.0f} rows/s)."
+        )
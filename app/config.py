@@ -10,4 +10,121 @@ class Config:
     # i'm using sqlite for simplicity but the same principle applies to MySQL/MariaDB
     SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL", "sqlite:///subscriptions.db")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # connection pool options (MySQL) and PRAGMAs (SQLite), see app/utils/engine_profiles.py:
+    # "web" for the gunicorn workers, "stock" for the SQLAlchemy and SQLite defaults
+    DB_ENGINE_PROFILE = os.environ.get("DB_ENGINE_PROFILE", "web")
+    # optional read replica: routes marked with @replica_reads read from it, except for users
+    # who subscribed, changed plan or cancelled in the last READ_YOUR_WRITES_SECONDS. the pins
+    # are shared by the workers of a host through READ_YOUR_WRITES_FILE (defaults to the instance folder)
+    SQLALCHEMY_BINDS = {"replica": os.environ["DATABASE_REPLICA_URL"]} if os.environ.get("DATABASE_REPLICA_URL") else {}
+    READ_YOUR_WRITES_SECONDS = float(os.environ.get("READ_YOUR_WRITES_SECONDS", 5))
+    READ_YOUR_WRITES_SLOTS = int(os.environ.get("READ_YOUR_WRITES_SLOTS", 65536))
+    READ_YOUR_WRITES_FILE = os.environ.get("READ_YOUR_WRITES_FILE")
+    # per-user cache of GET /active and the first history page, invalidated by the user's writes
+    # and the expiry sweeper through RESPONSE_CACHE_VERSIONS_FILE (defaults to the instance folder).
+    # RESPONSE_CACHE_TTL bounds staleness for changes made elsewhere, 0 disables the cache
+    RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", 60))
+    RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", 32 * 2**20))
+    RESPONSE_CACHE_SLOTS = int(os.environ.get("RESPONSE_CACHE_SLOTS", 65536))
+    RESPONSE_CACHE_VERSIONS_FILE = os.environ.get("RESPONSE_CACHE_VERSIONS_FILE")
+    # JSON serialization of the responses, see app/utils/json_provider.py: "flask" is jsonify's
+    # output (RFC 822 datetimes, escaped non-ASCII). "auto" (orjson when it is installed),
+    # "orjson" and "iso" are faster but write ISO 8601 datetimes, a change for the clients
+    JSON_PROVIDER = os.environ.get("JSON_PROVIDER", "flask")
+    # async serving mode (app/asgi.py): the async engines default to DATABASE_URL and
+    # DATABASE_REPLICA_URL with their async driver (aiosqlite, asyncmy), the routes that
+    # are not served asynchronously run on ASGI_WSGI_THREADS threads per worker
+    ASYNC_DATABASE_URL = os.environ.get("ASYNC_DATABASE_URL")
+    ASYNC_DATABASE_REPLICA_URL = os.environ.get("ASYNC_DATABASE_REPLICA_URL")
+    ASGI_WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", 8))
     JWT_SECRET = os.environ.get("JWT_SECRET", "jwt-secret")
+    # backend of the caches built on app/utils/cache (the principal cache): "memory" (per
+    # worker), "shared" (a file mapped by every worker of the host, CACHE_SHARED_FILE defaults
+    # to the instance folder) or a redis:// url. CACHE_NEAR_ENTRIES puts a per-worker LRU in
+    # front of the shared and network backends, kept coherent through their pub/sub
+    CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")
+    CACHE_SHARED_FILE = os.environ.get("CACHE_SHARED_FILE")
+    CACHE_NEAR_ENTRIES = int(os.environ.get("CACHE_NEAR_ENTRIES", 10000))
+    CACHE_NEAR_TTL = float(os.environ.get("CACHE_NEAR_TTL", 5))
+    # principal cache used by the auth decorators, the TTL bounds how long a
+    # revocation or admin demotion done by another worker can take to apply
+    # when the workers do not share CACHE_BACKEND
+    AUTH_PRINCIPAL_CACHE_TTL = int(os.environ.get("AUTH_PRINCIPAL_CACHE_TTL", 30))
+    AUTH_PRINCIPAL_CACHE_SIZE = int(os.environ.get("AUTH_PRINCIPAL_CACHE_SIZE", 10000))
+    # plan catalog served by GET /api/subscriptions/plans and the plan lookups,
+    # invalidated through a version file shared by the workers (defaults to the instance folder)
+    PLAN_CATALOG_MAX_AGE = int(os.environ.get("PLAN_CATALOG_MAX_AGE", 300))
+    PLAN_CATALOG_VERSION_FILE = os.environ.get("PLAN_CATALOG_VERSION_FILE")
+    HISTORY_DEFAULT_PAGE_SIZE = int(os.environ.get("HISTORY_DEFAULT_PAGE_SIZE", 10))
+    HISTORY_MAX_PAGE_SIZE = int(os.environ.get("HISTORY_MAX_PAGE_SIZE", 100))
+    # days of GET /api/analytics/churn when ?days is not given, and the most it accepts
+    ANALYTICS_DEFAULT_DAYS = int(os.environ.get("ANALYTICS_DEFAULT_DAYS", 30))
+    ANALYTICS_MAX_DAYS = int(os.environ.get("ANALYTICS_MAX_DAYS", 366))
+    # a user has at most one active subscription (unique index on subscriptions.active_user_id):
+    # subscribe retries its transaction this many times when a concurrent subscribe of the same
+    # user wins the race, then answers 409
+    SUBSCRIBE_CONFLICT_RETRIES = int(os.environ.get("SUBSCRIBE_CONFLICT_RETRIES", 3))
+    # Idempotency-Key support of subscribe, change-plan and cancel (app/utils/idempotency.py):
+    # stored responses are replayed for IDEMPOTENCY_KEY_TTL seconds, a duplicate waits up to
+    # IDEMPOTENCY_WAIT_TIMEOUT for the first request (then gets a 409), whose claim is taken over
+    # after IDEMPOTENCY_LOCK_TIMEOUT if its worker died. expired keys are purged
+    # IDEMPOTENCY_PURGE_BATCH_SIZE at a time every IDEMPOTENCY_PURGE_INTERVAL seconds per worker
+    IDEMPOTENCY_KEY_TTL = int(os.environ.get("IDEMPOTENCY_KEY_TTL", 86400))
+    IDEMPOTENCY_WAIT_TIMEOUT = float(os.environ.get("IDEMPOTENCY_WAIT_TIMEOUT", 10))
+    IDEMPOTENCY_POLL_INTERVAL = float(os.environ.get("IDEMPOTENCY_POLL_INTERVAL", 0.05))
+    IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get("IDEMPOTENCY_LOCK_TIMEOUT", 30))
+    IDEMPOTENCY_PURGE_INTERVAL = int(os.environ.get("IDEMPOTENCY_PURGE_INTERVAL", 60))
+    IDEMPOTENCY_PURGE_BATCH_SIZE = int(os.environ.get("IDEMPOTENCY_PURGE_BATCH_SIZE", 1000))
+    # transactional outbox of the subscription changes (app/utils/outbox.py), delivered to
+    # OUTBOX_SINK (an http(s):// webhook, file:///path or memory://) in batches of OUTBOX_BATCH_SIZE
+    # by a thread of every worker when OUTBOX_DISPATCH_INTERVAL (seconds) > 0, the lease making
+    # sure only one delivers, or by "flask outbox dispatch --follow". failed batches are retried
+    # after OUTBOX_RETRY_BACKOFF seconds, doubling up to OUTBOX_MAX_BACKOFF. delivered events are
+    # kept OUTBOX_RETENTION seconds. an id missing for OUTBOX_GAP_TIMEOUT seconds is skipped, and
+    # its event still delivered if it commits within OUTBOX_RETENTION. the writes append no event
+    # while OUTBOX_SINK is unset, as nothing would deliver or purge it: set it in the workers too
+    # when the dispatcher runs on its own
+    OUTBOX_SINK = os.environ.get("OUTBOX_SINK")
+    OUTBOX_WEBHOOK_SECRET = os.environ.get("OUTBOX_WEBHOOK_SECRET")
+    OUTBOX_WEBHOOK_TIMEOUT = float(os.environ.get("OUTBOX_WEBHOOK_TIMEOUT", 10))
+    OUTBOX_CONSUMER = os.environ.get("OUTBOX_CONSUMER", "default")
+    OUTBOX_DISPATCH_INTERVAL = float(os.environ.get("OUTBOX_DISPATCH_INTERVAL", 0))
+    OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", 500))
+    OUTBOX_LEASE_SECONDS = int(os.environ.get("OUTBOX_LEASE_SECONDS", 30))
+    OUTBOX_GAP_TIMEOUT = float(os.environ.get("OUTBOX_GAP_TIMEOUT", 5))
+    OUTBOX_RETRY_BACKOFF = float(os.environ.get("OUTBOX_RETRY_BACKOFF", 1))
+    OUTBOX_MAX_BACKOFF = float(os.environ.get("OUTBOX_MAX_BACKOFF", 300))
+    OUTBOX_RETENTION = int(os.environ.get("OUTBOX_RETENTION", 7 * 86400))
+    # rows fetched per round trip by the streaming export of /active/all
+    EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
+    # user ids per statement for the active subscriptions batch lookup, kept under
+    # SQLite's bind-variable limit (999 on older builds)
+    BATCH_LOOKUP_CHUNK_SIZE = int(os.environ.get("BATCH_LOOKUP_CHUNK_SIZE", 500))
+    BATCH_LOOKUP_MAX_IDS = int(os.environ.get("BATCH_LOOKUP_MAX_IDS", 100000))
+    # largest request body accepted, in bytes: bigger ones are answered 413 before they are read
+    # or parsed. the default fits BATCH_LOOKUP_MAX_IDS ten-digit ids
+    MAX_CONTENT_LENGTH = int(os.environ.get("MAX_CONTENT_LENGTH", 2 * 2**20))
+    # expiry sweeper, EXPIRY_SWEEP_INTERVAL (seconds) > 0 starts it in a background thread of
+    # every worker, a lease (job_leases) letting only one sweep, otherwise run
+    # "flask expire-subscriptions" periodically (e.g. from cron)
+    EXPIRY_SWEEP_INTERVAL = int(os.environ.get("EXPIRY_SWEEP_INTERVAL", 0))
+    EXPIRY_SWEEP_BATCH_SIZE = int(os.environ.get("EXPIRY_SWEEP_BATCH_SIZE", 1000))
+    # only enable once the sweeper runs regularly: the read queries then trust
+    # status = 'active' and drop their ends_at predicate
+    SUBSCRIPTION_STATUS_AUTHORITATIVE = os.environ.get("SUBSCRIPTION_STATUS_AUTHORITATIVE", "false").lower() == "true"
+    # per-request DB instrumentation: Server-Timing header and slow-query log (app.slow_queries logger)
+    DB_INSTRUMENTATION = os.environ.get("DB_INSTRUMENTATION", "false").lower() == "true"
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get("SLOW_QUERY_THRESHOLD_MS", 100))
+    # password hashing runs on a pool of PASSWORD_HASH_WORKERS processes per web worker
+    # (0 hashes on the request thread), at most PASSWORD_HASH_MAX_PENDING hashes run or wait
+    # per web worker and requests waiting longer than PASSWORD_HASH_QUEUE_TIMEOUT get a 503.
+    # hashes made with other parameters than PASSWORD_HASH_METHOD are upgraded on login
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", 8))
+    PASSWORD_HASH_QUEUE_TIMEOUT = float(os.environ.get("PASSWORD_HASH_QUEUE_TIMEOUT", 0.5))
+    # appends every request to this file as JSON lines, for benchmarks/replay.py
+    REQUEST_LOG_PATH = os.environ.get("REQUEST_LOG_PATH")
+    # schema version check at startup (see app/utils/migrations.py): "strict" refuses to start
+    # when "flask db upgrade" has not been run, "warn" only logs it, "off" skips the check
+    SCHEMA_CHECK = os.environ.get("SCHEMA_CHECK", "strict").lower()
@@ -0,0 +1,55 @@
+from flask import current_app, request
+from functools import wraps
+from app.extensions import idempotency_keys
+from app.utils.idempotency import BUSY, MISMATCH, REPLAY
+from app.utils.response import make_response
+
+MAX_KEY_LENGTH = 255
+
+
+def idempotent(f):
+    """
+    Decorator to honour the Idempotency-Key header of a write route.
+
+    OPTIMIZATION: a retry of a request that completed is answered with the stored response
+    (and an Idempotent-Replayed header), without running the view, so client retry storms
+    cost two statements on the idempotency_keys table and never touch the subscriptions.
+    A retry arriving while the first request runs waits for its response (see
+    IdempotencyStore). Requests without the header run as before. Place it below
+    jwt_required, keys are scoped to the user.
+    """
+    @wraps(f)
+    def decorated_function(user_id, *args, **kwargs):
+        key = request.headers.get("Idempotency-Key")
+        if key is None:
+            return f(user_id, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return make_response(message=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters", status_code=400)
+        fingerprint = idempotency_keys.fingerprint(request.method, request.path, request.get_data())
+        outcome = idempotency_keys.begin(user_id, key, fingerprint)
+        if outcome.state == REPLAY:
+            response = current_app.response_class(
+                outcome.response.body, status=outcome.response.status_code, mimetype="application/json"
+            )
+            response.headers["Idempotent-Replayed"] = "true"
+            return response
+        if outcome.state == MISMATCH:
+            return make_response(message="Idempotency-Key was already used for another request", status_code=422)
+        if outcome.state == BUSY:
+            response = current_app.make_response(
+                make_response(message="A request with this Idempotency-Key is in progress", status_code=409)
+            )
+            response.headers["Retry-After"] = "1"
+            return response
+        try:
+            response = current_app.make_response(f(user_id, *args, **kwargs))
+        except BaseException:
+            idempotency_keys.release(user_id, key)
+            raise
+        # 409 and 5xx responses ask for a retry, which has to run the request again
+        if response.status_code >= 500 or response.status_code == 409 or response.is_streamed:
+            idempotency_keys.release(user_id, key)
+        else:
+            idempotency_keys.complete(user_id, key, response.status_code, response.get_data(as_text=True))
+        return response
+    return decorated_function
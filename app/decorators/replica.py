@@ -0,0 +1,17 @@
+from flask import g
+from functools import wraps
+from app.extensions import read_replica
+
+def replica_reads(f):
+    """
+    Decorator to serve a read-only route from the read replica.
+
+    OPTIMIZATION: reads are taken off the primary, except for a user who wrote within the
+    read-your-writes window (see ReadReplica). Place it below jwt_required/admin_required,
+    which identify the user.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        read_replica.route_request(g.get("principal_id"))
+        return f(*args, **kwargs)
+    return decorated_function
@@ -1,4 +1,4 @@
-from flask import request
+from flask import g, request
 from functools import wraps
 from app.utils.auth_utils import AuthUtils
 from app.utils.response import make_response
@@ -6,20 +6,20 @@ from app.utils.response import make_response
 def jwt_required(f):
     """
     Decorator to check if the user is authenticated.
+
+    OPTIMIZATION: the principal is resolved from the signed token claims and the
+    in-process principal cache, so most requests are authenticated without a DB query.
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
-
-        auth_header = request.headers.get("Authorization")
-        if not auth_header:
-            return make_response(message="Unauthorized", status_code=401)
-        if not auth_header.startswith("Bearer "):
+        token, error = AuthUtils.bearer_token(request.headers.get("Authorization"))
+        if error:
+            return make_response(message=error, status_code=401)
+        principal = AuthUtils.get_principal_from_token(token)
+        if not principal:
             return make_response(message="Invalid token", status_code=401)
-        token = auth_header.split(" ", 1)[1]
-        user = AuthUtils.get_user_from_token(token)
-        if not user:
-            return make_response(message="Invalid token", status_code=401)
-        return f(user.id, *args, **kwargs)
+        g.principal_id = principal.id
+        return f(principal.id, *args, **kwargs)
     return decorated_function
 
 def admin_required(f):
@@ -28,16 +28,14 @@ def admin_required(f):
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        auth_header = request.headers.get("Authorization")
-        if not auth_header:
-            return make_response(message="Unauthorized", status_code=401)
-        if not auth_header.startswith("Bearer "):
-            return make_response(message="Invalid token", status_code=401)
-        token = auth_header.split(" ", 1)[1]
-        user = AuthUtils.get_user_from_token(token)
-        if not user:
+        token, error = AuthUtils.bearer_token(request.headers.get("Authorization"))
+        if error:
+            return make_response(message=error, status_code=401)
+        principal = AuthUtils.get_principal_from_token(token)
+        if not principal:
             return make_response(message="Invalid token", status_code=401)
-        if not user.is_admin:
+        if not principal.is_admin:
             return make_response(message="Unauthorized", status_code=401)
-        return f(user.id, *args, **kwargs)
+        g.principal_id = principal.id
+        return f(principal.id, *args, **kwargs)
     return decorated_function
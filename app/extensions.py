@@ -1,3 +1,19 @@
 from flask_sqlalchemy import SQLAlchemy
+from app.utils.expiry_sweeper import ExpirySweeper
+from app.utils.idempotency import IdempotencyStore
+from app.utils.outbox import OutboxDispatcher
+from app.utils.password_hasher import PasswordHasher
+from app.utils.plan_catalog import PlanCatalog
+from app.utils.principal_cache import PrincipalCache
+from app.utils.read_replica import ReadReplica, RoutingSession
+from app.utils.response_cache import UserResponseCache
 
-db = SQLAlchemy()
\ No newline at end of file
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+principal_cache = PrincipalCache()
+plan_catalog = PlanCatalog()
+expiry_sweeper = ExpirySweeper()
+password_hasher = PasswordHasher()
+read_replica = ReadReplica()
+response_cache = UserResponseCache()
+idempotency_keys = IdempotencyStore()
+outbox_dispatcher = OutboxDispatcher()
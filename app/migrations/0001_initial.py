@@ -0,0 +1,43 @@
+"""
+users, plans and subscriptions, as first created by db.create_all()
+"""
+import sqlalchemy as sa
+from sqlalchemy.sql import func
+
+
+def upgrade(conn):
+    metadata = sa.MetaData()
+    sa.Table(
+        "users", metadata,
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("email", sa.String(120), unique=True, nullable=False),
+        sa.Column("password", sa.String(512), nullable=False),
+        sa.Column("is_admin", sa.Boolean),
+        sa.Column("created_at", sa.DateTime, server_default=func.now()),
+        sa.Column("updated_at", sa.DateTime, server_default=func.now()),
+    )
+    sa.Table(
+        "plans", metadata,
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("name", sa.String(80), nullable=False),
+        sa.Column("description", sa.String(200), nullable=True),
+        sa.Column("price_cents", sa.Integer, nullable=False),
+        sa.Column("created_at", sa.DateTime, server_default=func.now()),
+        sa.Column("updated_at", sa.DateTime, server_default=func.now()),
+    )
+    subscriptions = sa.Table(
+        "subscriptions", metadata,
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("plan_id", sa.Integer, sa.ForeignKey("plans.id"), nullable=False),
+        sa.Column("status", sa.Enum("active", "cancelled", "expired", name="subscription_status"), nullable=False),
+        sa.Column("starts_at", sa.DateTime, nullable=False),
+        sa.Column("ends_at", sa.DateTime, nullable=False),
+        sa.Column("created_at", sa.DateTime, server_default=func.now()),
+        sa.Column("updated_at", sa.DateTime, server_default=func.now()),
+    )
+    sa.Index("idx_subscriptions_user_status_ends_at", subscriptions.c.user_id, subscriptions.c.status, subscriptions.c.ends_at)
+    metadata.create_all(conn, checkfirst=True)
+    # the index is not created with a table that already existed
+    for index in subscriptions.indexes:
+        index.create(conn, checkfirst=True)
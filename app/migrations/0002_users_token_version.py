@@ -0,0 +1,10 @@
+"""
+users.token_version, bumped to revoke every token of a user
+"""
+import sqlalchemy as sa
+
+
+def upgrade(conn):
+    columns = {column["name"] for column in sa.inspect(conn).get_columns("users")}
+    if "token_version" not in columns:
+        conn.execute(sa.text("ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0"))
@@ -0,0 +1,17 @@
+"""
+indexes of the history pagination, the expiry sweeper and the admin listing of active subscriptions
+"""
+import sqlalchemy as sa
+
+
+def upgrade(conn):
+    subscriptions = sa.Table(
+        "subscriptions", sa.MetaData(),
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("user_id", sa.Integer),
+        sa.Column("status", sa.String(9)),
+        sa.Column("starts_at", sa.DateTime),
+        sa.Column("ends_at", sa.DateTime),
+    )
+    sa.Index("idx_subscriptions_user_starts_at_id", subscriptions.c.user_id, subscriptions.c.starts_at, subscriptions.c.id).create(conn, checkfirst=True)
+    sa.Index("idx_subscriptions_status_ends_at", subscriptions.c.status, subscriptions.c.ends_at).create(conn, checkfirst=True)
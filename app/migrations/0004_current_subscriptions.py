@@ -0,0 +1,40 @@
+"""
+the current_subscriptions projection behind /active, filled from the subscriptions table
+when it is created here (a table created by db.create_all() was already rebuilt with
+"flask current-subscriptions rebuild")
+"""
+import sqlalchemy as sa
+
+
+def upgrade(conn):
+    if sa.inspect(conn).has_table("current_subscriptions"):
+        return
+    metadata = sa.MetaData()
+    sa.Table("users", metadata, sa.Column("id", sa.Integer, primary_key=True))
+    sa.Table("plans", metadata, sa.Column("id", sa.Integer, primary_key=True))
+    sa.Table("subscriptions", metadata, sa.Column("id", sa.Integer, primary_key=True))
+    current_subscriptions = sa.Table(
+        "current_subscriptions", metadata,
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), primary_key=True, autoincrement=False),
+        sa.Column("subscription_id", sa.Integer, sa.ForeignKey("subscriptions.id"), nullable=False),
+        sa.Column("plan_id", sa.Integer, sa.ForeignKey("plans.id"), nullable=False),
+        sa.Column("name", sa.String(80), nullable=False),
+        sa.Column("description", sa.String(200), nullable=True),
+        sa.Column("status", sa.Enum("active", "cancelled", "expired", name="subscription_status"), nullable=False),
+        sa.Column("starts_at", sa.DateTime, nullable=False),
+        sa.Column("ends_at", sa.DateTime, nullable=False),
+    )
+    current_subscriptions.create(conn)
+    # latest active subscription per user, as in app/utils/current_subscriptions.py
+    conn.execute(sa.text("""
+        INSERT INTO current_subscriptions (user_id, subscription_id, plan_id, name, description, status, starts_at, ends_at)
+        SELECT s.user_id, s.id, s.plan_id, p.name, p.description, s.status, s.starts_at, s.ends_at
+        FROM subscriptions s
+        JOIN plans p ON p.id = s.plan_id
+        WHERE s.status = 'active'
+        AND NOT EXISTS (
+            SELECT 1 FROM subscriptions s2
+            WHERE s2.user_id = s.user_id AND s2.status = 'active'
+            AND (s2.starts_at > s.starts_at OR (s2.starts_at = s.starts_at AND s2.id > s.id))
+        )
+    """))
@@ -0,0 +1,13 @@
+"""
+index of the expiry sweeper's deletes from current_subscriptions by subscription id
+"""
+import sqlalchemy as sa
+
+
+def upgrade(conn):
+    current_subscriptions = sa.Table(
+        "current_subscriptions", sa.MetaData(),
+        sa.Column("user_id", sa.Integer, primary_key=True),
+        sa.Column("subscription_id", sa.Integer),
+    )
+    sa.Index("idx_current_subscriptions_subscription_id", current_subscriptions.c.subscription_id).create(conn, checkfirst=True)
@@ -0,0 +1,50 @@
+"""
+the analytics rollups behind /api/analytics, filled from the subscriptions table when
+they are created here (tables created by db.create_all() are filled with
+"flask rollups backfill")
+"""
+import sqlalchemy as sa
+
+
+def upgrade(conn):
+    inspector = sa.inspect(conn)
+    metadata = sa.MetaData()
+    sa.Table("plans", metadata, sa.Column("id", sa.Integer, primary_key=True))
+    plan_rollups = sa.Table(
+        "plan_rollups", metadata,
+        sa.Column("plan_id", sa.Integer, sa.ForeignKey("plans.id"), primary_key=True, autoincrement=False),
+        sa.Column("active_count", sa.Integer, nullable=False),
+    )
+    daily_rollups = sa.Table(
+        "daily_rollups", metadata,
+        sa.Column("day", sa.Date, primary_key=True),
+        sa.Column("started", sa.Integer, nullable=False),
+        sa.Column("cancelled", sa.Integer, nullable=False),
+        sa.Column("expired", sa.Integer, nullable=False),
+    )
+    if not inspector.has_table("plan_rollups"):
+        plan_rollups.create(conn)
+        # users per plan in current_subscriptions (0004 filled it)
+        conn.execute(sa.text("""
+            INSERT INTO plan_rollups (plan_id, active_count)
+            SELECT plan_id, COUNT(*) FROM current_subscriptions GROUP BY plan_id
+        """))
+    if not inspector.has_table("daily_rollups"):
+        daily_rollups.create(conn)
+        # as in app/utils/rollups.py: a cancelled subscription followed by one starting
+        # when it ends was replaced, not lost
+        conn.execute(sa.text("""
+            INSERT INTO daily_rollups (day, started, cancelled, expired)
+            SELECT day, SUM(started), SUM(cancelled), SUM(expired) FROM (
+                SELECT DATE(starts_at) AS day, 1 AS started, 0 AS cancelled, 0 AS expired FROM subscriptions
+                UNION ALL
+                SELECT DATE(s.ends_at), 0, 1, 0 FROM subscriptions s
+                WHERE s.status = 'cancelled' AND NOT EXISTS (
+                    SELECT 1 FROM subscriptions s2
+                    WHERE s2.user_id = s.user_id AND s2.starts_at = s.ends_at AND s2.id <> s.id
+                )
+                UNION ALL
+                SELECT DATE(ends_at), 0, 0, 1 FROM subscriptions WHERE status = 'expired'
+            ) events
+            GROUP BY day
+        """))
@@ -0,0 +1,26 @@
+"""
+the idempotency_keys table behind the Idempotency-Key header of the subscription writes
+"""
+import sqlalchemy as sa
+
+
+def upgrade(conn):
+    if sa.inspect(conn).has_table("idempotency_keys"):
+        return
+    metadata = sa.MetaData()
+    sa.Table("users", metadata, sa.Column("id", sa.Integer, primary_key=True))
+    idempotency_keys = sa.Table(
+        "idempotency_keys", metadata,
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("idempotency_key", sa.String(255), nullable=False),
+        sa.Column("fingerprint", sa.String(64), nullable=False),
+        sa.Column("status_code", sa.Integer, nullable=True),
+        sa.Column("body", sa.Text, nullable=True),
+        sa.Column("locked_until", sa.DateTime, nullable=False),
+        sa.Column("expires_at", sa.DateTime, nullable=False),
+        sa.Column("created_at", sa.DateTime, server_default=sa.func.now()),
+    )
+    idempotency_keys.create(conn)
+    sa.Index("uq_idempotency_keys_user_key", idempotency_keys.c.user_id, idempotency_keys.c.idempotency_key, unique=True).create(conn)
+    sa.Index("idx_idempotency_keys_expires_at", idempotency_keys.c.expires_at).create(conn)
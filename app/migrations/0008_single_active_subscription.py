@@ -0,0 +1,34 @@
+"""
+the generated active_user_id column of subscriptions and its unique index, which let a user
+have at most one active subscription. users who already have several keep the latest one
+(the one current_subscriptions points at), the others are cancelled as of its start, as if
+it had replaced them
+"""
+import sqlalchemy as sa
+
+EXPRESSION = "CASE WHEN status = 'active' THEN user_id END"
+
+
+def upgrade(conn):
+    inspector = sa.inspect(conn)
+    if "active_user_id" not in {column["name"] for column in inspector.get_columns("subscriptions")}:
+        duplicates = conn.execute(sa.text("""
+            SELECT id, user_id, starts_at FROM subscriptions
+            WHERE status = 'active' AND user_id IN (
+                SELECT user_id FROM subscriptions WHERE status = 'active' GROUP BY user_id HAVING COUNT(*) > 1
+            )
+            ORDER BY user_id, starts_at DESC, id DESC
+        """)).all()
+        kept = {}
+        for row in duplicates:
+            if row.user_id not in kept:
+                kept[row.user_id] = row.starts_at
+                continue
+            conn.execute(
+                sa.text("UPDATE subscriptions SET status = 'cancelled', ends_at = :ends_at WHERE id = :id"),
+                {"ends_at": kept[row.user_id], "id": row.id},
+            )
+        # VIRTUAL columns can be added in place by SQLite and MySQL, no table rebuild
+        conn.execute(sa.text(f"ALTER TABLE subscriptions ADD COLUMN active_user_id INTEGER GENERATED ALWAYS AS ({EXPRESSION}) VIRTUAL"))
+    subscriptions = sa.Table("subscriptions", sa.MetaData(), sa.Column("active_user_id", sa.Integer))
+    sa.Index("uq_subscriptions_active_user_id", subscriptions.c.active_user_id, unique=True).create(conn, checkfirst=True)
@@ -0,0 +1,37 @@
+"""
+the outbox_events table, to which the subscription writes append their changes, and the
+outbox_checkpoints of the dispatcher delivering them (see app/utils/outbox.py)
+"""
+import sqlalchemy as sa
+
+
+def upgrade(conn):
+    inspector = sa.inspect(conn)
+    metadata = sa.MetaData()
+    outbox_events = sa.Table(
+        "outbox_events", metadata,
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("event_type", sa.String(40), nullable=False),
+        sa.Column("user_id", sa.Integer, nullable=False),
+        sa.Column("subscription_id", sa.Integer, nullable=True),
+        sa.Column("payload", sa.Text, nullable=False),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+        # ids must never be reused once the events are purged, the checkpoints point at them
+        sqlite_autoincrement=True,
+    )
+    outbox_checkpoints = sa.Table(
+        "outbox_checkpoints", metadata,
+        sa.Column("consumer", sa.String(64), primary_key=True),
+        sa.Column("last_event_id", sa.Integer, nullable=False),
+        sa.Column("attempts", sa.Integer, nullable=False),
+        sa.Column("next_attempt_at", sa.DateTime, nullable=True),
+        sa.Column("last_error", sa.String(500), nullable=True),
+        sa.Column("lease_owner", sa.String(64), nullable=True),
+        sa.Column("lease_until", sa.DateTime, nullable=True),
+        sa.Column("updated_at", sa.DateTime, nullable=True),
+    )
+    if not inspector.has_table("outbox_events"):
+        outbox_events.create(conn)
+        sa.Index("idx_outbox_events_created_at", outbox_events.c.created_at).create(conn)
+    if not inspector.has_table("outbox_checkpoints"):
+        outbox_checkpoints.create(conn)
@@ -0,0 +1,17 @@
+"""
+the outbox_gaps table, where the dispatcher records the event ids its checkpoint moved past
+without the event, so that events committed after OUTBOX_GAP_TIMEOUT are still delivered
+"""
+import sqlalchemy as sa
+
+
+def upgrade(conn):
+    if sa.inspect(conn).has_table("outbox_gaps"):
+        return
+    metadata = sa.MetaData()
+    sa.Table(
+        "outbox_gaps", metadata,
+        sa.Column("consumer", sa.String(64), primary_key=True),
+        sa.Column("event_id", sa.Integer, primary_key=True),
+        sa.Column("skipped_at", sa.DateTime, nullable=False),
+    ).create(conn)
@@ -0,0 +1,16 @@
+"""
+the job_leases table, through which only one worker runs the expiry sweeper thread
+"""
+import sqlalchemy as sa
+
+
+def upgrade(conn):
+    if sa.inspect(conn).has_table("job_leases"):
+        return
+    metadata = sa.MetaData()
+    sa.Table(
+        "job_leases", metadata,
+        sa.Column("name", sa.String(64), primary_key=True),
+        sa.Column("owner", sa.String(64), nullable=True),
+        sa.Column("lease_until", sa.DateTime, nullable=True),
+    ).create(conn)
@@ -0,0 +1,9 @@
+"""
+schema migrations, applied in order by "flask db upgrade" (see app/utils/migrations.py).
+
+a migration is a module named <version>_<name>.py with an upgrade(conn) function. it
+defines the tables it touches itself instead of importing the models, which keep changing
+after it was written. every migration checks what already exists before changing it, so
+that databases created by db.create_all(), which the app used to run at every boot, can be
+brought under version control by running all of them.
+"""
@@ -1,2 +1,5 @@
 from .users import User
-from .subscriptions import Subscription, SubscriptionPlan
+from .subscriptions import CurrentSubscription, DailyRollup, PlanRollup, Subscription, SubscriptionPlan
+from .idempotency_keys import IdempotencyKey
+from .outbox import OutboxCheckpoint, OutboxEvent, OutboxGap
+from .job_leases import JobLease
@@ -0,0 +1,29 @@
+from app.extensions import db
+from sqlalchemy.sql import func
+
+class IdempotencyKey(db.Model):
+    """
+    an Idempotency-Key sent with a mutating request and the response it got, replayed to
+    the retries of that request. a row without status_code is a request still running
+    (until locked_until). rows are purged after expires_at, see app/utils/idempotency.py
+    """
+    __tablename__ = "idempotency_keys"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    idempotency_key = db.Column(db.String(255), nullable=False)
+    # sha256 of the method, path and body, a key reused for another request is rejected
+    fingerprint = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer, nullable=True)
+    body = db.Column(db.Text, nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, server_default=func.now())
+
+    def __repr__(self):
+        return f"<IdempotencyKey {self.user_id}:{self.idempotency_key}>"
+
+# one row per key and user, the claim of a key is an insert that only one request wins
+db.Index("uq_idempotency_keys_user_key", IdempotencyKey.user_id, IdempotencyKey.idempotency_key, unique=True)
+# the purge of expired keys
+db.Index("idx_idempotency_keys_expires_at", IdempotencyKey.expires_at)
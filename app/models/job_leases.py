@@ -0,0 +1,15 @@
+from app.extensions import db
+
+class JobLease(db.Model):
+    """
+    the worker (owner, until lease_until) running a background job that every worker may
+    start but only one should run at a time, e.g. the expiry sweeper
+    """
+    __tablename__ = "job_leases"
+
+    name = db.Column(db.String(64), primary_key=True)
+    owner = db.Column(db.String(64), nullable=True)
+    lease_until = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<JobLease {self.name} {self.owner}>"
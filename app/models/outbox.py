@@ -0,0 +1,61 @@
+from app.extensions import db
+
+class OutboxEvent(db.Model):
+    """
+    a change of a subscription, appended in the transaction that made it and delivered to
+    the downstream systems by the outbox dispatcher (see app/utils/outbox.py). ids only grow
+    (AUTOINCREMENT on SQLite), consumers use them to drop the duplicates of a redelivery
+    """
+    __tablename__ = "outbox_events"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(40), nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    subscription_id = db.Column(db.Integer, nullable=True)
+    # JSON of the event's fields
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<OutboxEvent {self.id} {self.event_type}>"
+
+
+class OutboxCheckpoint(db.Model):
+    """
+    how far a consumer of the outbox got: the events up to last_event_id were delivered.
+    the dispatcher holding the lease (lease_owner, until lease_until) is the only one
+    delivering, failed deliveries are retried from next_attempt_at
+    """
+    __tablename__ = "outbox_checkpoints"
+
+    consumer = db.Column(db.String(64), primary_key=True)
+    last_event_id = db.Column(db.Integer, nullable=False, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.String(500), nullable=True)
+    lease_owner = db.Column(db.String(64), nullable=True)
+    lease_until = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<OutboxCheckpoint {self.consumer} {self.last_event_id}>"
+
+class OutboxGap(db.Model):
+    """
+    an event id a consumer's checkpoint moved past without the event: it was missing for
+    OUTBOX_GAP_TIMEOUT seconds, so its transaction was taken to be rolled back. the
+    dispatcher still delivers the event if it commits later, the row is kept until then or
+    for OUTBOX_RETENTION seconds
+    """
+    __tablename__ = "outbox_gaps"
+
+    consumer = db.Column(db.String(64), primary_key=True)
+    event_id = db.Column(db.Integer, primary_key=True)
+    skipped_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<OutboxGap {self.consumer} {self.event_id}>"
+
+# the purge of delivered events
+db.Index("idx_outbox_events_created_at", OutboxEvent.created_at)
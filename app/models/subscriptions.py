@@ -41,6 +41,9 @@ class Subscription(db.Model):
     ends_at = db.Column(db.DateTime, nullable=False)
     created_at = db.Column(db.DateTime, server_default=func.now())
     updated_at = db.Column(db.DateTime, server_default=func.now(), onupdate=func.now())
+    # user_id while the subscription is active, NULL otherwise: its unique index lets a user
+    # have at most one active subscription (computed by the database, never written)
+    active_user_id = db.Column(db.Integer, db.Computed("CASE WHEN status = 'active' THEN user_id END", persisted=False))
 
     user = db.relationship("User", backref="subscriptions")
     plan = db.relationship("SubscriptionPlan", backref="subscriptions")
@@ -48,11 +51,14 @@ class Subscription(db.Model):
     def __repr__(self):
         return f"<Subscription {self.id}>"
     
-    def to_dict(self):
+    def to_dict(self, plan=None):
+        """
+        plan can be passed as a dict (e.g. from the plan catalog) to avoid lazy-loading it
+        """
         return {
             "id": self.id,
             "user_id": self.user_id,
-            "plan": self.plan.to_dict(),
+            "plan": plan if plan is not None else self.plan.to_dict(),
             "status": self.status,
             "starts_at": self.starts_at.isoformat(),
             "ends_at": self.ends_at.isoformat(),
@@ -72,5 +78,64 @@ class Subscription(db.Model):
     def is_expired(self):
         return self.status == "expired"
 
+class CurrentSubscription(db.Model):
+    """
+    one row per user holding their current active subscription, with the plan name and
+    description denormalized in, so that /active is a single primary-key read.
+    kept in sync by the subscription write paths in the same transaction, see
+    app/utils/current_subscriptions.py
+    """
+    __tablename__ = "current_subscriptions"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True, autoincrement=False)
+    subscription_id = db.Column(db.Integer, db.ForeignKey("subscriptions.id"), nullable=False)
+    plan_id = db.Column(db.Integer, db.ForeignKey("plans.id"), nullable=False)
+    name = db.Column(db.String(80), nullable=False)
+    description = db.Column(db.String(200), nullable=True)
+    status = db.Column(db.Enum("active", "cancelled", "expired", name="subscription_status"), nullable=False, default="active")
+    starts_at = db.Column(db.DateTime, nullable=False)
+    ends_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<CurrentSubscription {self.user_id}>"
+
+class PlanRollup(db.Model):
+    """
+    number of users whose current subscription (the current_subscriptions row) is on the
+    plan, so that the per-plan analytics read one row per plan. kept in sync with the
+    projection by the subscription write paths and the expiry sweeper, see
+    app/utils/rollups.py
+    """
+    __tablename__ = "plan_rollups"
+
+    plan_id = db.Column(db.Integer, db.ForeignKey("plans.id"), primary_key=True, autoincrement=False)
+    active_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<PlanRollup {self.plan_id}>"
+
+class DailyRollup(db.Model):
+    """
+    subscriptions started and lost per day: cancelled through /cancel, or expired (on the
+    day they lapsed). a subscription replaced by a new one (subscribing again) is not lost
+    """
+    __tablename__ = "daily_rollups"
+
+    day = db.Column(db.Date, primary_key=True)
+    started = db.Column(db.Integer, nullable=False, default=0)
+    cancelled = db.Column(db.Integer, nullable=False, default=0)
+    expired = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DailyRollup {self.day}>"
+
 # composite index created to speed up active subscription queries
-db.Index("idx_subscriptions_user_status_ends_at", Subscription.user_id, Subscription.status, Subscription.ends_at)
\ No newline at end of file
+db.Index("idx_subscriptions_user_status_ends_at", Subscription.user_id, Subscription.status, Subscription.ends_at)
+# supports the history endpoint, ordered by (starts_at, id) for a given user
+db.Index("idx_subscriptions_user_starts_at_id", Subscription.user_id, Subscription.starts_at, Subscription.id)
+# supports the expiry sweeper and the admin listing of all active subscriptions
+db.Index("idx_subscriptions_status_ends_at", Subscription.status, Subscription.ends_at)
+# one active subscription per user, enforced by the database (NULLs do not conflict)
+db.Index("uq_subscriptions_active_user_id", Subscription.active_user_id, unique=True)
+# the expiry sweeper drops projection rows by subscription id
+db.Index("idx_current_subscriptions_subscription_id", CurrentSubscription.subscription_id)
@@ -1,5 +1,4 @@
-from app.extensions import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.extensions import db, password_hasher
 from sqlalchemy.sql import func
 
 class User(db.Model):
@@ -8,14 +7,20 @@ class User(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password = db.Column(db.String(512), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
+    # bumped to revoke every token issued so far, see AuthUtils.revoke_user_tokens
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
     created_at = db.Column(db.DateTime, server_default=func.now())
     updated_at = db.Column(db.DateTime, server_default=func.now(), onupdate=func.now())
 
+    # hashing runs on the password hasher's process pool, see PasswordHasher
     def set_password(self, password):
-        self.password = generate_password_hash(password)
+        self.password = password_hasher.hash(password)
     
     def verify_password(self, password):
-        return check_password_hash(self.password, password)
+        return password_hasher.verify(self.password, password)
+
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password)
 
     def __repr__(self):
         return f"<User {self.email}>"
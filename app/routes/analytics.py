@@ -0,0 +1,76 @@
+from datetime import date, timedelta
+from flask import Blueprint, current_app, request
+from app.decorators.replica import replica_reads
+from app.decorators.security import admin_required
+from app.extensions import plan_catalog
+from app.utils import rollups
+from app.utils.pagination import clamp_page_size
+from app.utils.query_budget import query_budget
+from app.utils.response import make_response
+
+bp = Blueprint("analytics", __name__, url_prefix="/api/analytics")
+
+
+@bp.route("/plans", methods=["GET"])
+@query_budget(3)
+@admin_required
+@replica_reads
+def plan_metrics(user_id):
+    """
+    Active subscribers and monthly recurring revenue per plan (admin only).
+
+    OPTIMIZATION: Read from the plan_rollups table, which the write paths keep in sync, and
+    the plan catalog: one row per plan, whatever the number of subscriptions. MRR is
+    active subscribers times price_cents, the plans being priced per month.
+    """
+    counts = rollups.plan_counts()
+    data = []
+    for plan in plan_catalog.snapshot().plans.values():
+        active = counts.get(plan["id"], 0)
+        data.append({
+            "plan_id": plan["id"],
+            "name": plan["name"],
+            "price_cents": plan["price_cents"],
+            "active_subscribers": active,
+            "mrr_cents": active * plan["price_cents"],
+        })
+    meta = {
+        "active_subscribers": sum(row["active_subscribers"] for row in data),
+        "mrr_cents": sum(row["mrr_cents"] for row in data),
+    }
+    return make_response(message="Plan metrics fetched successfully", data=data, meta=meta, status_code=200)
+
+
+@bp.route("/churn", methods=["GET"])
+@query_budget(2)
+@admin_required
+@replica_reads
+def churn(user_id):
+    """
+    Subscriptions started, cancelled and expired per day over the last ?days days,
+    today included (admin only).
+
+    OPTIMIZATION: Read from the daily_rollups table, one row per day. Subscriptions
+    replaced by a new one are not counted as churned.
+    """
+    days = clamp_page_size(
+        request.args.get("days", type=int),
+        current_app.config["ANALYTICS_DEFAULT_DAYS"],
+        current_app.config["ANALYTICS_MAX_DAYS"],
+    )
+    today = date.today()
+    since = today - timedelta(days=days - 1)
+    counts = rollups.daily_counts(since)
+    data = []
+    for offset in range(days):
+        day = since + timedelta(days=offset)
+        started, cancelled, expired = counts.get(day, (0, 0, 0))
+        data.append({
+            "day": day.isoformat(),
+            "started": started,
+            "cancelled": cancelled,
+            "expired": expired,
+            "churned": cancelled + expired,
+        })
+    meta = {"days": days, "churned": sum(row["churned"] for row in data)}
+    return make_response(message="Churn fetched successfully", data=data, meta=meta, status_code=200)
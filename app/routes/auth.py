@@ -3,6 +3,8 @@ from marshmallow import ValidationError
 from app.models import User
 from app import db
 from app.utils.auth_utils import AuthUtils
+from app.utils.password_hasher import HashingOverloaded
+from app.utils.query_budget import query_budget
 from app.utils.response import make_response
 from app.schema.users import UserSchema
 
@@ -10,7 +12,14 @@ bp = Blueprint("auth", __name__, url_prefix="/api")
 
 user_schema = UserSchema()
 
+@bp.errorhandler(HashingOverloaded)
+def hashing_overloaded(e):
+    # OPTIMIZATION: Login/registration surges are shed instead of queueing behind the hashes
+    body, status_code = make_response(message="Too many concurrent logins, retry shortly", status_code=503)
+    return body, status_code, {"Retry-After": "1"}
+
 @bp.route("/register", methods=["POST"])
+@query_budget(2)
 def register():
     """
     User registration endpoint.
@@ -37,20 +46,25 @@ def register():
     user = User(email=email)
     user.set_password(password)
     db.session.add(user)
-    db.session.commit()
+    db.session.flush()
     
     # OPTIMIZATION: JWT token generation without additional database queries
     # This is stateless and efficient for authentication
-    token = AuthUtils.generate_token(user.id)
-    return make_response(message="User created successfully", data={"token": token, "user_id": user.id}, status_code=201)
+    # The token is built before commit expires the user, which would cost a reload
+    user_id = user.id
+    token = AuthUtils.generate_token(user_id, is_admin=user.is_admin, token_version=user.token_version)
+    db.session.commit()
+    return make_response(message="User created successfully", data={"token": token, "user_id": user_id}, status_code=201)
 
 @bp.route("/login", methods=["POST"])
+@query_budget(2)
 def login():
     """
     User login endpoint.
     
     OPTIMIZATION: Uses ORM for authentication but has security and performance considerations.
-    This endpoint performs password verification that could benefit from additional optimizations.
+    Password verification runs on the password hasher's process pool, so a login surge
+    does not hold the GIL of the worker serving the read endpoints.
     """
     data = request.get_json()
     try:
@@ -66,10 +80,18 @@ def login():
     user = db.session.query(User).filter_by(email=email).first()
     if not user or not user.verify_password(password):
         return make_response(message="Invalid credentials", status_code=401)
-    
+
     # OPTIMIZATION: JWT token generation
     # This is stateless and efficient - no database writes required
     # The token contains all necessary user information
-    token = AuthUtils.generate_token(user.id)
-    return make_response(message="Login successful", data={"token": token, "user_id": user.id}, status_code=200)
+    user_id = user.id
+    token = AuthUtils.generate_token(user_id, is_admin=user.is_admin, token_version=user.token_version)
+
+    # OPTIMIZATION: Hashes made with older parameters are upgraded while the plain
+    # password is at hand, costing one UPDATE on the first login after a change.
+    # The token is built first, as commit expires the user
+    if user.password_needs_rehash():
+        user.set_password(password)
+        db.session.commit()
+    return make_response(message="Login successful", data={"token": token, "user_id": user_id}, status_code=200)
 
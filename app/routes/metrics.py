@@ -0,0 +1,18 @@
+from flask import Blueprint, current_app
+from app.utils.metrics import render_metrics
+from app.utils.query_budget import query_budget
+
+bp = Blueprint("metrics", __name__)
+
+
+@bp.route("/metrics", methods=["GET"])
+@query_budget(0)
+def metrics():
+    """
+    Prometheus metrics of every worker: per-route request counts, latency histograms,
+    status codes and connection-pool gauges.
+
+    OPTIMIZATION: Nothing is computed per scrape beyond merging the metric files.
+    """
+    body, content_type = render_metrics()
+    return current_app.response_class(body, content_type=content_type)
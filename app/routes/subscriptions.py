@@ -1,20 +1,65 @@
-from flask import Blueprint, request
+from flask import Blueprint, current_app, request
 from marshmallow import ValidationError
+from app.decorators.idempotency import idempotent
+from app.decorators.replica import replica_reads
 from app.decorators.security import jwt_required, admin_required
-from app.utils.response import make_response
+from app.utils.response import make_response, make_cached_response, make_streaming_response, render_body, row_dicts
+from app.utils.query_budget import allow_extra_queries, query_budget
+from app.utils.pagination import clamp_page_size, decode_cursor, encode_cursor
+from app.utils.statement_registry import register_statement
 from app.models.subscriptions import Subscription, SubscriptionPlan
 from app import db
-from app.schema.subscriptions import SubscriptionSchema, SubscriptionPlanSchema
+from app.extensions import plan_catalog, read_replica, response_cache
+from app.utils import current_subscriptions, outbox, rollups
+from app.schema.subscriptions import BatchLookupSchema, SubscriptionSchema, SubscriptionPlanSchema
 from datetime import datetime, timedelta
-from sqlalchemy import text
+from functools import lru_cache
+from sqlalchemy import bindparam, insert, select, text, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from werkzeug.exceptions import RequestEntityTooLarge
 
 subscription_schema = SubscriptionSchema()
 plan_schema = SubscriptionPlanSchema()
 
+
+@lru_cache(maxsize=4)
+def _batch_lookup_schema(max_ids):
+    return BatchLookupSchema(max_ids=max_ids)
+
+
 bp = Blueprint("subscriptions", __name__, url_prefix="/api/subscriptions")
 
+@bp.errorhandler(RequestEntityTooLarge)
+def request_entity_too_large(e):
+    return make_response(message=f"Request body is larger than {request.max_content_length} bytes", status_code=413)
+
+# raw statements are registered with sample parameters so that "flask explain-queries"
+# (and tests/test_query_plans.py) can check their query plans
+
+# OPTIMIZATION: Raw SQL for subscription cancellation, shared by subscribe and cancel
+# This avoids the overhead of using the ORM for complex UPDATE operations
+cancel_active_query = register_statement("subscriptions.cancel_active", text("""
+    UPDATE subscriptions
+    SET status = 'cancelled', ends_at = :now
+    WHERE user_id = :uid AND status = 'active'
+"""), {"now": datetime.now(), "uid": 1})
+
+# the cancelled subscription's id is read back on dialects with UPDATE ... RETURNING. not
+# registered: MySQL cannot EXPLAIN it, and its plan is the one of subscriptions.cancel_active
+cancel_active_returning_query = text("""
+    UPDATE subscriptions
+    SET status = 'cancelled', ends_at = :now
+    WHERE user_id = :uid AND status = 'active'
+    RETURNING id
+""")
+
+active_exists_query = register_statement("subscriptions.active_exists", text(
+    "SELECT 1 FROM subscriptions WHERE user_id = :uid AND status = 'active' LIMIT 1"
+), {"uid": 1})
+
 
 @bp.route("/plans", methods=["POST"])
+@query_budget(4)
 @admin_required
 def create_plan(user_id):
     """
@@ -40,27 +85,41 @@ def create_plan(user_id):
     plan = SubscriptionPlan(name=name, description=description, price_cents=price_cents)
     db.session.add(plan)
     db.session.commit()
+    # plans only change here, so this is the single invalidation point of the catalog
+    plan_catalog.invalidate()
     return make_response(message="Plan created successfully", data=plan.to_dict(), status_code=201)
 
 @bp.route("/plans", methods=["GET"])
+@query_budget(1)
 def list_plans():
     """
     List all subscription plans.
     
-    OPTIMIZATION: Uses ORM for simple SELECT operations.
-    Plans table is typically small, so ORM overhead is negligible.
+    OPTIMIZATION: Served from the in-memory plan catalog as a pre-serialized body.
+    No query and no per-row serialization, and clients revalidating with
+    If-None-Match get a 304 without a body.
     """
-    plans = db.session.query(SubscriptionPlan).all()
-    return make_response(message="Plans fetched successfully", data=[plan.to_dict() for plan in plans], status_code=200)
+    snapshot = plan_catalog.snapshot()
+    return make_cached_response(snapshot.body, snapshot.etag, status_code=200)
 
 @bp.route("/subscribe", methods=["POST"])
+@query_budget(9)
 @jwt_required
+@idempotent
 def subscribe(user_id):
     """
     Subscribe to a subscription plan.
     
     OPTIMIZATION: Uses raw SQL for subscription cancellation to avoid multiple database round trips.
     This eliminates the need for separate SELECT + UPDATE operations.
+
+    OPTIMIZATION: Three statements in total: cancel UPDATE, INSERT and the projection upsert.
+    The analytics rollups add two upserts, and an UPDATE when an active subscription was
+    replaced. The outbox event adds an INSERT. With authentication and a cold plan catalog
+    that is nine statements at most.
+
+    OPTIMIZATION: Honours Idempotency-Key: retries of a completed request are answered with
+    its stored response without touching the subscriptions (see app/decorators/idempotency.py).
     """
     data = request.get_json()
     try:
@@ -71,35 +130,83 @@ def subscribe(user_id):
     plan_id = data["plan_id"]
     duration_days = data["duration_days"]
     
-    # OPTIMIZATION: Simple plan lookup using ORM - efficient for single record by primary key
-    plan = db.session.query(SubscriptionPlan).filter_by(id=plan_id).first()
+    # OPTIMIZATION: Plan lookup from the in-memory plan catalog, no query needed
+    plan = plan_catalog.get_plan(plan_id)
     if not plan:
         return make_response(message="Plan not found", status_code=404)
     
+    # OPTIMIZATION: No lock is taken: a concurrent subscribe of the same user that commits
+    # its row between our cancel UPDATE and INSERT makes the INSERT fail on the unique
+    # active_user_id index, and the transaction is retried with a fresh cancel
+    for _ in range(current_app.config["SUBSCRIBE_CONFLICT_RETRIES"] + 1):
+        try:
+            subscription = _replace_subscription(user_id, plan, duration_days)
+            break
+        except (IntegrityError, OperationalError) as e:
+            db.session.rollback()
+            if not is_write_conflict(e):
+                raise
+            # the cancel UPDATE and the INSERT that failed
+            allow_extra_queries(2)
+    else:
+        return make_response(message="Too many concurrent changes to this subscription, retry", status_code=409)
+    read_replica.pin(user_id)
+    response_cache.invalidate(user_id)
+    return make_response(message="Subscription created successfully", data=subscription.to_dict(plan=plan), status_code=200)
+
+def _replace_subscription(user_id, plan, duration_days):
+    """
+    cancels the user's active subscription and starts one on plan, in the session's transaction
+    """
     # OPTIMIZATION: Raw SQL for subscription cancellation
-    # This avoids the overhead of using the ORM for complex UPDATE operations
     now = datetime.now()
-    active_query = text("""
-        UPDATE subscriptions
-        SET status = 'cancelled', ends_at = :now
-        WHERE user_id = :uid AND status = 'active'
-    """)
-    db.session.execute(active_query, {"now": now, "uid": user_id})
-    
-    # Create new subscription using ORM for simple INSERT operations
-    subscription = Subscription(user_id=user_id, plan_id=plan_id, starts_at=now, ends_at=now + timedelta(days=duration_days))
-    db.session.add(subscription)
+    replaced = db.session.execute(cancel_active_query, {"now": now, "uid": user_id}).rowcount
+
+    # OPTIMIZATION: Core INSERT with every column set client-side, so the response is built
+    # without reloading the row after commit or lazy-loading its plan
+    values = {
+        "user_id": user_id,
+        "plan_id": plan["id"],
+        "status": "active",
+        "starts_at": now,
+        "ends_at": now + timedelta(days=duration_days),
+        "created_at": now,
+        "updated_at": now,
+    }
+    result = db.session.execute(insert(Subscription).values(**values))
+    subscription = Subscription(id=result.inserted_primary_key[0], **values)
+    rollups.subscription_started(user_id, plan["id"], replaced, now)
+    current_subscriptions.set_current(user_id, subscription.id, plan, subscription.starts_at, subscription.ends_at)
+    outbox.subscription_created(subscription, plan, replaced)
     db.session.commit()
-    return make_response(message="Subscription created successfully", data=subscription.to_dict(), status_code=200)
+    return subscription
+
+
+def is_write_conflict(error):
+    """
+    whether error is a concurrent write of the same user's subscription: a violation of the
+    unique active_user_id index, or a deadlock (MySQL 1213) between the two transactions
+    """
+    message = str(error.orig)
+    if isinstance(error, IntegrityError):
+        return "active_user_id" in message
+    return getattr(error.orig, "args", (None,))[0] == 1213 or "Deadlock found" in message
 
 @bp.route("/change-plan", methods=["POST"])
+@query_budget(7)
 @jwt_required
+@idempotent
 def change_plan(user_id):
     """
     Change the plan of an active subscription.
     
-    OPTIMIZATION: Uses single JOIN query to fetch subscription and plan in one database round trip.
-    This eliminates the need for two separate queries and improves performance.
+    OPTIMIZATION: The plan is checked against the in-memory plan catalog, and the subscription
+    is updated and read back with a single UPDATE ... RETURNING (an UPDATE and a SELECT on
+    dialects without RETURNING, such as MySQL). Together with the projection update that is
+    two statements, with no ORM reload or lazy plan load. Moving the user between the plan
+    rollups adds two, the outbox event one.
+
+    OPTIMIZATION: Honours Idempotency-Key, as subscribe does.
     """
     data = request.get_json()
     
@@ -107,37 +214,49 @@ def change_plan(user_id):
     if not plan_id:
         return make_response(message="Plan ID is required", status_code=400)
     
-    # OPTIMIZATION: Single JOIN query instead of two separate queries
-    # This fetches both the subscription and plan details in one database round trip
-    query = text("""
-        SELECT s.id, s.user_id, s.plan_id, s.status, s.starts_at, s.ends_at,
-               p.id as new_plan_id, p.name as new_plan_name, p.description as new_plan_description
-        FROM subscriptions s
-        CROSS JOIN plans p
-        WHERE s.user_id = :uid AND s.status = 'active' AND p.id = :plan_id
-        LIMIT 1
-    """)
-    
-    result = db.session.execute(query, {"uid": user_id, "plan_id": plan_id}).mappings().first()
-    
-    if not result:
-        # Check if user has no active subscription
-        subscription_check = db.session.query(Subscription).filter_by(user_id=user_id, status="active").first()
-        if not subscription_check:
+    plan = plan_catalog.get_plan(plan_id)
+    if not plan:
+        # the missing subscription is reported first, as before
+        if not active_subscription_exists(user_id):
             return make_response(message="You do not have an active subscription to change", status_code=400)
-        else:
-            return make_response(message="Plan not found", status_code=404)
+        return make_response(message="Plan not found", status_code=404)
+    
+    table = Subscription.__table__
+    now = datetime.now()
+    stmt = (
+        update(table)
+        .where(table.c.user_id == user_id, table.c.status == "active")
+        .values(plan_id=plan["id"], updated_at=now)
+    )
+    if db.session.get_bind().dialect.update_returning:
+        row = db.session.execute(stmt.returning(*table.c)).mappings().first()
+    else:
+        updated = db.session.execute(stmt).rowcount
+        row = db.session.execute(
+            select(*table.c).where(table.c.user_id == user_id, table.c.status == "active").limit(1)
+        ).mappings().first() if updated else None
+    if not row:
+        db.session.rollback()
+        return make_response(message="You do not have an active subscription to change", status_code=400)
     
-    # Update the subscription with the new plan
-    subscription = db.session.query(Subscription).filter_by(id=result.id).first()
-    subscription.plan_id = plan_id
+    rollups.plan_changed(user_id, plan["id"])
+    current_subscriptions.set_current_plan(user_id, plan)
+    outbox.plan_changed(user_id, row["id"], plan, now)
     db.session.commit()
+    read_replica.pin(user_id)
+    response_cache.invalidate(user_id)
     
-    return make_response(message="Subscription plan changed successfully", data=subscription.to_dict(), status_code=200)
+    subscription = Subscription(**row)
+    return make_response(message="Subscription plan changed successfully", data=subscription.to_dict(plan=plan), status_code=200)
+
+def active_subscription_exists(user_id):
+    return db.session.execute(active_exists_query, {"uid": user_id}).first() is not None
 
 
 @bp.route("/cancel", methods=["POST"])
+@query_budget(6)
 @jwt_required
+@idempotent
 def cancel_subscription(user_id):
     """
     Cancel the user's active subscription.
@@ -150,101 +269,307 @@ def cancel_subscription(user_id):
 
     OPTIMIZATION: Raw SQL for subscription cancellation
     This eliminates the overhead of using the ORM and avoids select + update in separate steps
+
+    The rollups are only updated, and the outbox event appended, when a subscription was
+    actually cancelled. The event carries the cancelled subscription's id, returned by the
+    UPDATE (read from the current_subscriptions projection on dialects without RETURNING,
+    such as MySQL).
+
+    OPTIMIZATION: Honours Idempotency-Key, as subscribe does.
     """
-    query = text("""
-        UPDATE subscriptions
-        SET status = 'cancelled', ends_at = :now
-        WHERE user_id = :uid AND status = 'active'
-    """)
-    db.session.execute(query, {"now": datetime.now(), "uid": user_id})
+    now = datetime.now()
+    params = {"now": now, "uid": user_id}
+    if db.session.get_bind().dialect.update_returning:
+        cancelled_id = db.session.execute(cancel_active_returning_query, params).scalar()
+        cancelled = cancelled_id is not None
+    else:
+        cancelled, cancelled_id = db.session.execute(cancel_active_query, params).rowcount > 0, None
+        if cancelled:
+            # the projection still points at the subscription just cancelled
+            allow_extra_queries(1)
+            cancelled_id = current_subscriptions.current_subscription_id(user_id)
+    if cancelled:
+        rollups.subscription_cancelled(user_id, now)
+        outbox.subscription_cancelled(user_id, cancelled_id, now)
+    current_subscriptions.clear_current(user_id)
     db.session.commit()
+    read_replica.pin(user_id)
+    response_cache.invalidate(user_id)
     return make_response(message="Subscription cancelled successfully", status_code=200)
 
+def not_expired_clause(alias="s"):
+    """
+    OPTIMIZATION: Once the expiry sweeper keeps status accurate (SUBSCRIPTION_STATUS_AUTHORITATIVE),
+    status = 'active' alone identifies live subscriptions and the time predicate is dropped.
+    """
+    if current_app.config["SUBSCRIPTION_STATUS_AUTHORITATIVE"]:
+        return ""
+    return f"AND ({alias}.ends_at IS NULL OR {alias}.ends_at > :now)"
+
 @bp.route("/active", methods=["GET"])
+@query_budget(2)
 @jwt_required
+@replica_reads
 def get_active_subscription(user_id):
     """
     Get the user's current active subscription.
     
-    OPTIMIZATION: Uses raw SQL with JOIN to avoid ORM overhead and leverage database indexes.
-    This query is performance-critical and benefits from direct SQL execution.
+    OPTIMIZATION: Reads the current_subscriptions projection, which holds one row per user
+    with the plan name and description denormalized in. This makes the endpoint a single
+    primary-key read with no join, sort or scan over the user's history.
+
+    OPTIMIZATION: Served from the per-user response cache until the user's next write or
+    expiry (see UserResponseCache), polling clients get no query and can revalidate
+    with If-None-Match.
+    """
+    def load():
+        return active_body(db.session.execute(active_query(), {"uid": user_id, "now": datetime.now()}).first())
 
-    OPTIMIZATION: Raw SQL join using indexes on (user_id, status, ends_at) to speed up the query
+    cached = response_cache.get_or_load(user_id, "active", load)
+    return make_cached_response(cached.body, cached.etag, status_code=200)
+
+def active_body(subscription):
+    """
+    body of GET /active for the active_query row (or None) and the expiry of the cached
+    response, shared with the async serving mode (app/asgi.py) like history_body
     """
-    query = text("""
-             SELECT s.id, p.name, p.description, p.id as plan_id, s.starts_at, s.ends_at, s.status
-             FROM subscriptions s
-             JOIN plans p ON p.id = s.plan_id
-             WHERE s.user_id = :uid AND s.status = 'active'
-             AND (s.ends_at IS NULL OR s.ends_at > :now)
-             ORDER BY s.starts_at DESC
-             LIMIT 1
+    body = render_body(message="Active subscription fetched successfully", data=subscription._asdict() if subscription else None)
+    # until the sweeper has run, the subscription stops being returned at ends_at
+    lapses = subscription and not current_app.config["SUBSCRIPTION_STATUS_AUTHORITATIVE"]
+    return body, subscription.ends_at if lapses else None
+
+def active_query():
+    return _active_query(not_expired_clause("c"))
+
+@lru_cache(maxsize=2)
+def _active_query(not_expired):
+    return text(f"""
+             SELECT c.subscription_id as id, c.name, c.description, c.plan_id, c.starts_at, c.ends_at, c.status
+             FROM current_subscriptions c
+             WHERE c.user_id = :uid
+             {not_expired}
              """)
-    subscription = db.session.execute(query, {"uid": user_id, "now": datetime.now()}).mappings().first()
-    return make_response(message="Active subscription fetched successfully", data=dict(subscription) if subscription else None, status_code=200)
+
+register_statement("subscriptions.active", active_query, lambda: {"uid": 1, "now": datetime.now()})
+
+def all_active_query():
+    return f"""
+    SELECT s.user_id, s.id, p.name, p.description, p.id as plan_id, s.starts_at, s.ends_at, s.status
+    FROM subscriptions s
+    JOIN plans p ON p.id = s.plan_id
+    WHERE s.status = 'active'
+    {not_expired_clause()}
+"""
+
+def active_for_users_query(chunk_size):
+    return _active_for_users_query(chunk_size, all_active_query())
+
+@lru_cache(maxsize=8)
+def _active_for_users_query(chunk_size, base_query):
+    """
+    OPTIMIZATION: The IN list always has chunk_size placeholders, so the statement text
+    is the same for every lookup (shorter chunks are padded by repeating their last id)
+    and the number of bind variables stays under the SQLite/MySQL limits.
+    """
+    placeholders = ", ".join(f":uid{i}" for i in range(chunk_size))
+    return text(f"{base_query} AND s.user_id IN ({placeholders})")
+
+register_statement("subscriptions.all_active", lambda: text(all_active_query()), lambda: {"now": datetime.now()})
+
+def _active_for_users_sample():
+    params = {f"uid{i}": i + 1 for i in range(current_app.config["BATCH_LOOKUP_CHUNK_SIZE"])}
+    params["now"] = datetime.now()
+    return params
+
+register_statement(
+    "subscriptions.active_for_users",
+    lambda: active_for_users_query(current_app.config["BATCH_LOOKUP_CHUNK_SIZE"]),
+    _active_for_users_sample,
+)
+
+def iter_active_for_users(user_ids, chunk_size):
+    """
+    yields the active subscriptions of user_ids, one list of row mappings per chunk
+    """
+    user_ids = sorted(set(user_ids))
+    query = active_for_users_query(chunk_size)
+    now = datetime.now()
+    for offset in range(0, len(user_ids), chunk_size):
+        if offset:
+            allow_extra_queries(1)
+        chunk = user_ids[offset:offset + chunk_size]
+        chunk += [chunk[-1]] * (chunk_size - len(chunk))
+        params = {f"uid{i}": uid for i, uid in enumerate(chunk)}
+        params["now"] = now
+        yield db.session.execute(query, params).fetchall()
 
 @bp.route("/active/all", methods=["GET"])
+@query_budget(2)
 @admin_required
+@replica_reads
 def get_all_active_subscriptions(user_id):
     """
     Get all active subscriptions (admin only).
     
     OPTIMIZATION: Uses raw SQL to avoid ORM overhead for bulk operations.
     This endpoint can return many records, making ORM overhead significant.
+
+    OPTIMIZATION: ?format=ndjson (one row per line) and ?format=json-stream (the usual
+    envelope, written incrementally) stream the rows from a server-side cursor in batches
+    of EXPORT_BATCH_SIZE, so memory per request stays constant and the first byte is
+    sent as soon as the first batch is read.
     """
+    export_format = request.args.get("format", "json")
+    if export_format not in ("json", "ndjson", "json-stream"):
+        return make_response(message="Invalid format", status_code=400)
+
     user_ids = request.args.get("user_ids", None)
     if user_ids:
-        user_ids = user_ids.split(",")
+        try:
+            user_ids = [int(uid) for uid in user_ids.split(",")]
+        except ValueError:
+            return make_response(message="Invalid user_ids", status_code=400)
     else:
         user_ids = None
-    
+
+    message = "All active subscriptions fetched successfully"
+
+    # OPTIMIZATION: Filtering by user_ids goes through the same fixed-size chunked lookup as
+    # POST /active/batch. Long lists should use that endpoint to stay clear of URL length limits.
+    if user_ids:
+        batches = iter_active_for_users(user_ids, current_app.config["BATCH_LOOKUP_CHUNK_SIZE"])
+        if export_format != "json":
+            return make_streaming_response(batches, message=message, ndjson=export_format == "ndjson")
+        return make_response(message=message, data=[row for batch in batches for row in row_dicts(batch)], status_code=200)
+
     # OPTIMIZATION: Using raw SQL avoids ORM overhead like object instantiation for every row
     # This is crucial for bulk operations where many records are returned
-    query_str = """
-        SELECT s.user_id, s.id, p.name, p.description, p.id as plan_id, s.starts_at, s.ends_at, s.status
-        FROM subscriptions s
-        JOIN plans p ON p.id = s.plan_id
-        WHERE s.status = 'active'
-        AND (s.ends_at IS NULL OR s.ends_at > :now)
+    query = text(all_active_query())
+    params = {"now": datetime.now()}
+    if export_format != "json":
+        batch_size = current_app.config["EXPORT_BATCH_SIZE"]
+        result = db.session.execute(query, params, execution_options={"stream_results": True, "yield_per": batch_size})
+        return make_streaming_response(result.partitions(batch_size), message=message, ndjson=export_format == "ndjson")
+
+    subscriptions = db.session.execute(query, params).fetchall()
+    return make_response(message=message, data=row_dicts(subscriptions), status_code=200)
+
+@bp.route("/active/batch", methods=["POST"])
+@query_budget(2)
+@admin_required
+@replica_reads
+def batch_active_subscriptions(user_id):
     """
+    Look up the active subscriptions of a large list of users (admin only).
 
-    params = {"now": datetime.now()}
+    OPTIMIZATION: The ids travel in the body, so there is no URL length limit, and the lookup
+    runs in fixed-size chunks (BATCH_LOOKUP_CHUNK_SIZE) whose results are merged. Every chunk
+    reuses one statement text and stays under the bind-variable limit on SQLite and MySQL.
+    """
+    # the id count is checked before the ids are deserialized, MAX_CONTENT_LENGTH bounds the body
+    try:
+        data = _batch_lookup_schema(current_app.config["BATCH_LOOKUP_MAX_IDS"]).load(request.get_json())
+    except ValidationError as e:
+        return make_response(message="Invalid input", error=e.messages, status_code=400)
 
-    # OPTIMIZATION: Dynamic query construction with parameterized placeholders
-    # This prevents SQL injection while maintaining query efficiency
-    # if user_ids is provided, add the user_ids to the query using placeholders
-    if user_ids:
-        placeholders = ", ".join(f":uid{i}" for i in range(len(user_ids)))
-        query_str += f" AND s.user_id IN ({placeholders})"
-        for i, uid in enumerate(user_ids):
-            params[f"uid{i}"] = uid
+    batches = iter_active_for_users(data["user_ids"], current_app.config["BATCH_LOOKUP_CHUNK_SIZE"])
+    return make_response(
+        message="Active subscriptions fetched successfully",
+        data=[row for batch in batches for row in row_dicts(batch)],
+        status_code=200,
+    )
 
-    query = text(query_str)
-    subscriptions = db.session.execute(query, params).mappings().fetchall()
-    return make_response(message="All active subscriptions fetched successfully", data=[dict(subscription) for subscription in subscriptions], status_code=200)
+# OPTIMIZATION: id breaks ties between rows sharing starts_at so that pages are stable
+history_page_query = text("""
+         SELECT s.id, p.name, p.description, p.id as plan_id, s.starts_at, s.ends_at, s.status
+         FROM subscriptions s
+         JOIN plans p ON p.id = s.plan_id
+         WHERE s.user_id = :uid
+         ORDER BY s.starts_at DESC, s.id DESC
+         LIMIT :limit OFFSET :offset
+         """)
+
+# the redundant "starts_at <= :cursor_starts_at" gives both SQLite and MySQL a range bound on the index
+history_after_cursor_query = text("""
+         SELECT s.id, p.name, p.description, p.id as plan_id, s.starts_at, s.ends_at, s.status
+         FROM subscriptions s
+         JOIN plans p ON p.id = s.plan_id
+         WHERE s.user_id = :uid
+         AND s.starts_at <= :cursor_starts_at
+         AND (s.starts_at < :cursor_starts_at OR s.id < :cursor_id)
+         ORDER BY s.starts_at DESC, s.id DESC
+         LIMIT :limit
+         """).bindparams(bindparam("cursor_starts_at", type_=db.DateTime))
+
+register_statement("subscriptions.history_page", history_page_query, {"uid": 1, "limit": 11, "offset": 0})
+register_statement("subscriptions.history_after_cursor", history_after_cursor_query, lambda: {
+    "uid": 1, "limit": 11, "cursor_starts_at": datetime.now(), "cursor_id": 1,
+})
 
 @bp.route("/history", methods=["GET"])
+@query_budget(2)
 @jwt_required
+@replica_reads
 def get_subscription_history(user_id):
     """
     Get paginated subscription history for the authenticated user.
     
     OPTIMIZATION: Uses raw SQL with pagination to prevent memory issues and improve performance.
     This endpoint can return large datasets, making pagination and raw SQL essential.
+
+    OPTIMIZATION: Keyset (cursor) pagination on (starts_at, id), backed by the
+    (user_id, starts_at, id) index. Unlike OFFSET, the cost of a page does not grow
+    with its depth. Every response carries meta.next_cursor; page/page_size still work.
+
+    OPTIMIZATION: The first page, which polling clients ask for, is served from the
+    per-user response cache like /active.
     """
-    page = request.args.get("page", 1, type=int)
-    page_size = request.args.get("page_size", 10, type=int)
-    offset = (page - 1) * page_size
-    
-    # OPTIMIZATION: For subscription history, pagination is introduced for optimization
-    # Raw SQL with limit/offset is used here to avoid the overhead of using the ORM
-    query = text("""
-             SELECT s.id, p.name, p.description, p.id as plan_id, s.starts_at, s.ends_at, s.status
-             FROM subscriptions s
-             JOIN plans p ON p.id = s.plan_id
-             WHERE s.user_id = :uid
-             ORDER BY s.starts_at DESC
-             LIMIT :limit OFFSET :offset
-             """)
-    subscriptions = db.session.execute(query, {"uid": user_id, "limit": page_size, "offset": offset}).mappings().fetchall()
-    return make_response(message="Subscription history fetched successfully", data=[dict(subscription) for subscription in subscriptions], status_code=200)
+    try:
+        query, params, page_size, cache_kind = history_request(user_id, request.args)
+    except ValueError:
+        return make_response(message="Invalid cursor", status_code=400)
+
+    def load():
+        return history_body(db.session.execute(query, params).fetchall(), page_size), None
+
+    if cache_kind is None:
+        body, _ = load()
+        return current_app.response_class(body, status=200, mimetype="application/json")
+    cached = response_cache.get_or_load(user_id, cache_kind, load)
+    return make_cached_response(cached.body, cached.etag, status_code=200)
+
+def history_request(user_id, args):
+    """
+    returns (query, params, page_size, cache_kind) for the query string of GET /history,
+    cache_kind is None for the pages that are not cached. raises ValueError for an
+    invalid cursor
+    """
+    page_size = clamp_page_size(
+        args.get("page_size", type=int),
+        current_app.config["HISTORY_DEFAULT_PAGE_SIZE"],
+        current_app.config["HISTORY_MAX_PAGE_SIZE"],
+    )
+    cursor = args.get("cursor")
+
+    # one extra row is fetched to know whether there is a next page
+    params = {"uid": user_id, "limit": page_size + 1}
+    if cursor:
+        params["cursor_starts_at"], params["cursor_id"] = decode_cursor(cursor)
+        return history_after_cursor_query, params, page_size, None
+    page = max(args.get("page", 1, type=int), 1)
+    params["offset"] = (page - 1) * page_size
+    return history_page_query, params, page_size, f"history:{page_size}" if page == 1 else None
+
+def history_body(subscriptions, page_size):
+    """
+    body of GET /history for the rows of a history query (page_size + 1 at most)
+    """
+    next_cursor = None
+    if len(subscriptions) > page_size:
+        subscriptions = subscriptions[:page_size]
+        next_cursor = encode_cursor(subscriptions[-1].starts_at, subscriptions[-1].id)
+    return render_body(
+        message="Subscription history fetched successfully",
+        data=row_dicts(subscriptions),
+        meta={"next_cursor": next_cursor, "page_size": page_size},
+    )
@@ -20,4 +20,32 @@ class SubscriptionSchema(Schema):
     plan_id = fields.Int(required=True, validate=validate.Range(min=1))
     duration_days = fields.Int(required=True, validate=validate.Range(min=1))
     created_at = fields.DateTime(dump_only=True)
-    updated_at = fields.DateTime(dump_only=True)
\ No newline at end of file
+    updated_at = fields.DateTime(dump_only=True)
+
+
+class BoundedList(fields.List):
+    """
+    a List whose Length validators run before its items are deserialized, so that an
+    oversized list is rejected without converting every item first
+    """
+    def _deserialize(self, value, attr, data, **kwargs):
+        if isinstance(value, list):
+            for validator in self.validators:
+                if isinstance(validator, validate.Length):
+                    validator(value)
+        return super()._deserialize(value, attr, data, **kwargs)
+
+
+class BatchLookupSchema(Schema):
+    """
+    schema for validating input on the active subscriptions batch lookup endpoint, with at
+    most max_ids user ids (BATCH_LOOKUP_MAX_IDS)
+    """
+    user_ids = BoundedList(fields.Int(validate=validate.Range(min=1)), required=True, validate=validate.Length(min=1))
+
+    def __init__(self, *args, max_ids=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if max_ids is not None:
+            # a new list: the field's copy still shares the declared field's validators
+            field = self.fields["user_ids"]
+            field.validators = [*field.validators, validate.Length(max=max_ids, error="At most {max} user_ids are allowed")]
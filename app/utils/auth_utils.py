@@ -1,37 +1,123 @@
 import jwt
 from datetime import datetime, timedelta, timezone
 from flask import current_app
-from app import db
-from app.models import User
+from sqlalchemy import text
+from app.extensions import db, principal_cache
+from app.utils.principal_cache import Principal
+
+# shared by the sync routes and the async ones (app/asgi.py)
+principal_query = text("SELECT id, is_admin, token_version FROM users WHERE id = :uid")
 
 class AuthUtils:
     """
     utility class for generating and verifying JWT tokens
     """
     @staticmethod
-    def generate_token(user_id, expires_in=3600):
+    def generate_token(user_id, expires_in=3600, is_admin=False, token_version=0):
+        # OPTIMIZATION: admin status and token version are signed into the token
+        # so that authenticating a request only needs the principal cache
         payload = {
             "exp": datetime.now(timezone.utc) + timedelta(seconds=expires_in),
             "iat": datetime.now(timezone.utc),
-            "sub": str(user_id)
+            "sub": str(user_id),
+            "adm": bool(is_admin),
+            "ver": token_version or 0
         }
         return jwt.encode(payload, current_app.config["JWT_SECRET"], algorithm="HS256")
-    
+
     @staticmethod
-    def verify_token(token):
+    def decode_token(token):
         try:
-            payload = jwt.decode(token, current_app.config["JWT_SECRET"], algorithms=["HS256"])
-            return int(payload["sub"])
+            return jwt.decode(token, current_app.config["JWT_SECRET"], algorithms=["HS256"])
         except jwt.ExpiredSignatureError:
             return None
         except jwt.DecodeError:
             return None
         except jwt.InvalidTokenError:
             return None
-        
+
     @staticmethod
-    def get_user_from_token(token):
-        user_id = AuthUtils.verify_token(token)
-        if user_id:
-            return db.session.get(User, user_id)
+    def verify_token(token):
+        payload = AuthUtils.decode_token(token)
+        if payload:
+            return int(payload["sub"])
         return None
+
+    @staticmethod
+    def bearer_token(auth_header):
+        """
+        returns (token, None) for an "Authorization: Bearer" header, otherwise (None, the
+        message of the 401 response)
+        """
+        if not auth_header:
+            return None, "Unauthorized"
+        if not auth_header.startswith("Bearer "):
+            return None, "Invalid token"
+        return auth_header.split(" ", 1)[1], None
+
+    @staticmethod
+    def token_claims(token):
+        """
+        returns (user_id, payload) of a valid token, (None, None) otherwise
+        """
+        payload = AuthUtils.decode_token(token)
+        if not payload:
+            return None, None
+        try:
+            return int(payload["sub"]), payload
+        except (KeyError, ValueError):
+            return None, None
+
+    @staticmethod
+    def principal_from_row(row):
+        """
+        caches and returns the principal of a principal_query row (None when there is no row)
+        """
+        if row is None:
+            return None
+        principal = Principal(id=row.id, is_admin=bool(row.is_admin), token_version=row.token_version)
+        principal_cache.set(principal)
+        return principal
+
+    @staticmethod
+    def load_principal(user_id):
+        """
+        returns the current principal for user_id, from the principal cache if possible
+        and otherwise from the users table (the result is then cached)
+        """
+        principal = principal_cache.get(user_id)
+        if principal:
+            return principal
+        return AuthUtils.principal_from_row(db.session.execute(principal_query, {"uid": user_id}).first())
+
+    @staticmethod
+    def authorize(payload, principal):
+        """
+        validates the token claims against the current principal.
+        a token is rejected when its version is older than the user's token version (revoked),
+        and admin rights require both the signed claim and the current admin flag (demotion)
+        """
+        if not principal or payload.get("ver", 0) != principal.token_version:
+            return None
+        return Principal(
+            id=principal.id,
+            is_admin=bool(payload.get("adm")) and principal.is_admin,
+            token_version=principal.token_version
+        )
+
+    @staticmethod
+    def get_principal_from_token(token):
+        user_id, payload = AuthUtils.token_claims(token)
+        if user_id is None:
+            return None
+        return AuthUtils.authorize(payload, AuthUtils.load_principal(user_id))
+
+    @staticmethod
+    def revoke_user_tokens(user):
+        """
+        invalidates every token issued to the user so far. the caller is responsible for committing.
+        other processes pick the change up once their cached principal expires, or at once
+        when they share the principal cache's backend (CACHE_BACKEND)
+        """
+        user.token_version = (user.token_version or 0) + 1
+        principal_cache.invalidate(user.id)
@@ -0,0 +1,56 @@
+"""
+cache backends shared by the caches of the app, selected by CACHE_BACKEND:
+
+- "memory": MemoryBackend, an LRU in each gunicorn worker (the default)
+- "shared": SharedMemoryBackend, one mmap'd file (CACHE_SHARED_FILE, in the instance
+  folder by default) used by every process of the host
+- "redis://...": NetworkBackend, a store shared by every host (needs the redis package).
+  "fake://local" and the fake://host:port of app.utils.cache.fake stand in for it
+
+every backend has TTLs, versioned keys (bump a group to drop its keys) and pub/sub.
+with CACHE_NEAR_ENTRIES > 0 the shared and network backends get a per-worker LRU in
+front (TieredBackend), kept coherent through the pub/sub messages.
+benchmarks/bench_cache.py measures get/set latency with several processes contending
+"""
+import os
+from app.utils.cache.memory import MemoryBackend
+from app.utils.cache.shared import SharedMemoryBackend
+from app.utils.cache.tiered import TieredBackend
+
+
+def create_backend(url, namespace="", max_entries=10000, shared_file=None, near_entries=0, near_ttl=5.0):
+    """
+    backend for url ("memory", "shared", "shared:///path/to/file", "redis://..." or
+    "fake://..."), keys are prefixed with namespace. max_entries only bounds the memory
+    backend, the shared one is sized by the file layout and the network one by the store
+    """
+    if url in ("memory", "memory://"):
+        return MemoryBackend(max_entries=max_entries, namespace=namespace)
+    if url == "shared" or url.startswith("shared://"):
+        path = url[len("shared://"):] or shared_file
+        if not path:
+            raise ValueError("the shared cache backend needs a file, e.g. shared:///run/app/cache")
+        backend = SharedMemoryBackend(path, namespace=namespace)
+    elif url.startswith(("redis://", "rediss://", "fake://")):
+        from app.utils.cache.network import connect
+
+        backend = connect(url, namespace=namespace)
+    else:
+        raise ValueError(f"unknown CACHE_BACKEND {url!r}, expected memory, shared or a redis:// url")
+    if near_entries:
+        return TieredBackend(backend, near_entries=near_entries, near_ttl=near_ttl)
+    return backend
+
+
+def cache_backend(app, namespace, max_entries=10000):
+    """
+    backend configured by app's CACHE_* settings for the cache named namespace
+    """
+    return create_backend(
+        app.config.get("CACHE_BACKEND", "memory"),
+        namespace=namespace,
+        max_entries=max_entries,
+        shared_file=app.config.get("CACHE_SHARED_FILE") or os.path.join(app.instance_path, "cache.shared"),
+        near_entries=app.config.get("CACHE_NEAR_ENTRIES", 0),
+        near_ttl=app.config.get("CACHE_NEAR_TTL", 5.0),
+    )
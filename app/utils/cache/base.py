@@ -0,0 +1,82 @@
+import pickle
+
+
+class CacheBackend:
+    """
+    interface of the cache backends. keys are strings, values any picklable object,
+    ttl is in seconds (None keeps the entry until it is evicted or deleted).
+
+    versioned keys: version(group) is a counter that bump(group) increments atomically
+    for every process sharing the backend, versioned_key(group, key) embeds it in the key,
+    so bumping the group drops all its keys at once without enumerating them.
+
+    pub/sub: publish(channel, message) reaches the callbacks that subscribe(channel,
+    callback) registered in every process sharing the backend. delivery happens in poll(),
+    which callers run before trusting data the messages could invalidate. a callback
+    receives None when messages were lost (e.g. an overflowed ring) and must then assume
+    anything changed
+    """
+    name = None
+
+    def __init__(self, namespace=""):
+        self.namespace = namespace
+        self._subscribers = {}
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}" if self.namespace else key
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, *keys):
+        raise NotImplementedError
+
+    def incr(self, key):
+        """
+        atomically increments the integer at key (0 when missing), returns the new value
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def version(self, group):
+        return self.get(f"{group}#version") or 0
+
+    def bump(self, group):
+        return self.incr(f"{group}#version")
+
+    def versioned_key(self, group, key):
+        return f"{group}@{self.version(group)}:{key}"
+
+    def subscribe(self, channel, callback):
+        self._subscribers.setdefault(self._key(channel), []).append(callback)
+
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    def poll(self):
+        """
+        delivers the messages published since the last poll, returns how many
+        """
+        return 0
+
+    def _deliver(self, channel, message):
+        for callback in self._subscribers.get(channel, ()):
+            callback(message)
+
+    def stats(self):
+        return {"backend": self.name}
+
+
+def dumps(value):
+    # only this app writes to the stores it reads, so pickle is safe and keeps the types
+    # (e.g. the namedtuples of the principal cache)
+    return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def loads(data):
+    return pickle.loads(data)
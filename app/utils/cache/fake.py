@@ -0,0 +1,131 @@
+"""
+local stand-in for the network store of NetworkBackend: the subset of Redis' commands the
+adapter uses, kept in a dict.
+
+- fake://local is a store private to the process, for tests
+- fake://host:port connects to a store served by start_fake_server() (a multiprocessing
+  manager process), so that several processes share it over a socket like they would a
+  Redis server. benchmarks/bench_cache.py runs the network backend against it
+"""
+import fnmatch
+import threading
+import time
+from multiprocessing.managers import BaseManager
+
+AUTHKEY = b"fake-network-store"
+
+
+class FakePubSub:
+    def __init__(self, store):
+        self._store = store
+        self._messages = []
+        self._arrived = threading.Condition()
+
+    def subscribe(self, *channels):
+        with self._store._lock:
+            for channel in channels:
+                self._store._subscribers.setdefault(_bytes(channel), []).append(self)
+
+    def get_message(self, ignore_subscribe_messages=True, timeout=0):
+        with self._arrived:
+            if not self._messages and timeout:
+                self._arrived.wait(timeout)
+            return self._messages.pop(0) if self._messages else None
+
+    def _push(self, message):
+        with self._arrived:
+            self._messages.append(message)
+            self._arrived.notify()
+
+
+class FakeNetworkStore:
+    def __init__(self):
+        self._data = {}
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(_bytes(key))
+            return entry[0] if entry else None
+
+    def set(self, key, value, px=None):
+        expires_at = time.monotonic() + px / 1000 if px is not None else None
+        with self._lock:
+            self._data[_bytes(key)] = (_bytes(value), expires_at)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(_bytes(key), None) is not None for key in keys)
+
+    def incr(self, key):
+        key = _bytes(key)
+        with self._lock:
+            entry = self._live(key)
+            value = int(entry[0]) + 1 if entry else 1
+            self._data[key] = (str(value).encode(), entry[1] if entry else None)
+            return value
+
+    def scan_iter(self, match="*"):
+        with self._lock:
+            return [key for key in self._data if fnmatch.fnmatchcase(key.decode(), match)]
+
+    def publish(self, channel, message):
+        channel = _bytes(channel)
+        with self._lock:
+            subscribers = self._subscribers.get(channel, [])
+            for pubsub in subscribers:
+                pubsub._push({"type": "message", "channel": channel, "data": _bytes(message)})
+            return len(subscribers)
+
+    def pubsub(self, ignore_subscribe_messages=True):
+        return FakePubSub(self)
+
+
+def _bytes(value):
+    return value.encode() if isinstance(value, str) else value
+
+
+_served = FakeNetworkStore()
+_local = FakeNetworkStore()
+
+
+def _served_store():
+    return _served
+
+
+class FakeStoreManager(BaseManager):
+    pass
+
+
+FakeStoreManager.register("store", callable=_served_store, method_to_typeid={"pubsub": "pubsub"})
+FakeStoreManager.register("pubsub", create_method=False)
+
+
+def start_fake_server(host="127.0.0.1", port=0):
+    """
+    serves a FakeNetworkStore from a child process, returns the manager (shutdown() stops
+    it) and the fake:// url to connect to
+    """
+    manager = FakeStoreManager(address=(host, port), authkey=AUTHKEY)
+    manager.start()
+    host, port = manager.address
+    return manager, f"fake://{host}:{port}"
+
+
+def connect_fake(url):
+    address = url[len("fake://"):]
+    if address == "local":
+        return _local
+    host, port = address.rsplit(":", 1)
+    manager = FakeStoreManager(address=(host, int(port)), authkey=AUTHKEY)
+    manager.connect()
+    return manager.store()
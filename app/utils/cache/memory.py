@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict
+from app.utils.cache.base import CacheBackend
+
+
+class MemoryBackend(CacheBackend):
+    """
+    in-process LRU of at most max_entries entries, each gunicorn worker holds its own.
+    values are stored as is (not copied), published messages only reach this process.
+    counters (incr, the group versions) are kept apart from the LRU, so that evicting
+    one never takes a version back to a value that older keys were built with
+    """
+    name = "memory"
+
+    def __init__(self, max_entries=10000, namespace=""):
+        super().__init__(namespace)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        key = self._key(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return self._counters.get(key)
+            if entry[1] is not None and entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        key = self._key(key)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(self._key(key), None)
+                self._counters.pop(self._key(key), None)
+
+    def incr(self, key):
+        key = self._key(key)
+        with self._lock:
+            value = self._counters[key] = self._counters.get(key, 0) + 1
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def publish(self, channel, message):
+        self._deliver(self._key(channel), message)
+
+    def stats(self):
+        with self._lock:
+            return {"backend": self.name, "entries": len(self._entries), "evictions": self.evictions}
@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from collections import deque
+from app.utils.cache.base import CacheBackend, dumps, loads
+
+
+class NetworkBackend(CacheBackend):
+    """
+    adapter over a network key-value store with Redis' commands and client API (redis-py,
+    or the FakeNetworkStore of app.utils.cache.fake for local runs and tests), shared by
+    every host connected to it. every operation is a round trip, put a TieredBackend in
+    front of it for per-request lookups.
+
+    messages go through the store's pub/sub. a listener thread receives them as they are
+    published and poll() only delivers what it queued, so polling costs no round trip
+    """
+    name = "network"
+
+    def __init__(self, client, namespace=""):
+        super().__init__(namespace)
+        self.client = client
+        self._pubsub = None
+        self._listener_pid = None
+        self._received = deque()
+
+    def get(self, key):
+        data = self.client.get(self._key(key))
+        if data is None:
+            return None
+        # counters are stored as plain integers, so that INCR works on them
+        return int(data) if data.isdigit() else loads(data)
+
+    def set(self, key, value, ttl=None):
+        px = max(int(ttl * 1000), 1) if ttl is not None else None
+        self.client.set(self._key(key), dumps(value), px=px)
+        return True
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(self._key(key) for key in keys))
+
+    def incr(self, key):
+        return self.client.incr(self._key(key))
+
+    def clear(self):
+        """
+        drops the namespace's entries but its counters, like MemoryBackend.clear
+        """
+        pattern = f"{self.namespace}:*" if self.namespace else "*"
+        keys = [key for key in self.client.scan_iter(match=pattern) if not key.endswith(b"#version")]
+        if keys:
+            self.client.delete(*keys)
+
+    def subscribe(self, channel, callback):
+        super().subscribe(channel, callback)
+        self._listen()
+
+    def _listen(self):
+        # the listener does not survive a fork, each worker starts its own
+        if self._listener_pid == os.getpid():
+            return
+        self._listener_pid = os.getpid()
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(*self._subscribers)
+        threading.Thread(target=self._receive, args=(self._pubsub,), name="cache-pubsub", daemon=True).start()
+
+    def _receive(self, pubsub):
+        while pubsub is self._pubsub:
+            try:
+                message = pubsub.get_message(timeout=1.0)
+            except Exception:
+                # messages published while the connection is down are lost
+                self._received.append(None)
+                time.sleep(1.0)
+                continue
+            if message is not None and message["type"] == "message":
+                self._received.append(message)
+
+    def publish(self, channel, message):
+        self.client.publish(self._key(channel), dumps(message))
+
+    def poll(self):
+        if self._listener_pid is None:
+            return 0
+        self._listen()
+        delivered = 0
+        while self._received:
+            message = self._received.popleft()
+            if message is None:
+                for callbacks in self._subscribers.values():
+                    for callback in callbacks:
+                        callback(None)
+                continue
+            channel = message["channel"]
+            self._deliver(channel.decode() if isinstance(channel, bytes) else channel, loads(message["data"]))
+            delivered += 1
+        return delivered
+
+
+def connect(url, namespace=""):
+    """
+    NetworkBackend for a redis:// or rediss:// url, which needs the redis package, or
+    for a fake:// url served by app.utils.cache.fake
+    """
+    if url.startswith("fake://"):
+        from app.utils.cache.fake import connect_fake
+
+        return NetworkBackend(connect_fake(url), namespace=namespace)
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError(f"CACHE_BACKEND={url} needs the redis package (pip install redis)") from None
+    return NetworkBackend(redis.Redis.from_url(url), namespace=namespace)
@@ -0,0 +1,293 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from app.utils.cache.base import CacheBackend, dumps, loads
+
+# magic, layout version, buckets, ways, slot_size, ring_size, message_size, published messages
+_HEADER = struct.Struct("<4sIIIIIIQ")
+_MAGIC = b"CCHE"
+_LAYOUT = 1
+_HEADER_SIZE = 64
+# key hash, expires_at (epoch seconds, 0 = never), data length, flags
+_SLOT = struct.Struct("<QdII")
+# sequence number, data length
+_MESSAGE = struct.Struct("<QI4x")
+_KEY_LENGTH = struct.Struct("<H")
+_PINNED = 1
+# per-process locks of the buckets, POSIX record locks do not exclude threads of one process
+_STRIPES = 64
+
+
+def _hash(key):
+    # 0 marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+
+
+class _MappedFile:
+    """
+    a cache file mapped in this process. backends on the same path share it, as the fcntl
+    locks of one process do not exclude each other and closing any descriptor of the
+    file would release them all
+    """
+    _open = {}
+    _lock = threading.Lock()
+
+    def __init__(self, fd, mapped, layout):
+        self.pid = os.getpid()
+        self.fd = fd
+        self.map = mapped
+        self.layout = layout
+        self.thread_locks = [threading.Lock() for _ in range(_STRIPES + 1)]
+
+    @classmethod
+    def open(cls, path, layout, size):
+        path = os.path.abspath(path)
+        with cls._lock:
+            mapped = cls._open.get(path)
+            if mapped is not None and mapped.pid == os.getpid():
+                if mapped.layout != layout:
+                    raise ValueError(f"{path} is already mapped with another layout")
+                return mapped
+            # the descriptor inherited from the parent is left alone, the parent's locks
+            # do not carry over to this process anyway
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+            try:
+                if os.pread(fd, len(layout), 0) != layout:
+                    # new file or another layout: start over
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, layout, 0)
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN)
+            mapped = cls._open[path] = cls(fd, mmap.mmap(fd, size), layout)
+            return mapped
+
+
+class SharedMemoryBackend(CacheBackend):
+    """
+    cache shared by every process of the host that maps the same file: the gunicorn
+    workers, the CLI commands and the expiry sweeper see each other's writes at once.
+
+    the file holds a hash table of buckets * ways fixed-size slots and a ring of the last
+    ring_size published messages. a key lives in one bucket (ways slots, 4 by default),
+    a full bucket evicts the entry that expires first, and counters (incr, the group
+    versions) are only evicted from a bucket full of them. an entry whose key and pickled
+    value do not fit in slot_size is not stored (set returns False). readers take a shared
+    and writers an exclusive fcntl lock on the bucket's bytes, so a get costs two syscalls
+    and a copy of the slot; subscribers check the ring's sequence number (one 8-byte read)
+    on every poll.
+
+    the file is mapped on first use in each process (after gunicorn forked its workers)
+    and is recreated when its layout does not match the arguments
+    """
+    name = "shared"
+
+    def __init__(self, path, buckets=16384, ways=4, slot_size=256, ring_size=1024, message_size=256, namespace=""):
+        super().__init__(namespace)
+        self.path = path
+        self.buckets = buckets
+        self.ways = ways
+        self.slot_size = slot_size
+        self.ring_size = ring_size
+        self.message_size = message_size
+        self._slots_offset = _HEADER_SIZE
+        self._ring_offset = _HEADER_SIZE + buckets * ways * slot_size
+        self._size = self._ring_offset + ring_size * message_size
+        self._file = None
+        self._seen = 0
+        self.evictions = 0
+        self.oversized = 0
+
+    def _mapped(self):
+        mapped = self._file
+        if mapped is None or mapped.pid != os.getpid():
+            mapped = self._file = _MappedFile.open(self.path, self._layout(), self._size)
+            self._seen = self._published(mapped.map)
+        return mapped
+
+    def _layout(self):
+        return _HEADER.pack(_MAGIC, _LAYOUT, self.buckets, self.ways, self.slot_size,
+                            self.ring_size, self.message_size, 0)[:-8]
+
+    @contextmanager
+    def _locked(self, stripe, start, length, exclusive):
+        mapped = self._mapped()
+        with mapped.thread_locks[stripe]:
+            fcntl.lockf(mapped.fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH, length, start)
+            try:
+                yield mapped.map
+            finally:
+                fcntl.lockf(mapped.fd, fcntl.LOCK_UN, length, start)
+
+    def _bucket(self, key_hash, exclusive):
+        bucket = key_hash % self.buckets
+        start = self._slots_offset + bucket * self.ways * self.slot_size
+        return start, self._locked(bucket % _STRIPES, start, self.ways * self.slot_size, exclusive)
+
+    def _find(self, mapped, start, key_hash, key):
+        """
+        returns the offset of key's slot in the bucket starting at start, or None
+        """
+        encoded = key.encode()
+        for way in range(self.ways):
+            offset = start + way * self.slot_size
+            slot_hash, _, length, _ = _SLOT.unpack_from(mapped, offset)
+            if slot_hash == key_hash and length:
+                data = offset + _SLOT.size
+                (key_length,) = _KEY_LENGTH.unpack_from(mapped, data)
+                if mapped[data + _KEY_LENGTH.size:data + _KEY_LENGTH.size + key_length] == encoded:
+                    return offset
+        return None
+
+    def _read(self, mapped, offset):
+        _, expires_at, length, flags = _SLOT.unpack_from(mapped, offset)
+        data = offset + _SLOT.size
+        (key_length,) = _KEY_LENGTH.unpack_from(mapped, data)
+        return expires_at, flags, bytes(mapped[data + _KEY_LENGTH.size + key_length:data + length])
+
+    def _write(self, mapped, start, key_hash, key, payload, expires_at, flags):
+        encoded = key.encode()
+        length = _KEY_LENGTH.size + len(encoded) + len(payload)
+        if _SLOT.size + length > self.slot_size:
+            self.oversized += 1
+            return False
+        offset = self._find(mapped, start, key_hash, key)
+        if offset is None:
+            offset = self._victim(mapped, start)
+        data = offset + _SLOT.size
+        mapped[data:data + length] = _KEY_LENGTH.pack(len(encoded)) + encoded + payload
+        _SLOT.pack_into(mapped, offset, key_hash, expires_at, length, flags)
+        return True
+
+    def _victim(self, mapped, start):
+        now = time.time()
+        victim, victim_rank = None, None
+        for way in range(self.ways):
+            offset = start + way * self.slot_size
+            _, expires_at, length, flags = _SLOT.unpack_from(mapped, offset)
+            if not length or (expires_at and expires_at <= now):
+                return offset
+            rank = (flags & _PINNED, expires_at or float("inf"))
+            if victim_rank is None or rank < victim_rank:
+                victim, victim_rank = offset, rank
+        self.evictions += 1
+        return victim
+
+    def get(self, key):
+        key = self._key(key)
+        key_hash = _hash(key)
+        start, locked = self._bucket(key_hash, exclusive=False)
+        with locked as mapped:
+            offset = self._find(mapped, start, key_hash, key)
+            if offset is None:
+                return None
+            expires_at, _, payload = self._read(mapped, offset)
+        if expires_at and expires_at <= time.time():
+            return None
+        return loads(payload)
+
+    def set(self, key, value, ttl=None):
+        key = self._key(key)
+        key_hash = _hash(key)
+        payload = dumps(value)
+        expires_at = time.time() + ttl if ttl is not None else 0.0
+        start, locked = self._bucket(key_hash, exclusive=True)
+        with locked as mapped:
+            return self._write(mapped, start, key_hash, key, payload, expires_at, 0)
+
+    def delete(self, *keys):
+        for key in keys:
+            key = self._key(key)
+            key_hash = _hash(key)
+            start, locked = self._bucket(key_hash, exclusive=True)
+            with locked as mapped:
+                offset = self._find(mapped, start, key_hash, key)
+                if offset is not None:
+                    _SLOT.pack_into(mapped, offset, 0, 0.0, 0, 0)
+
+    def incr(self, key):
+        key = self._key(key)
+        key_hash = _hash(key)
+        start, locked = self._bucket(key_hash, exclusive=True)
+        with locked as mapped:
+            offset = self._find(mapped, start, key_hash, key)
+            value = (loads(self._read(mapped, offset)[2]) if offset is not None else 0) + 1
+            self._write(mapped, start, key_hash, key, dumps(value), 0.0, _PINNED)
+        return value
+
+    def clear(self):
+        """
+        drops every entry but the counters, like MemoryBackend.clear
+        """
+        for bucket in range(self.buckets):
+            start, locked = self._bucket(bucket, exclusive=True)
+            with locked as mapped:
+                for way in range(self.ways):
+                    offset = start + way * self.slot_size
+                    if not _SLOT.unpack_from(mapped, offset)[3] & _PINNED:
+                        _SLOT.pack_into(mapped, offset, 0, 0.0, 0, 0)
+
+    @staticmethod
+    def _published(mapped):
+        return struct.unpack_from("<Q", mapped, _HEADER.size - 8)[0]
+
+    def subscribe(self, channel, callback):
+        # messages are delivered from the first subscription on
+        self._mapped()
+        super().subscribe(channel, callback)
+
+    def publish(self, channel, message):
+        payload = dumps((self._key(channel), message))
+        if _MESSAGE.size + len(payload) > self.message_size:
+            raise ValueError(f"message of {len(payload)} bytes does not fit in message_size={self.message_size}")
+        with self._locked(_STRIPES, self._ring_offset, self.ring_size * self.message_size, exclusive=True) as mapped:
+            sequence = self._published(mapped) + 1
+            offset = self._ring_offset + (sequence - 1) % self.ring_size * self.message_size
+            mapped[offset + _MESSAGE.size:offset + _MESSAGE.size + len(payload)] = payload
+            _MESSAGE.pack_into(mapped, offset, sequence, len(payload))
+            struct.pack_into("<Q", mapped, _HEADER.size - 8, sequence)
+
+    def poll(self):
+        if self._published(self._mapped().map) == self._seen:
+            return 0
+        messages = []
+        with self._locked(_STRIPES, self._ring_offset, self.ring_size * self.message_size, exclusive=False) as mapped:
+            published = self._published(mapped)
+            lost = published - self._seen > self.ring_size
+            for sequence in range(max(self._seen, published - self.ring_size) + 1, published + 1):
+                offset = self._ring_offset + (sequence - 1) % self.ring_size * self.message_size
+                stored, length = _MESSAGE.unpack_from(mapped, offset)
+                if stored != sequence:
+                    lost = True
+                    continue
+                messages.append(bytes(mapped[offset + _MESSAGE.size:offset + _MESSAGE.size + length]))
+            self._seen = published
+        if lost:
+            for callbacks in self._subscribers.values():
+                for callback in callbacks:
+                    callback(None)
+        for payload in messages:
+            self._deliver(*loads(payload))
+        return len(messages)
+
+    def stats(self):
+        mapped = self._mapped().map
+        now = time.time()
+        entries = 0
+        for slot in range(self.buckets * self.ways):
+            _, expires_at, length, _ = _SLOT.unpack_from(mapped, self._slots_offset + slot * self.slot_size)
+            entries += bool(length) and not (expires_at and expires_at <= now)
+        return {
+            "backend": self.name,
+            "entries": entries,
+            "capacity": self.buckets * self.ways,
+            "evictions": self.evictions,
+            "oversized": self.oversized,
+        }
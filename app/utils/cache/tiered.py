@@ -0,0 +1,94 @@
+import time
+from collections import namedtuple
+from app.utils.cache.base import CacheBackend
+from app.utils.cache.memory import MemoryBackend
+
+CHANNEL = "invalidate"
+
+# remote values carry their expiry, so that a copy never outlives the entry it was read from
+_Stamped = namedtuple("_Stamped", ["value", "expires_at"])
+
+
+class TieredBackend(CacheBackend):
+    """
+    per-worker LRU (the near cache) in front of a shared or network backend. reads are
+    served from the LRU once a key was read, without a lock or a round trip; delete, incr
+    and clear publish the keys they change, and every get first polls the messages, so
+    each worker drops its stale copies before serving. set does not notify: values are
+    meant to change through delete (cache-aside), so that a set only stores what any
+    worker would have loaded.
+
+    the shared backend's messages are visible as soon as they are published, the network
+    backend's once its listener thread received them (a round trip later).
+    copies expire with the remote entry, and after near_ttl at the latest, which bounds
+    how long a lost message (e.g. a restarted network store) can leave them stale
+    """
+    name = "tiered"
+
+    def __init__(self, remote, near_entries=10000, near_ttl=5.0):
+        super().__init__(remote.namespace)
+        self.remote = remote
+        self.near = MemoryBackend(max_entries=near_entries)
+        self.near_ttl = near_ttl
+        self.near_hits = 0
+        remote.subscribe(CHANNEL, self._invalidated)
+
+    def _invalidated(self, keys):
+        if keys is None:
+            self.near.clear()
+        else:
+            self.near.delete(*keys)
+
+    def get(self, key):
+        self.remote.poll()
+        value = self.near.get(key)
+        if value is not None:
+            self.near_hits += 1
+            return value
+        value = self.remote.get(key)
+        if isinstance(value, _Stamped):
+            stamped, value = value, value.value
+            ttl = self.near_ttl
+            if stamped.expires_at is not None:
+                ttl = min(ttl, stamped.expires_at - time.time())
+            if ttl > 0:
+                self.near.set(key, value, ttl=ttl)
+        elif value is not None:
+            # counters are stored as is
+            self.near.set(key, value, ttl=self.near_ttl)
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl is not None else None
+        stored = self.remote.set(key, _Stamped(value, expires_at), ttl=ttl)
+        if stored:
+            self.near.set(key, value, ttl=min(ttl, self.near_ttl) if ttl is not None else self.near_ttl)
+        return stored
+
+    def delete(self, *keys):
+        self.remote.delete(*keys)
+        self.near.delete(*keys)
+        self.remote.publish(CHANNEL, list(keys))
+
+    def incr(self, key):
+        value = self.remote.incr(key)
+        self.near.delete(key)
+        self.remote.publish(CHANNEL, [key])
+        return value
+
+    def clear(self):
+        self.remote.clear()
+        self.near.clear()
+        self.remote.publish(CHANNEL, None)
+
+    def subscribe(self, channel, callback):
+        self.remote.subscribe(channel, callback)
+
+    def publish(self, channel, message):
+        self.remote.publish(channel, message)
+
+    def poll(self):
+        return self.remote.poll()
+
+    def stats(self):
+        return {**self.remote.stats(), "near_entries": self.near.stats()["entries"], "near_hits": self.near_hits}
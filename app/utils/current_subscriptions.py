@@ -0,0 +1,129 @@
+"""
+maintenance of the current_subscriptions projection (see CurrentSubscription).
+
+the write helpers only execute statements, committing is left to the caller so that the
+projection changes in the same transaction as the subscriptions table.
+"""
+from collections import namedtuple
+from sqlalchemy import bindparam, delete, insert, select, text, update
+from app.extensions import db, response_cache
+from app.models.subscriptions import CurrentSubscription
+from app.utils.statement_registry import register_statement
+
+DriftReport = namedtuple("DriftReport", ["checked", "missing", "stale", "extra"])
+
+table = CurrentSubscription.__table__
+
+# latest active subscription per user, the same row the original /active query picks
+expected_query = """
+    SELECT s.user_id, s.id as subscription_id, s.plan_id, p.name, p.description, s.status, s.starts_at, s.ends_at
+    FROM subscriptions s
+    JOIN plans p ON p.id = s.plan_id
+    WHERE s.status = 'active'
+    AND NOT EXISTS (
+        SELECT 1 FROM subscriptions s2
+        WHERE s2.user_id = s.user_id AND s2.status = 'active'
+        AND (s2.starts_at > s.starts_at OR (s2.starts_at = s.starts_at AND s2.id > s.id))
+    )
+"""
+
+register_statement("current_subscriptions.expected", text(expected_query))
+
+COLUMNS = ["user_id", "subscription_id", "plan_id", "name", "description", "status", "starts_at", "ends_at"]
+
+
+def set_current(user_id, subscription_id, plan, starts_at, ends_at):
+    """
+    OPTIMIZATION: a single upsert statement (ON CONFLICT on SQLite, ON DUPLICATE KEY on MySQL)
+    plan is the plan dict from the plan catalog
+    """
+    values = {
+        "user_id": user_id,
+        "subscription_id": subscription_id,
+        "plan_id": plan["id"],
+        "name": plan["name"],
+        "description": plan["description"],
+        "status": "active",
+        "starts_at": starts_at,
+        "ends_at": ends_at,
+    }
+    # the dialect modules are imported here, only the engine's own is loaded at startup
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects import mysql
+
+        stmt = mysql.insert(table).values(**values)
+        stmt = stmt.on_duplicate_key_update({k: stmt.inserted[k] for k in COLUMNS[1:]})
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects import sqlite
+
+        stmt = sqlite.insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(index_elements=["user_id"], set_={k: stmt.excluded[k] for k in COLUMNS[1:]})
+    else:
+        db.session.execute(delete(table).where(table.c.user_id == user_id))
+        stmt = insert(table).values(**values)
+    db.session.execute(stmt)
+
+
+def set_current_plan(user_id, plan):
+    db.session.execute(
+        update(table)
+        .where(table.c.user_id == user_id)
+        .values(plan_id=plan["id"], name=plan["name"], description=plan["description"])
+    )
+
+
+def current_subscription_id(user_id):
+    return db.session.execute(select(table.c.subscription_id).where(table.c.user_id == user_id)).scalar()
+
+
+def clear_current(user_id):
+    db.session.execute(delete(table).where(table.c.user_id == user_id))
+
+
+clear_subscriptions_query = text(
+    "DELETE FROM current_subscriptions WHERE subscription_id IN :ids"
+).bindparams(bindparam("ids", expanding=True))
+register_statement("current_subscriptions.clear_subscriptions", clear_subscriptions_query, {"ids": [1, 2, 3]})
+
+
+def clear_subscriptions(subscription_ids):
+    """
+    drops the rows pointing at subscription_ids, used when they expire
+    """
+    if subscription_ids:
+        db.session.execute(clear_subscriptions_query, {"ids": list(subscription_ids)})
+
+
+def rebuild():
+    """
+    recomputes the whole projection from the subscriptions table in one transaction,
+    returns the number of rows written
+    """
+    db.session.execute(delete(table))
+    db.session.execute(text(f"INSERT INTO current_subscriptions ({', '.join(COLUMNS)}) {expected_query}"))
+    count = db.session.query(CurrentSubscription).count()
+    db.session.commit()
+    # cached /active responses were rendered from the old rows
+    response_cache.invalidate_all()
+    return count
+
+
+def verify():
+    """
+    compares the projection with what rebuild() would write, without changing anything
+    """
+    def normalize(row):
+        return tuple(str(row[column]) for column in COLUMNS)
+
+    expected = {row["user_id"]: normalize(row) for row in db.session.execute(text(expected_query)).mappings()}
+    actual = {
+        row["user_id"]: normalize(row)
+        for row in db.session.execute(text(f"SELECT {', '.join(COLUMNS)} FROM current_subscriptions")).mappings()
+    }
+    return DriftReport(
+        checked=len(expected),
+        missing=sorted(set(expected) - set(actual)),
+        stale=sorted(uid for uid in set(expected) & set(actual) if expected[uid] != actual[uid]),
+        extra=sorted(set(actual) - set(expected)),
+    )
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+slow_query_logger = logging.getLogger("app.slow_queries")
+
+_whitespace = re.compile(r"\s+")
+_string_literal = re.compile(r"'(?:[^']|'')*'")
+_placeholder = re.compile(r"%\(\w+\)s|%s|\?|(?<!:):\w+")
+_number = re.compile(r"\b\d+(?:\.\d+)?\b")
+_value_list = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+
+
+def fingerprint(statement):
+    """
+    normalizes a statement so that its variants share one text and one hash: literals and
+    placeholders become ?, and lists of them (e.g. the dynamic IN (:uid0, :uid1, ...) lists)
+    collapse to (...)
+    """
+    sql = _whitespace.sub(" ", statement).strip()
+    sql = _string_literal.sub("?", sql)
+    sql = _placeholder.sub("?", sql)
+    sql = _number.sub("?", sql)
+    sql = _value_list.sub("(...)", sql)
+    return hashlib.sha1(sql.encode()).hexdigest()[:12], sql
+
+
+def request_stats():
+    """
+    statements executed by the current request: count, total DB time and the slowest one
+    """
+    return {
+        "count": g.get("query_count", 0),
+        "total_ms": g.get("query_total_ms", 0.0),
+        "slowest_ms": g.get("query_slowest_ms", 0.0),
+        "slowest": g.get("query_slowest"),
+    }
+
+
+def queries_executed():
+    return g.get("query_count", 0)
+
+
+def init_db_instrumentation(app, engines):
+    """
+    counts the statements executed by every request on engines, the primary and the read
+    replica (used by the query budgets).
+
+    with DB_INSTRUMENTATION set, statements are also timed: every response gets a
+    Server-Timing header with the query count, total DB time and slowest statement, and
+    statements slower than SLOW_QUERY_THRESHOLD_MS go to the app.slow_queries logger as
+    one JSON object per line, grouped by the fingerprint of their SQL text
+    """
+    config = app.config
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.query_count = g.get("query_count", 0) + 1
+        if config.get("DB_INSTRUMENTATION"):
+            conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not config.get("DB_INSTRUMENTATION") or not conn.info.get("query_started"):
+            return
+        elapsed_ms = (time.perf_counter() - conn.info["query_started"].pop()) * 1000
+        in_request = has_request_context()
+        if in_request:
+            g.query_total_ms = g.get("query_total_ms", 0.0) + elapsed_ms
+            if elapsed_ms > g.get("query_slowest_ms", 0.0):
+                g.query_slowest_ms = elapsed_ms
+                g.query_slowest = statement
+        if elapsed_ms >= config.get("SLOW_QUERY_THRESHOLD_MS", 100):
+            digest, normalized = fingerprint(statement)
+            slow_query_logger.warning(json.dumps({
+                "event": "slow_query",
+                "duration_ms": round(elapsed_ms, 3),
+                "fingerprint": digest,
+                "statement": normalized,
+                "endpoint": request.endpoint if in_request else None,
+                "method": request.method if in_request else None,
+                "path": request.path if in_request else None,
+            }))
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+    @app.before_request
+    def reset_request_stats():
+        # g can outlive a request when an app context was already pushed (e.g. in tests)
+        g.query_count = 0
+        g.query_total_ms = 0.0
+        g.query_slowest_ms = 0.0
+        g.query_slowest = None
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def add_server_timing(response):
+        if not config.get("DB_INSTRUMENTATION"):
+            return response
+        stats = request_stats()
+        app_ms = (time.perf_counter() - g.request_started) * 1000
+        timings = [
+            f'db;dur={stats["total_ms"]:.3f};desc="{stats["count"]} queries"',
+            f'db-slowest;dur={stats["slowest_ms"]:.3f}'
+            + (f';desc="{fingerprint(stats["slowest"])[0]}"' if stats["slowest"] else ""),
+            f"app;dur={app_ms:.3f}",
+        ]
+        response.headers.add("Server-Timing", ", ".join(timings))
+        return response
@@ -0,0 +1,107 @@
+"""
+named database engine profiles, selected by DB_ENGINE_PROFILE.
+
+a profile holds the connection-pool options used for server databases (MySQL/MariaDB)
+and the PRAGMAs run on every new SQLite connection:
+
+- "stock" keeps SQLAlchemy's pool defaults and SQLite's rollback journal
+- "web" is meant for the gunicorn workers. MySQL gets a pool sized for a worker's threads
+  (plus the expiry sweeper and long streaming exports), connections recycled before the
+  server's or a proxy's idle timeout drops them, and a ping on checkout, so that a
+  restarted database costs a reconnect instead of a failed request. SQLite gets WAL
+  journaling, so readers and the writer no longer block each other, synchronous=NORMAL
+  (fsync at checkpoints instead of every commit: an app crash loses nothing, a power
+  loss may lose the latest commits), a busy timeout so that concurrent writers wait for
+  the lock instead of failing with "database is locked", and memory-mapped reads
+
+the pool options are chosen per database from its own URL: a MySQL replica behind a SQLite
+primary gets them, a SQLite replica behind a MySQL primary does not. SQLALCHEMY_ENGINE_OPTIONS
+(primary) and the options of a bind's dict in SQLALCHEMY_BINDS still apply, on top of them.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import URL, make_url
+
+PROFILES = {
+    "stock": {
+        "pool": {},
+        "sqlite_pragmas": {},
+    },
+    "web": {
+        "pool": {
+            "pool_size": 8,
+            "max_overflow": 8,
+            "pool_timeout": 10,
+            "pool_recycle": 1800,
+            "pool_pre_ping": True,
+        },
+        "sqlite_pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": 5000,
+            "mmap_size": 256 * 2**20,
+        },
+    },
+}
+
+
+def get_profile(name):
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"unknown DB_ENGINE_PROFILE {name!r}, expected one of {', '.join(PROFILES)}") from None
+
+
+def _is_sqlite(url):
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def apply_engine_profile(app):
+    """
+    merges the profile's pool options into the engine options of every database but the
+    SQLite ones, which keep the pool Flask-SQLAlchemy picks for them: SQLALCHEMY_ENGINE_OPTIONS
+    for the primary, the bind's entry in SQLALCHEMY_BINDS (turned into a dict with its "url")
+    for the others, as Flask-SQLAlchemy does not apply SQLALCHEMY_ENGINE_OPTIONS to binds.
+    must run before db.init_app
+    """
+    pool = get_profile(app.config["DB_ENGINE_PROFILE"])["pool"]
+    if not _is_sqlite(app.config["SQLALCHEMY_DATABASE_URI"]):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {**pool, **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})}
+    binds = {}
+    for key, value in (app.config.get("SQLALCHEMY_BINDS") or {}).items():
+        url, options = _split_bind(value)
+        binds[key] = value if _is_sqlite(url) else {**pool, **options, "url": url}
+    app.config["SQLALCHEMY_BINDS"] = binds
+
+
+def _split_bind(value):
+    if isinstance(value, (str, URL)):
+        return value, {}
+    options = dict(value)
+    return options.pop("url"), options
+
+
+def bind_config(app, key=None):
+    """
+    (url, engine options) of the primary database (key None) or of the bind key, as
+    Flask-SQLAlchemy creates their engines
+    """
+    if key is None:
+        return app.config["SQLALCHEMY_DATABASE_URI"], dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    return _split_bind(app.config["SQLALCHEMY_BINDS"][key])
+
+
+def init_engine_profile(app, engine):
+    """
+    runs the profile's SQLite PRAGMAs on every new connection of engine, must run before
+    the engine's first connection
+    """
+    pragmas = get_profile(app.config["DB_ENGINE_PROFILE"])["sqlite_pragmas"]
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
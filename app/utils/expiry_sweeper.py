@@ -0,0 +1,174 @@
+import logging
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, insert, or_, select, text, update
+from sqlalchemy.exc import IntegrityError
+from app.utils.statement_registry import register_statement
+
+logger = logging.getLogger(__name__)
+
+SweepReport = namedtuple("SweepReport", ["expired", "batches", "seconds", "pending"])
+
+# OPTIMIZATION: both statements use the (status, ends_at) index, and the ids are
+# selected first because SQLite has no UPDATE ... LIMIT by default
+lapsed_query = text("""
+    SELECT s.id, s.user_id, s.plan_id, s.ends_at
+    FROM subscriptions s
+    WHERE s.status = 'active' AND s.ends_at <= :now
+    ORDER BY s.ends_at
+    LIMIT :limit
+""")
+register_statement("expiry.lapsed", lapsed_query, lambda: {"now": datetime.now(), "limit": 1000})
+
+expire_query = text("""
+    UPDATE subscriptions
+    SET status = 'expired'
+    WHERE id IN :ids AND status = 'active'
+""").bindparams(bindparam("ids", expanding=True))
+register_statement("expiry.expire", expire_query, {"ids": [1, 2, 3]})
+
+# the rows another transaction expired or cancelled since the SELECT are not changed by the
+# UPDATE, and must not be counted: the ids it changed are read back with RETURNING, or the
+# rows are locked by the SELECT (MySQL). neither is registered, their plans are the ones of
+# expiry.expire and expiry.lapsed, and SQLite cannot EXPLAIN ... FOR UPDATE
+expire_returning_query = text("""
+    UPDATE subscriptions
+    SET status = 'expired'
+    WHERE id IN :ids AND status = 'active'
+    RETURNING id
+""").bindparams(bindparam("ids", expanding=True))
+
+lapsed_locked_query = text(lapsed_query.text + "    FOR UPDATE SKIP LOCKED\n")
+
+pending_query = text("""
+    SELECT COUNT(*) FROM subscriptions s
+    WHERE s.status = 'active' AND s.ends_at <= :now
+""")
+register_statement("expiry.pending", pending_query, lambda: {"now": datetime.now()})
+
+
+class ExpirySweeper:
+    """
+    moves lapsed active subscriptions to 'expired' in bounded batches, committing
+    every batch so that no statement holds locks on a large part of the table.
+
+    runs from the expire-subscriptions CLI command, or from a background thread
+    started by create_app when EXPIRY_SWEEP_INTERVAL is set (in seconds). every worker
+    starts the thread, the lease in job_leases lets only one of them sweep.
+    """
+    lease_name = "expiry_sweeper"
+
+    def __init__(self, batch_size=1000, interval=0):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.owner = uuid.uuid4().hex
+        self._thread = None
+        self._stop = threading.Event()
+
+    def init_app(self, app):
+        self.batch_size = app.config.get("EXPIRY_SWEEP_BATCH_SIZE", self.batch_size)
+        self.interval = app.config.get("EXPIRY_SWEEP_INTERVAL", self.interval)
+        app.extensions["expiry_sweeper"] = self
+        if self.interval and not app.testing:
+            self.start(app)
+
+    def sweep_batch(self, now, batch_size=None):
+        """
+        expires up to batch_size subscriptions that lapsed before now and commits,
+        returns the rows that were expired by this call
+        """
+        from app.extensions import db, response_cache
+        from app.utils import current_subscriptions, outbox, rollups
+
+        params = {"now": now, "limit": batch_size or self.batch_size}
+        if db.session.get_bind().dialect.update_returning:
+            rows = db.session.execute(lapsed_query, params).mappings().fetchall()
+            if rows:
+                expired = set(db.session.execute(expire_returning_query, {"ids": [row["id"] for row in rows]}).scalars())
+                rows = [row for row in rows if row["id"] in expired]
+        else:
+            rows = db.session.execute(lapsed_locked_query, params).mappings().fetchall()
+            if rows:
+                db.session.execute(expire_query, {"ids": [row["id"] for row in rows]})
+        if rows:
+            ids = [row["id"] for row in rows]
+            rollups.subscriptions_expired(rows)
+            outbox.subscriptions_expired(rows)
+            current_subscriptions.clear_subscriptions(ids)
+        db.session.commit()
+        response_cache.invalidate(*{row["user_id"] for row in rows})
+        return rows
+
+    def pending(self, now=None):
+        from app.extensions import db
+
+        return db.session.execute(pending_query, {"now": now or datetime.now()}).scalar()
+
+    def run(self, batch_size=None, max_batches=None, now=None):
+        """
+        sweeps until nothing is left to expire or max_batches is reached
+        """
+        now = now or datetime.now()
+        batch_size = batch_size or self.batch_size
+        started = time.perf_counter()
+        expired = batches = 0
+        while max_batches is None or batches < max_batches:
+            rows = self.sweep_batch(now, batch_size)
+            if not rows:
+                break
+            expired += len(rows)
+            batches += 1
+            if len(rows) < batch_size:
+                break
+        seconds = time.perf_counter() - started
+        return SweepReport(expired=expired, batches=batches, seconds=seconds, pending=self.pending(now))
+
+    def _lease(self, now):
+        """
+        takes or renews the sweeper's lease until two intervals from now, False while
+        another worker holds it
+        """
+        from app.extensions import db
+        from app.models import JobLease
+
+        table = JobLease.__table__
+        if db.session.execute(select(table.c.name).where(table.c.name == self.lease_name)).first() is None:
+            try:
+                db.session.execute(insert(table).values(name=self.lease_name))
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+        taken = db.session.execute(
+            update(table)
+            .where(table.c.name == self.lease_name, or_(
+                table.c.owner.is_(None), table.c.owner == self.owner, table.c.lease_until < now,
+            ))
+            .values(owner=self.owner, lease_until=now + timedelta(seconds=2 * self.interval))
+        ).rowcount
+        db.session.commit()
+        return bool(taken)
+
+    def start(self, app):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(app,), name="expiry-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self, app):
+        while not self._stop.wait(self.interval):
+            try:
+                with app.app_context():
+                    if not self._lease(datetime.now()):
+                        continue
+                    report = self.run()
+                if report.expired:
+                    logger.info("expired %s subscriptions in %.2fs, %s pending", report.expired, report.seconds, report.pending)
+            except Exception:
+                logger.exception("expiry sweep failed")
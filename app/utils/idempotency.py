@@ -0,0 +1,229 @@
+import hashlib
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app.utils.query_budget import allow_extra_queries
+
+StoredResponse = namedtuple("StoredResponse", ["status_code", "body"])
+# state is one of CLAIMED, REPLAY (response is the StoredResponse), MISMATCH or BUSY
+Outcome = namedtuple("Outcome", ["state", "response"])
+
+CLAIMED = "claimed"
+REPLAY = "replay"
+MISMATCH = "mismatch"
+BUSY = "busy"
+
+
+class IdempotencyStore:
+    """
+    Idempotency-Key records of the subscription writes (the idempotency_keys table), so that
+    a retried request gets the response of the first attempt instead of running again.
+
+    a request claims its key by inserting the row, which only one request can do thanks to
+    the unique (user_id, idempotency_key) index, and commits the claim before running.
+    duplicates arriving meanwhile wait for the response: on the claimer's event when it runs
+    in the same worker, otherwise by polling the row every IDEMPOTENCY_POLL_INTERVAL seconds,
+    and get a 409 after IDEMPOTENCY_WAIT_TIMEOUT. a claim whose worker died is taken over
+    after IDEMPOTENCY_LOCK_TIMEOUT.
+
+    the response is stored after the view committed its write, so a worker dying in between
+    lets the write run again once the lock times out. responses with a 409 or 5xx status are
+    not stored, the key is released for the retry. keys expire after IDEMPOTENCY_KEY_TTL and are
+    deleted IDEMPOTENCY_PURGE_BATCH_SIZE at a time, every IDEMPOTENCY_PURGE_INTERVAL seconds
+    by the first claim of a worker, or by "flask idempotency-keys purge".
+    """
+    def __init__(self, ttl=86400, lock_timeout=30, wait_timeout=10, poll_interval=0.05,
+                 purge_interval=60, purge_batch_size=1000):
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.purge_interval = purge_interval
+        self.purge_batch_size = purge_batch_size
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._last_purge = time.monotonic()
+
+    def init_app(self, app):
+        self.ttl = app.config.get("IDEMPOTENCY_KEY_TTL", self.ttl)
+        self.lock_timeout = app.config.get("IDEMPOTENCY_LOCK_TIMEOUT", self.lock_timeout)
+        self.wait_timeout = app.config.get("IDEMPOTENCY_WAIT_TIMEOUT", self.wait_timeout)
+        self.poll_interval = app.config.get("IDEMPOTENCY_POLL_INTERVAL", self.poll_interval)
+        self.purge_interval = app.config.get("IDEMPOTENCY_PURGE_INTERVAL", self.purge_interval)
+        self.purge_batch_size = app.config.get("IDEMPOTENCY_PURGE_BATCH_SIZE", self.purge_batch_size)
+        app.extensions["idempotency_keys"] = self
+
+    @staticmethod
+    def fingerprint(method, path, body):
+        digest = hashlib.sha256(f"{method} {path}\n".encode())
+        digest.update(body)
+        return digest.hexdigest()
+
+    def begin(self, user_id, key, fingerprint):
+        """
+        claims key for the current request or returns what to answer instead. after
+        CLAIMED, the caller must call complete or release
+        """
+        flight_key = (user_id, key)
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            with self._lock:
+                flight = self._flights.get(flight_key)
+                if flight is None:
+                    flight = self._flights[flight_key] = threading.Event()
+                    break
+            # the claimer runs in this worker, its response is stored once the event is set
+            if not flight.wait(max(deadline - time.monotonic(), 0)):
+                return Outcome(BUSY, None)
+        try:
+            outcome = self._begin(user_id, key, fingerprint, deadline)
+        except BaseException:
+            self._land(flight_key)
+            raise
+        if outcome.state != CLAIMED:
+            self._land(flight_key)
+        elif time.monotonic() - self._last_purge >= self.purge_interval:
+            self._last_purge = time.monotonic()
+            allow_extra_queries(2)
+            self.purge(max_batches=1)
+        return outcome
+
+    def _begin(self, user_id, key, fingerprint, deadline):
+        from app.extensions import db
+        from app.models import IdempotencyKey
+
+        table = IdempotencyKey.__table__
+        while True:
+            # the claim INSERT, then the response UPDATE or the SELECT of the existing row
+            allow_extra_queries(2)
+            now = datetime.now()
+            if self._insert(table, {
+                "user_id": user_id,
+                "idempotency_key": key,
+                "fingerprint": fingerprint,
+                "locked_until": now + timedelta(seconds=self.lock_timeout),
+                "expires_at": now + timedelta(seconds=self.ttl),
+                "created_at": now,
+            }):
+                db.session.commit()
+                return Outcome(CLAIMED, None)
+            row = db.session.execute(
+                select(table).where(table.c.user_id == user_id, table.c.idempotency_key == key)
+            ).first()
+            # ends the read transaction, the next poll has to see the other requests' commits
+            db.session.commit()
+            if row is None:
+                continue
+            if row.expires_at <= now:
+                db.session.execute(delete(table).where(table.c.id == row.id, table.c.expires_at <= now))
+                db.session.commit()
+                allow_extra_queries(1)
+                continue
+            if row.fingerprint != fingerprint:
+                return Outcome(MISMATCH, None)
+            if row.status_code is not None:
+                return Outcome(REPLAY, StoredResponse(row.status_code, row.body))
+            if row.locked_until <= now:
+                # the claimer died or hung, the first duplicate to notice takes over
+                taken = db.session.execute(
+                    update(table)
+                    .where(table.c.id == row.id, table.c.status_code.is_(None), table.c.locked_until == row.locked_until)
+                    .values(locked_until=now + timedelta(seconds=self.lock_timeout))
+                ).rowcount
+                db.session.commit()
+                allow_extra_queries(2)
+                if taken:
+                    return Outcome(CLAIMED, None)
+            if time.monotonic() >= deadline:
+                return Outcome(BUSY, None)
+            time.sleep(self.poll_interval)
+
+    def _insert(self, table, values):
+        """
+        inserts the row unless the key exists, returns whether it did
+        """
+        from app.extensions import db
+
+        dialect = db.session.get_bind().dialect.name
+        if dialect == "mysql":
+            return db.session.execute(insert(table).prefix_with("IGNORE").values(**values)).rowcount == 1
+        if dialect == "sqlite":
+            from sqlalchemy.dialects import sqlite
+
+            stmt = sqlite.insert(table).values(**values).on_conflict_do_nothing(index_elements=["user_id", "idempotency_key"])
+            return db.session.execute(stmt).rowcount == 1
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(table).values(**values))
+            return True
+        except IntegrityError:
+            return False
+
+    def complete(self, user_id, key, status_code, body):
+        """
+        stores the response of the claimed key, for its retries
+        """
+        from app.extensions import db
+        from app.models import IdempotencyKey
+
+        table = IdempotencyKey.__table__
+        try:
+            db.session.execute(
+                update(table)
+                .where(table.c.user_id == user_id, table.c.idempotency_key == key)
+                .values(status_code=status_code, body=body)
+            )
+            db.session.commit()
+        finally:
+            self._land((user_id, key))
+
+    def release(self, user_id, key):
+        """
+        deletes the claim of a request that failed, so that its retry runs
+        """
+        from app.extensions import db
+        from app.models import IdempotencyKey
+
+        table = IdempotencyKey.__table__
+        try:
+            db.session.rollback()
+            db.session.execute(
+                delete(table).where(table.c.user_id == user_id, table.c.idempotency_key == key, table.c.status_code.is_(None))
+            )
+            db.session.commit()
+        finally:
+            self._land((user_id, key))
+
+    def _land(self, flight_key):
+        with self._lock:
+            flight = self._flights.pop(flight_key, None)
+        if flight is not None:
+            flight.set()
+
+    def purge(self, now=None, batch_size=None, max_batches=None):
+        """
+        deletes the expired keys batch_size at a time, returns how many were deleted
+        """
+        from app.extensions import db
+        from app.models import IdempotencyKey
+
+        table = IdempotencyKey.__table__
+        now = now or datetime.now()
+        batch_size = batch_size or self.purge_batch_size
+        deleted = batches = 0
+        while max_batches is None or batches < max_batches:
+            # the ids are selected first because SQLite has no DELETE ... LIMIT by default
+            ids = db.session.execute(
+                select(table.c.id).where(table.c.expires_at <= now).order_by(table.c.expires_at).limit(batch_size)
+            ).scalars().all()
+            if ids:
+                db.session.execute(delete(table).where(table.c.id.in_(ids)))
+            db.session.commit()
+            deleted += len(ids)
+            batches += 1
+            if len(ids) < batch_size:
+                break
+        return deleted
@@ -0,0 +1,77 @@
+"""
+JSON providers of the app, selected by JSON_PROVIDER:
+
+- "orjson" serializes with orjson (a C extension), which handles datetimes natively and
+  builds the 10k-row response of /active/all about four times faster than the standard
+  library (benchmarks/bench_json.py)
+- "iso" is the standard library fallback, with the same output as "orjson" but for the
+  escaping of non-ASCII characters
+- "flask" (the default) is Flask's DefaultJSONProvider, the output of jsonify: datetimes
+  as RFC 822 dates and non-ASCII characters escaped
+- "auto" picks "orjson" when it is installed and "iso" otherwise
+
+"orjson" and "iso" write datetimes in ISO 8601, like the models' to_dict, which changes
+the responses clients get: they are opt-in. both keep Flask's sorted keys, which the
+envelopes written by hand (see make_streaming_response) rely on.
+"""
+from datetime import date
+from flask.json.provider import DefaultJSONProvider, _default
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _iso_default(o):
+    if isinstance(o, date):
+        return o.isoformat()
+    return _default(o)
+
+
+class IsoJSONProvider(DefaultJSONProvider):
+    default = staticmethod(_iso_default)
+
+
+class OrjsonProvider(IsoJSONProvider):
+    """
+    orjson is always compact, the separators (and other json.dumps arguments) given to
+    dumps are ignored. non-ASCII characters are written as is rather than escaped
+    """
+    def _options(self, indent=False):
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._options(bool(kwargs.get("indent")))).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._options(indent) | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+PROVIDERS = {
+    "orjson": OrjsonProvider,
+    "iso": IsoJSONProvider,
+    "flask": DefaultJSONProvider,
+}
+
+
+def init_json_provider(app):
+    name = app.config.get("JSON_PROVIDER", "flask")
+    if name == "auto":
+        name = "orjson" if orjson is not None else "iso"
+    if name not in PROVIDERS:
+        raise ValueError(f"unknown JSON_PROVIDER {name!r}, expected auto or one of {', '.join(PROVIDERS)}")
+    if name == "orjson" and orjson is None:
+        raise RuntimeError("JSON_PROVIDER=orjson needs the orjson package (pip install orjson)")
+    app.json = PROVIDERS[name](app)
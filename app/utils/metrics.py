@@ -0,0 +1,129 @@
+"""
+Prometheus metrics for the API, exposed by GET /metrics.
+
+under gunicorn every worker is its own process, so the metrics are written to the
+mmap-backed files of prometheus_client's multiprocess mode when PROMETHEUS_MULTIPROC_DIR
+is set (gunicorn.conf.py sets it up) and /metrics aggregates the files of every worker.
+without it (e.g. python run.py) the in-process registry is used.
+"""
+import os
+import time
+from flask import g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+
+REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests by route and status code",
+    ["method", "route", "status"],
+)
+LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "SQLAlchemy pool connections currently checked out",
+    multiprocess_mode="livesum",
+)
+POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections",
+    "SQLAlchemy pool connections opened beyond pool_size",
+    multiprocess_mode="livesum",
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "Cache lookups by cache and result (hit, miss, or coalesced into a concurrent miss)",
+    ["cache", "result"],
+)
+OUTBOX_DELIVERED = Counter(
+    "outbox_events_delivered_total",
+    "Outbox events accepted by the sink (redeliveries included)",
+)
+OUTBOX_FAILURES = Counter(
+    "outbox_delivery_failures_total",
+    "Outbox batches the sink rejected, retried after a backoff",
+)
+OUTBOX_LAG = Gauge(
+    "outbox_lag_seconds",
+    "Age of the oldest event of the last delivered outbox batch, 0 once the outbox is drained",
+    multiprocess_mode="livemax",
+)
+
+# OPTIMIZATION: labelled children are looked up once per label combination, so a request
+# only pays for a dict lookup, a counter increment and a histogram observation
+_request_children = {}
+_latency_children = {}
+_cache_children = {}
+
+
+def observe_request(method, route, status, seconds):
+    key = (method, route, status)
+    counter = _request_children.get(key)
+    if counter is None:
+        counter = _request_children[key] = REQUESTS.labels(method, route, status)
+    counter.inc()
+    key = (method, route)
+    histogram = _latency_children.get(key)
+    if histogram is None:
+        histogram = _latency_children[key] = LATENCY.labels(method, route)
+    histogram.observe(seconds)
+
+
+def record_cache_lookup(cache, result):
+    counter = _cache_children.get((cache, result))
+    if counter is None:
+        counter = _cache_children[(cache, result)] = CACHE_LOOKUPS.labels(cache, result)
+    counter.inc()
+
+
+def render_metrics():
+    """
+    returns (body, content_type) of the Prometheus text exposition
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def init_metrics(app, engine):
+    """
+    records count and latency of every request under its route rule (not the raw path,
+    which keeps the label cardinality bounded) and tracks the connection pool on engine
+    """
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            observe_request(request.method, route, str(response.status_code), time.perf_counter() - started)
+        return response
+
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return
+
+    def update_pool_gauges(*args):
+        POOL_CHECKED_OUT.set(pool.checkedout())
+        POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+    event.listen(engine, "checkout", update_pool_gauges)
+    event.listen(engine, "checkin", update_pool_gauges)
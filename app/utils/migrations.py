@@ -0,0 +1,127 @@
+"""
+schema versioning. the schema is changed at deploy time by "flask db upgrade", which runs
+the migrations of app/migrations that the database has not seen yet, each in its own
+transaction together with the schema_version row recording it.
+
+OPTIMIZATION: the app used to run db.create_all() at every boot, so every gunicorn worker
+paid the schema reflection (and the DDL of a fresh database) before serving. workers now
+only compare the version recorded in the database with the latest migration
+(check_schema), which lists app/migrations without importing the migrations.
+"""
+import importlib
+import pkgutil
+import re
+from collections import namedtuple
+from datetime import datetime, timezone
+import click
+import sqlalchemy as sa
+from app import migrations as migrations_package
+from app.extensions import db
+
+Migration = namedtuple("Migration", ["version", "name", "module"])
+
+CHECK_MODES = ("strict", "warn", "off")
+
+_metadata = sa.MetaData()
+version_table = sa.Table(
+    "schema_version", _metadata,
+    sa.Column("version", sa.Integer, primary_key=True, autoincrement=False),
+    sa.Column("name", sa.String(200), nullable=False),
+    sa.Column("applied_at", sa.DateTime, nullable=False),
+)
+
+_module_name = re.compile(r"^(\d+)_(\w+)$")
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+def available():
+    """
+    the migrations of app/migrations in order, without importing them
+    """
+    found = []
+    for info in pkgutil.iter_modules(migrations_package.__path__):
+        match = _module_name.match(info.name)
+        if match:
+            found.append(Migration(int(match.group(1)), match.group(2), f"{migrations_package.__name__}.{info.name}"))
+    found.sort()
+    versions = [migration.version for migration in found]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f"duplicate migration versions in {migrations_package.__name__}: {versions}")
+    return found
+
+
+def head():
+    found = available()
+    return found[-1].version if found else 0
+
+
+def current_version(conn):
+    """
+    the latest version applied to the database, 0 when it is not versioned yet
+    """
+    if not sa.inspect(conn).has_table(version_table.name):
+        return 0
+    return conn.execute(sa.select(sa.func.max(version_table.c.version))).scalar() or 0
+
+
+def applied(conn):
+    """
+    {version: applied_at} of the migrations recorded in the database
+    """
+    if not sa.inspect(conn).has_table(version_table.name):
+        return {}
+    return dict(conn.execute(sa.select(version_table.c.version, version_table.c.applied_at)).all())
+
+
+def upgrade(engine, target=None, progress=None):
+    """
+    applies the migrations newer than the database's version, up to target (default all
+    of them), and returns the ones applied. progress(migration) is called before each one
+    """
+    with engine.begin() as conn:
+        version_table.create(conn, checkfirst=True)
+        current = current_version(conn)
+    done = []
+    for migration in available():
+        if migration.version <= current or (target is not None and migration.version > target):
+            continue
+        if progress:
+            progress(migration)
+        module = importlib.import_module(migration.module)
+        with engine.begin() as conn:
+            module.upgrade(conn)
+            conn.execute(sa.insert(version_table).values(
+                version=migration.version,
+                name=migration.name,
+                applied_at=datetime.now(timezone.utc).replace(tzinfo=None),
+            ))
+        done.append(migration)
+    return done
+
+
+def check_schema(app):
+    """
+    compares the database's schema version with the latest migration according to
+    SCHEMA_CHECK: "strict" refuses to start on an outdated schema, "warn" logs it and
+    "off" skips the check. a newer schema than the code's is expected while old workers
+    are still running during a deploy, and is only logged. commands of the flask CLI
+    (e.g. "flask db upgrade" itself) load the app with the outdated schema and only warn
+    """
+    mode = app.config["SCHEMA_CHECK"]
+    if mode not in CHECK_MODES:
+        raise ValueError(f"SCHEMA_CHECK must be one of {', '.join(CHECK_MODES)}, got {mode!r}")
+    if mode == "off":
+        return
+    with db.engine.connect() as conn:
+        current = current_version(conn)
+    expected = head()
+    if current > expected:
+        app.logger.warning("database schema version %s is newer than this code's (%s)", current, expected)
+    elif current < expected:
+        message = f'database schema is at version {current} but the code expects {expected}, run "flask db upgrade"'
+        if mode == "strict" and click.get_current_context(silent=True) is None:
+            raise SchemaOutOfDate(message)
+        app.logger.warning(message)
@@ -0,0 +1,435 @@
+"""
+transactional outbox of the subscription changes (see OutboxEvent).
+
+subscribe, change-plan, cancel and the expiry sweeper append their events with the helpers
+below, which only execute an INSERT: the caller commits, so an event exists exactly when
+its change was committed. nothing is appended while no OUTBOX_SINK is configured, as no
+dispatcher would deliver the events nor purge them. OutboxDispatcher then delivers them in id order to the sink of
+OUTBOX_SINK (app/utils/outbox_sinks.py), so billing and entitlements learn about changes
+without polling /active/all.
+"""
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from app.utils.metrics import OUTBOX_DELIVERED, OUTBOX_FAILURES, OUTBOX_LAG
+from app.utils.outbox_sinks import create_sink
+
+logger = logging.getLogger(__name__)
+
+Batch = namedtuple("Batch", ["delivered", "error"])
+DispatchReport = namedtuple("DispatchReport", ["delivered", "batches", "seconds", "lag", "error"])
+OutboxStatus = namedtuple(
+    "OutboxStatus",
+    ["consumer", "last_event_id", "pending", "lag", "attempts", "next_attempt_at", "last_error", "lease_owner", "gaps"],
+)
+
+
+def _tables():
+    # imported here, app.extensions imports this module before the models can be
+    from app.models.outbox import OutboxCheckpoint, OutboxEvent
+
+    return OutboxEvent.__table__, OutboxCheckpoint.__table__
+
+
+def _gaps():
+    from app.models.outbox import OutboxGap
+
+    return OutboxGap.__table__
+
+
+def _ranges(ids):
+    """
+    sorted ids as (first, last) runs of consecutive ids
+    """
+    ranges = []
+    for event_id in ids:
+        if ranges and ranges[-1][1] == event_id - 1:
+            ranges[-1][1] = event_id
+        else:
+            ranges.append([event_id, event_id])
+    return [tuple(r) for r in ranges]
+
+
+def _row(event_type, user_id, subscription_id, data, now):
+    return {
+        "event_type": event_type,
+        "user_id": user_id,
+        "subscription_id": subscription_id,
+        "payload": json.dumps(data, separators=(",", ":")),
+        "created_at": now,
+    }
+
+
+def _append(rows):
+    from app.extensions import db, outbox_dispatcher
+
+    if rows and outbox_dispatcher.sink is not None:
+        db.session.execute(insert(_tables()[0]), rows)
+
+
+def subscription_created(subscription, plan, replaced):
+    """
+    subscription is the Subscription built by subscribe, plan the catalog's dict
+    """
+    _append([_row("subscription.created", subscription.user_id, subscription.id, {
+        "plan_id": plan["id"],
+        "plan_name": plan["name"],
+        "price_cents": plan["price_cents"],
+        "starts_at": subscription.starts_at.isoformat(),
+        "ends_at": subscription.ends_at.isoformat(),
+        "replaced": bool(replaced),
+    }, subscription.created_at)])
+
+
+def plan_changed(user_id, subscription_id, plan, now):
+    _append([_row("subscription.plan_changed", user_id, subscription_id, {
+        "plan_id": plan["id"],
+        "plan_name": plan["name"],
+        "price_cents": plan["price_cents"],
+    }, now)])
+
+
+def subscription_cancelled(user_id, subscription_id, now):
+    _append([_row("subscription.cancelled", user_id, subscription_id, {"ends_at": now.isoformat()}, now)])
+
+
+def subscriptions_expired(rows):
+    """
+    rows are the sweeper's (id, user_id, plan_id, ends_at), one INSERT for the whole batch
+    """
+    now = datetime.now()
+    _append([
+        _row("subscription.expired", row["user_id"], row["id"], {
+            "plan_id": row["plan_id"],
+            "ends_at": str(row["ends_at"]),
+        }, now)
+        for row in rows
+    ])
+
+
+def event_dict(row):
+    return {
+        "id": row.id,
+        "type": row.event_type,
+        "user_id": row.user_id,
+        "subscription_id": row.subscription_id,
+        "created_at": row.created_at.isoformat(),
+        "data": json.loads(row.payload),
+    }
+
+
+class OutboxDispatcher:
+    """
+    delivers the outbox events to the sink in batches of OUTBOX_BATCH_SIZE, at least once.
+
+    the checkpoint (outbox_checkpoints) moves past a batch only after the sink accepted it,
+    in the same UPDATE that renews the dispatcher's lease: every worker may run a dispatcher
+    thread (OUTBOX_DISPATCH_INTERVAL > 0) or "flask outbox dispatch --follow" may run on its
+    own, and only the lease holder delivers. a failed batch is retried after an exponential
+    backoff (OUTBOX_RETRY_BACKOFF doubling up to OUTBOX_MAX_BACKOFF, with jitter).
+
+    ids are allocated when the events are inserted, not when they commit, so a lower id can
+    still show up after a higher one was committed. the dispatcher stops before such a gap
+    for OUTBOX_GAP_TIMEOUT seconds. it then checks once more that the ids are missing, and
+    moves past them with a warning, recording them in outbox_gaps: an event that commits
+    later still is delivered, after the ones that overtook it.
+    """
+    # delivered events older than OUTBOX_RETENTION are purged by the dispatcher thread at this pace
+    purge_every = 3600
+
+    def __init__(self, batch_size=500, interval=0, consumer="default", lease_seconds=30, gap_timeout=5,
+                 backoff=1, max_backoff=300, retention=7 * 86400):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.consumer = consumer
+        self.lease_seconds = lease_seconds
+        self.gap_timeout = gap_timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retention = retention
+        self.sink = None
+        self.owner = uuid.uuid4().hex
+        self._thread = None
+        self._stop = threading.Event()
+
+    def init_app(self, app):
+        self.batch_size = app.config.get("OUTBOX_BATCH_SIZE", self.batch_size)
+        self.interval = app.config.get("OUTBOX_DISPATCH_INTERVAL", self.interval)
+        self.consumer = app.config.get("OUTBOX_CONSUMER", self.consumer)
+        self.lease_seconds = app.config.get("OUTBOX_LEASE_SECONDS", self.lease_seconds)
+        self.gap_timeout = app.config.get("OUTBOX_GAP_TIMEOUT", self.gap_timeout)
+        self.backoff = app.config.get("OUTBOX_RETRY_BACKOFF", self.backoff)
+        self.max_backoff = app.config.get("OUTBOX_MAX_BACKOFF", self.max_backoff)
+        self.retention = app.config.get("OUTBOX_RETENTION", self.retention)
+        url = app.config.get("OUTBOX_SINK")
+        self.sink = create_sink(
+            url, secret=app.config.get("OUTBOX_WEBHOOK_SECRET"), timeout=app.config.get("OUTBOX_WEBHOOK_TIMEOUT", 10),
+        ) if url else None
+        app.extensions["outbox_dispatcher"] = self
+        if self.interval and self.sink and not app.testing:
+            self.start(app)
+
+    def _lease(self, now):
+        """
+        takes or renews the consumer's lease and returns its checkpoint, None while another
+        dispatcher holds it
+        """
+        from app.extensions import db
+
+        table = _tables()[1]
+        if db.session.execute(select(table.c.consumer).where(table.c.consumer == self.consumer)).first() is None:
+            try:
+                db.session.execute(insert(table).values(consumer=self.consumer, last_event_id=0, attempts=0, updated_at=now))
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+        taken = db.session.execute(
+            update(table)
+            .where(table.c.consumer == self.consumer, or_(
+                table.c.lease_owner.is_(None), table.c.lease_owner == self.owner, table.c.lease_until < now,
+            ))
+            .values(lease_owner=self.owner, lease_until=now + timedelta(seconds=self.lease_seconds))
+        ).rowcount
+        db.session.commit()
+        if not taken:
+            return None
+        return db.session.execute(select(table).where(table.c.consumer == self.consumer)).first()
+
+    def _contiguous(self, rows, last_event_id, now):
+        """
+        the rows that can be delivered after last_event_id, and the ids skipped on the way
+        """
+        from app.extensions import db
+
+        events_table = _tables()[0]
+        expected = last_event_id + 1
+        skipped = []
+        for index, row in enumerate(rows):
+            if row.id != expected:
+                if now - row.created_at < timedelta(seconds=self.gap_timeout):
+                    # the missing ids may belong to transactions that have not committed yet
+                    return rows[:index], skipped
+                # one may have committed since the batch was read, it is then read in order next time
+                committed = db.session.execute(
+                    select(events_table.c.id).where(events_table.c.id.between(expected, row.id - 1)).limit(1)
+                ).first()
+                db.session.commit()
+                if committed:
+                    return rows[:index], skipped
+                skipped.extend(range(expected, row.id))
+            expected = row.id + 1
+        return rows, skipped
+
+    def dispatch_batch(self, now=None):
+        """
+        delivers the next batch and moves the checkpoint past it
+        """
+        from app.extensions import db
+
+        events_table, checkpoints_table = _tables()
+        now = now or datetime.now()
+        checkpoint = self._lease(now)
+        if checkpoint is None:
+            return Batch(0, None)
+        if checkpoint.next_attempt_at and checkpoint.next_attempt_at > now:
+            return Batch(0, checkpoint.last_error)
+        gaps_table = _gaps()
+        # the events that committed after their id was skipped come first. two queries, an OR
+        # of both conditions would scan the retained events from the start
+        late = db.session.execute(
+            select(events_table)
+            .where(events_table.c.id.in_(select(gaps_table.c.event_id).where(gaps_table.c.consumer == self.consumer)))
+            .order_by(events_table.c.id).limit(self.batch_size)
+        ).all()
+        rows = db.session.execute(
+            select(events_table).where(events_table.c.id > checkpoint.last_event_id)
+            .order_by(events_table.c.id).limit(self.batch_size - len(late))
+        ).all() if len(late) < self.batch_size else []
+        db.session.commit()
+        fresh, skipped = self._contiguous(rows, checkpoint.last_event_id, now)
+        rows = late + fresh
+        if not rows:
+            OUTBOX_LAG.set(0)
+            return Batch(0, None)
+        table = checkpoints_table
+        mine = (table.c.consumer == self.consumer, table.c.lease_owner == self.owner)
+        try:
+            self.sink.deliver([event_dict(row) for row in rows])
+        except Exception as e:
+            attempts = checkpoint.attempts + 1
+            delay = min(self.backoff * 2 ** (attempts - 1), self.max_backoff) * random.uniform(0.5, 1)
+            error = f"{type(e).__name__}: {e}"[:500]
+            db.session.execute(update(table).where(*mine).values(
+                attempts=attempts, next_attempt_at=now + timedelta(seconds=delay), last_error=error, updated_at=now,
+            ))
+            db.session.commit()
+            OUTBOX_FAILURES.inc()
+            logger.warning("outbox delivery of %s events failed (attempt %s, next in %.1fs): %s", len(rows), attempts, delay, error)
+            return Batch(0, error)
+        saved = db.session.execute(update(table).where(*mine).values(
+            last_event_id=fresh[-1].id if fresh else checkpoint.last_event_id, attempts=0, next_attempt_at=None,
+            last_error=None, lease_until=now + timedelta(seconds=self.lease_seconds), updated_at=datetime.now(),
+        )).rowcount
+        if saved and late:
+            db.session.execute(delete(gaps_table).where(
+                gaps_table.c.consumer == self.consumer, gaps_table.c.event_id.in_([row.id for row in late]),
+            ))
+        if saved and skipped:
+            db.session.execute(insert(gaps_table), [
+                {"consumer": self.consumer, "event_id": event_id, "skipped_at": now} for event_id in skipped
+            ])
+        db.session.commit()
+        if not saved:
+            logger.warning("outbox lease of %r lost during a delivery, events %s-%s may be delivered again",
+                           self.consumer, rows[0].id, rows[-1].id)
+        else:
+            for first, last in _ranges(skipped):
+                logger.warning("outbox events %s-%s of %r still missing after %ss, skipped: they are delivered "
+                               "late if their transaction commits", first, last, self.consumer, self.gap_timeout)
+            if late:
+                logger.warning("delivered outbox events %s of %r after their ids were skipped",
+                               ", ".join(str(row.id) for row in late), self.consumer)
+        OUTBOX_DELIVERED.inc(len(rows))
+        OUTBOX_LAG.set((datetime.now() - rows[0].created_at).total_seconds())
+        return Batch(len(rows), None)
+
+    def run(self, max_batches=None):
+        """
+        delivers batches until the outbox is drained, a delivery fails or max_batches is reached
+        """
+        if self.sink is None:
+            raise RuntimeError("no outbox sink configured, set OUTBOX_SINK")
+        started = time.perf_counter()
+        delivered = batches = 0
+        error = None
+        while max_batches is None or batches < max_batches:
+            batch = self.dispatch_batch()
+            error = batch.error
+            if not batch.delivered:
+                break
+            delivered += batch.delivered
+            batches += 1
+            if batch.delivered < self.batch_size:
+                break
+        self._release()
+        return DispatchReport(delivered, batches, time.perf_counter() - started, self.status().lag, error)
+
+    def _release(self):
+        """
+        lets another dispatcher take over right away instead of after the lease expired
+        """
+        from app.extensions import db
+
+        table = _tables()[1]
+        db.session.execute(
+            update(table).where(table.c.consumer == self.consumer, table.c.lease_owner == self.owner)
+            .values(lease_owner=None, lease_until=None)
+        )
+        db.session.commit()
+
+    def status(self, now=None):
+        """
+        the consumer's checkpoint, the events still to deliver and the age of the oldest one,
+        and the number of skipped ids still watched
+        """
+        from app.extensions import db
+
+        events_table, checkpoints_table = _tables()
+        now = now or datetime.now()
+        checkpoint = db.session.execute(
+            select(checkpoints_table).where(checkpoints_table.c.consumer == self.consumer)
+        ).first()
+        last_event_id = checkpoint.last_event_id if checkpoint else 0
+        gaps_table = _gaps()
+        undelivered = or_(
+            events_table.c.id > last_event_id,
+            events_table.c.id.in_(select(gaps_table.c.event_id).where(gaps_table.c.consumer == self.consumer)),
+        )
+        pending = db.session.execute(select(func.count()).select_from(events_table).where(undelivered)).scalar()
+        oldest = db.session.execute(
+            select(events_table.c.created_at).where(undelivered).order_by(events_table.c.id).limit(1)
+        ).scalar()
+        gaps = db.session.execute(
+            select(func.count()).select_from(gaps_table).where(gaps_table.c.consumer == self.consumer)
+        ).scalar()
+        db.session.commit()
+        return OutboxStatus(
+            consumer=self.consumer,
+            last_event_id=last_event_id,
+            pending=pending,
+            lag=max((now - oldest).total_seconds(), 0) if oldest else 0.0,
+            attempts=checkpoint.attempts if checkpoint else 0,
+            next_attempt_at=checkpoint.next_attempt_at if checkpoint else None,
+            last_error=checkpoint.last_error if checkpoint else None,
+            lease_owner=checkpoint.lease_owner if checkpoint else None,
+            gaps=gaps,
+        )
+
+    def purge(self, now=None, batch_size=1000, max_batches=None):
+        """
+        deletes the events older than the retention that every consumer has received
+        (all of them when there is no consumer), batch_size at a time. returns the count.
+        skipped ids are watched for the retention too, then given up on
+        """
+        from app.extensions import db
+
+        events_table, checkpoints_table = _tables()
+        gaps_table = _gaps()
+        now = now or datetime.now()
+        cutoff = now - timedelta(seconds=self.retention)
+        expired = db.session.execute(delete(gaps_table).where(gaps_table.c.skipped_at < cutoff)).rowcount
+        if expired:
+            logger.warning("gave up on %s skipped outbox event ids after %ss", expired, self.retention)
+        delivered = db.session.execute(select(func.min(checkpoints_table.c.last_event_id))).scalar()
+        conditions = [
+            events_table.c.created_at < cutoff,
+            # committed after their id was skipped, and not delivered yet
+            ~events_table.c.id.in_(select(gaps_table.c.event_id)),
+        ]
+        if delivered is not None:
+            conditions.append(events_table.c.id <= delivered)
+        deleted = batches = 0
+        while max_batches is None or batches < max_batches:
+            # the ids are selected first because SQLite has no DELETE ... LIMIT by default
+            ids = db.session.execute(
+                select(events_table.c.id).where(*conditions).order_by(events_table.c.id).limit(batch_size)
+            ).scalars().all()
+            if ids:
+                db.session.execute(delete(events_table).where(events_table.c.id.in_(ids)))
+            db.session.commit()
+            deleted += len(ids)
+            batches += 1
+            if len(ids) < batch_size:
+                break
+        return deleted
+
+    def start(self, app):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(app,), name="outbox-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self, app):
+        last_purge = time.monotonic()
+        while not self._stop.wait(self.interval):
+            try:
+                with app.app_context():
+                    report = self.run()
+                    if time.monotonic() - last_purge >= self.purge_every:
+                        last_purge = time.monotonic()
+                        self.purge()
+                if report.delivered:
+                    logger.info("delivered %s outbox events in %.2fs, lag %.1fs", report.delivered, report.seconds, report.lag)
+            except Exception:
+                logger.exception("outbox dispatch failed")
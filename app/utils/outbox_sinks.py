@@ -0,0 +1,103 @@
+"""
+destinations of the outbox dispatcher, selected by OUTBOX_SINK:
+
+- "https://..." (or http://): WebhookSink, POSTs every batch as {"events": [...]}
+- "file:///path/to/events.jsonl": FileSink, appends one JSON line per event
+- "memory://": MemorySink, a queue in the process, the stand-in used by the tests
+
+a sink gets the events of a batch in id order and raises to have the whole batch retried.
+delivery is at least once: a batch is sent again when the dispatcher stops between sending
+it and saving its checkpoint, so consumers drop the event ids they have already seen
+"""
+import hashlib
+import hmac
+import json
+import os
+import queue
+import urllib.error
+import urllib.request
+
+
+class OutboxSink:
+    name = "sink"
+
+    def deliver(self, events):
+        raise NotImplementedError
+
+
+class WebhookSink(OutboxSink):
+    """
+    the batch goes out as one request, signed with OUTBOX_WEBHOOK_SECRET (hex HMAC-SHA256 of
+    the body in X-Outbox-Signature) when it is set. any status but 2xx is a failure
+    """
+    name = "webhook"
+
+    def __init__(self, url, secret=None, timeout=10):
+        self.url = url
+        self.secret = secret
+        self.timeout = timeout
+
+    def deliver(self, events):
+        body = json.dumps({"events": events}, separators=(",", ":")).encode()
+        headers = {"Content-Type": "application/json"}
+        if self.secret:
+            signature = hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+            headers["X-Outbox-Signature"] = f"sha256={signature}"
+        request = urllib.request.Request(self.url, data=body, headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"webhook answered {e.code}") from e
+
+
+class FileSink(OutboxSink):
+    """
+    the batch is flushed to disk before the checkpoint moves past it
+    """
+    name = "file"
+
+    def __init__(self, path):
+        self.path = path
+
+    def deliver(self, events):
+        lines = "".join(json.dumps(event, separators=(",", ":")) + "\n" for event in events)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class MemorySink(OutboxSink):
+    name = "memory"
+
+    def __init__(self):
+        self.events = queue.Queue()
+
+    def deliver(self, events):
+        for event in events:
+            self.events.put(event)
+
+    def drain(self):
+        """
+        the events delivered since the last drain
+        """
+        drained = []
+        while True:
+            try:
+                drained.append(self.events.get_nowait())
+            except queue.Empty:
+                return drained
+
+
+def create_sink(url, secret=None, timeout=10):
+    """
+    sink for url ("https://...", "file:///path" or "memory://")
+    """
+    if url.startswith(("http://", "https://")):
+        return WebhookSink(url, secret=secret, timeout=timeout)
+    if url.startswith("file://"):
+        return FileSink(url[len("file://"):])
+    if url in ("memory", "memory://"):
+        return MemorySink()
+    raise ValueError(f"unknown OUTBOX_SINK {url!r}, expected an http(s):// url, file:///path or memory://")
@@ -0,0 +1,31 @@
+import base64
+from datetime import datetime
+
+
+def encode_cursor(starts_at, row_id):
+    """
+    builds the opaque keyset cursor pointing after the row (starts_at, row_id)
+    raw SQL rows carry datetimes as strings on SQLite, so both forms are accepted
+    """
+    if isinstance(starts_at, str):
+        starts_at = datetime.fromisoformat(starts_at)
+    raw = f"{starts_at.isoformat()}|{int(row_id)}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    returns the (starts_at, row_id) pair encoded in cursor, raises ValueError when it is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        starts_at, row_id = raw.split("|")
+        return datetime.fromisoformat(starts_at), int(row_id)
+    except (TypeError, UnicodeDecodeError, base64.binascii.Error) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def clamp_page_size(page_size, default, maximum):
+    if page_size is None or page_size < 1:
+        return default
+    return min(page_size, maximum)
@@ -0,0 +1,114 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import check_password_hash, generate_password_hash
+
+logger = logging.getLogger(__name__)
+
+
+class HashingOverloaded(Exception):
+    """
+    raised when every hashing slot is busy, the request should be retried later
+    """
+
+
+def _hash_password(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _check_password(pwhash, password):
+    return check_password_hash(pwhash, password)
+
+
+class PasswordHasher:
+    """
+    hashes and verifies passwords on a bounded process pool, so that a burst of logins
+    cannot take all of a web worker's CPU time (and GIL) away from the read endpoints.
+
+    at most PASSWORD_HASH_MAX_PENDING hashes run or wait per web worker; beyond that a
+    request waits PASSWORD_HASH_QUEUE_TIMEOUT seconds for a slot and is then shed with
+    HashingOverloaded. PASSWORD_HASH_WORKERS = 0 hashes inline on the calling thread.
+
+    PASSWORD_HASH_METHOD accepts any werkzeug method string (e.g. "scrypt:32768:8:1",
+    "pbkdf2:sha256:600000"). hashes made with other parameters are reported by
+    needs_rehash() so that login can upgrade them.
+    """
+    def __init__(self, method="scrypt", workers=0, max_pending=8, queue_timeout=0.5):
+        self.method = method
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self._executor = None
+        self._executor_pid = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._method_prefix = None
+
+    def init_app(self, app):
+        self.method = app.config.get("PASSWORD_HASH_METHOD", self.method)
+        self.workers = app.config.get("PASSWORD_HASH_WORKERS", self.workers)
+        self.max_pending = app.config.get("PASSWORD_HASH_MAX_PENDING", self.max_pending)
+        self.queue_timeout = app.config.get("PASSWORD_HASH_QUEUE_TIMEOUT", self.queue_timeout)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._method_prefix = None
+        app.extensions["password_hasher"] = self
+
+    def _get_executor(self):
+        # the pool is created lazily in each process, i.e. after gunicorn forked the worker
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context(method)
+                    )
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def _discard_executor(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise HashingOverloaded()
+        try:
+            executor = self._get_executor()
+            try:
+                return executor.submit(fn, *args).result()
+            except BrokenProcessPool:
+                # a pool process died (OOM kill, segfault), which breaks the pool for every
+                # later call: it is replaced and the call retried once
+                logger.warning("password hashing pool broken, starting a new one")
+                self._discard_executor(executor)
+                return self._get_executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(_hash_password, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(_check_password, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """
+        True when pwhash was made with other parameters than PASSWORD_HASH_METHOD
+        """
+        if self._method_prefix is None:
+            # werkzeug fills in defaults (e.g. "scrypt" -> "scrypt:32768:8:1"), so the
+            # canonical prefix is taken from a real hash
+            self._method_prefix = _hash_password("", self.method).split("$", 1)[0]
+        return pwhash.split("$", 1)[0] != self._method_prefix
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import namedtuple
+from app.utils.response import render_body
+
+CatalogSnapshot = namedtuple("CatalogSnapshot", ["stamp", "loaded_at", "plans", "body", "etag"])
+
+
+class PlanCatalog:
+    """
+    versioned in-memory copy of the plans table.
+
+    plans only change through create_plan, so the list endpoint and the plan-by-id
+    lookups are served from a snapshot holding the plans keyed by id and the
+    pre-serialized GET /plans body with its strong ETag.
+
+    invalidation reaches the other gunicorn workers through a version file shared by
+    every worker on the host: invalidate() replaces it and each worker compares its
+    stat() with the stamp of its snapshot before serving. PLAN_CATALOG_MAX_AGE bounds
+    staleness for changes made where the file is not shared (e.g. direct DB edits).
+    """
+    def __init__(self, max_age=300, version_file=None):
+        self.max_age = max_age
+        self.version_file = version_file
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_age = app.config.get("PLAN_CATALOG_MAX_AGE", self.max_age)
+        self.version_file = app.config.get("PLAN_CATALOG_VERSION_FILE") or os.path.join(
+            app.instance_path, "plan_catalog.version"
+        )
+        self._snapshot = None
+        app.extensions["plan_catalog"] = self
+
+    def _stamp(self):
+        try:
+            st = os.stat(self.version_file)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _is_fresh(self, snapshot, stamp):
+        return (
+            snapshot is not None
+            and snapshot.stamp == stamp
+            and time.monotonic() - snapshot.loaded_at < self.max_age
+        )
+
+    def fresh_snapshot(self):
+        """
+        returns the snapshot when it is still fresh, None when snapshot() would load it
+        """
+        snapshot = self._snapshot
+        return snapshot if self._is_fresh(snapshot, self._stamp()) else None
+
+    def snapshot(self):
+        stamp = self._stamp()
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot, stamp):
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if not self._is_fresh(snapshot, stamp):
+                snapshot = self._load(stamp)
+                self._snapshot = snapshot
+            return snapshot
+
+    def _load(self, stamp):
+        # imported here to keep the models out of the extensions import chain
+        from app.extensions import db
+        from app.models.subscriptions import SubscriptionPlan
+        from app.utils.read_replica import on_primary
+
+        # the snapshot outlives the request, a lagging replica would keep a new plan out of it
+        with on_primary():
+            plans = db.session.query(SubscriptionPlan).order_by(SubscriptionPlan.id).all()
+        plans = {plan.id: plan.to_dict() for plan in plans}
+        body = render_body(message="Plans fetched successfully", data=list(plans.values()))
+        etag = hashlib.sha256(body.encode()).hexdigest()[:32]
+        return CatalogSnapshot(stamp=stamp, loaded_at=time.monotonic(), plans=plans, body=body, etag=etag)
+
+    def get_plan(self, plan_id):
+        """
+        returns the plan as a dict (see SubscriptionPlan.to_dict) or None
+        """
+        try:
+            plan_id = int(plan_id)
+        except (TypeError, ValueError):
+            return None
+        return self.snapshot().plans.get(plan_id)
+
+    def invalidate(self):
+        """
+        drops the local snapshot and bumps the shared version file
+        """
+        self._snapshot = None
+        os.makedirs(os.path.dirname(self.version_file), exist_ok=True)
+        tmp_path = f"{self.version_file}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(uuid.uuid4().hex)
+        # os.replace gives the file a new inode, so the stamp changes even when
+        # two bumps land within the mtime resolution
+        os.replace(tmp_path, self.version_file)
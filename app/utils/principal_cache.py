@@ -0,0 +1,65 @@
+import threading
+from collections import namedtuple
+from app.utils.cache import MemoryBackend, cache_backend
+
+Principal = namedtuple("Principal", ["id", "is_admin", "token_version"])
+
+
+class PrincipalCache:
+    """
+    bounded, TTL-evicted cache of the auth-relevant fields of a user (admin flag and
+    token version), so that authenticating a request does not need a users-table lookup
+    on every call
+
+    entries live in the CACHE_BACKEND backend (see app/utils/cache). with the default
+    per-worker memory backend, the TTL bounds how long a revocation or admin demotion
+    made by another process can go unnoticed; with a shared or network backend,
+    invalidate() reaches every worker using it at once
+    """
+    def __init__(self, max_size=10000, ttl=30):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._backend = MemoryBackend(max_entries=max_size, namespace="principals")
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.max_size = app.config.get("AUTH_PRINCIPAL_CACHE_SIZE", self.max_size)
+        self.ttl = app.config.get("AUTH_PRINCIPAL_CACHE_TTL", self.ttl)
+        self._backend = cache_backend(app, "principals", max_entries=self.max_size)
+        # a shared backend keeps the entries of the other workers
+        self.hits = self.misses = 0
+        app.extensions["principal_cache"] = self
+
+    def get(self, user_id):
+        principal = self._backend.get(str(user_id))
+        with self._lock:
+            if principal is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return principal
+
+    def set(self, principal):
+        self._backend.set(str(principal.id), principal, ttl=self.ttl)
+
+    def invalidate(self, user_id):
+        self._backend.delete(str(user_id))
+
+    def clear(self):
+        self._backend.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        hits are requests that were authenticated without touching the DB
+        """
+        with self._lock:
+            return {
+                "served_without_db": self.hits,
+                "db_lookups": self.misses,
+                "backend": self._backend.stats(),
+            }
@@ -0,0 +1,54 @@
+from flask import g, has_request_context, request
+from app.utils.db_instrumentation import queries_executed
+
+
+class QueryBudgetExceeded(Exception):
+    """
+    raised after a request whose view executed more statements than its declared budget
+    """
+
+
+def query_budget(max_queries):
+    """
+    declares the maximum number of statements a view may execute per request,
+    authentication and cold caches included. enforced when QUERY_BUDGET_ENFORCE is set
+    (the test suite sets it, so going over a budget fails the build)
+    """
+    def decorator(f):
+        f.query_budget = max_queries
+        return f
+    return decorator
+
+
+def allow_extra_queries(count=1):
+    """
+    raises the budget of the current request, for views whose statement count depends on
+    their input by design (e.g. one statement per chunk of a batch lookup)
+    """
+    if has_request_context():
+        g.query_budget_extra = g.get("query_budget_extra", 0) + count
+
+
+def init_query_budget(app):
+    """
+    checks the statements counted by the DB instrumentation against the view's budget
+    when QUERY_BUDGET_ENFORCE is set
+    """
+    @app.before_request
+    def reset_query_budget():
+        g.query_budget_extra = 0
+
+    @app.after_request
+    def enforce_query_budget(response):
+        if not app.config.get("QUERY_BUDGET_ENFORCE"):
+            return response
+        view = app.view_functions.get(request.endpoint)
+        budget = getattr(view, "query_budget", None)
+        if budget is None:
+            return response
+        budget += g.get("query_budget_extra", 0)
+        if queries_executed() > budget:
+            raise QueryBudgetExceeded(
+                f"{request.method} {request.path} executed {queries_executed()} statements, budget is {budget}"
+            )
+        return response
@@ -0,0 +1,195 @@
+"""
+query plan checks for the registered statements (see app/utils/statement_registry.py).
+
+every statement is run through EXPLAIN QUERY PLAN (SQLite) or EXPLAIN (MySQL) with its
+sample parameters, and the plan is checked for full scans of CHECKED_TABLES and for
+temporary B-trees (SQLite) / filesorts and temporary tables (MySQL) used to sort or group.
+for each finding the index that would avoid it is suggested, following the usual order
+of equality columns first, then the sort columns (or the first range column).
+
+plans depend on the data and on the planner's statistics, so the checks are meant to run
+against a seeded database ("flask seed") after ANALYZE.
+"""
+import re
+from collections import namedtuple
+from sqlalchemy import event, inspect
+from app.extensions import db
+from app.utils.statement_registry import registered_statements, resolve
+
+CHECKED_TABLES = ("subscriptions", "current_subscriptions")
+
+EXPLAIN_PREFIXES = {"sqlite": "EXPLAIN QUERY PLAN ", "mysql": "EXPLAIN ", "mariadb": "EXPLAIN "}
+
+Finding = namedtuple("Finding", ["kind", "table", "detail"])
+
+
+class PlanCheck(namedtuple("PlanCheck", ["name", "sql", "plan", "findings", "suggestions", "allow"])):
+    @property
+    def failures(self):
+        return [finding for finding in self.findings if finding.kind not in self.allow]
+
+    @property
+    def ok(self):
+        return not self.failures
+
+
+_KEYWORDS = {"where", "set", "join", "on", "left", "right", "inner", "outer", "cross", "order", "group",
+             "limit", "values", "select", "as", "using", "natural", "having"}
+_table_ref = re.compile(r"\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_equality = re.compile(r"(?:\b(\w+)\.)?\b(\w+)\s*(?:=(?!=)|\bIN\b)", re.IGNORECASE)
+_range = re.compile(r"(?:\b(\w+)\.)?\b(\w+)\s*(?:<=|>=|<(?!>)|>)", re.IGNORECASE)
+_order_by = re.compile(r"\bORDER\s+BY\s+(.+?)(?:\bLIMIT\b|\bOFFSET\b|$)", re.IGNORECASE | re.DOTALL)
+_where = re.compile(r"\bWHERE\b(.*)", re.IGNORECASE | re.DOTALL)
+_long_list = re.compile(r"\(\?(?:, \?){3,}\)")
+
+
+def table_aliases(sql):
+    """
+    maps every table name and alias of the statement to its table
+    """
+    aliases = {}
+    for table, alias in _table_ref.findall(sql):
+        aliases[table] = table
+        if alias and alias.lower() not in _KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+def _columns(pattern, text, names, single_table):
+    columns = []
+    for qualifier, column in pattern.findall(text):
+        if column.lower() in _KEYWORDS or column.startswith(":"):
+            continue
+        if (qualifier in names or (not qualifier and single_table)) and column not in columns:
+            columns.append(column)
+    return columns
+
+
+def suggest_index(sql, table, aliases):
+    """
+    the columns of the index that would serve table's predicates and sort in sql
+    """
+    names = {name for name, target in aliases.items() if target == table}
+    single_table = len(set(aliases.values())) == 1
+    # bind parameters and string literals would look like columns to the patterns
+    cleaned = re.sub(r":\w+|'[^']*'", "?", sql)
+    where = _where.search(cleaned)
+    where = where.group(1) if where else ""
+    where = _order_by.sub("", where)
+    equality = _columns(_equality, where, names, single_table)
+    ranges = [column for column in _columns(_range, where, names, single_table) if column not in equality]
+    order = []
+    match = _order_by.search(cleaned)
+    if match:
+        for part in match.group(1).split(","):
+            part = re.sub(r"\s+(ASC|DESC)\s*$", "", part.strip(), flags=re.IGNORECASE)
+            qualifier, _, column = part.rpartition(".")
+            if (qualifier in names or (not qualifier and single_table)) and column not in equality + order:
+                order.append(column)
+    return equality + (order or ranges[:1])
+
+
+def _suggestions(sql, tables, aliases):
+    suggestions = []
+    for table in tables:
+        columns = suggest_index(sql, table, aliases)
+        if not columns:
+            continue
+        existing = [
+            index["name"] for index in inspect(db.engine).get_indexes(table)
+            if index["column_names"][:len(columns)] == columns
+        ]
+        if existing:
+            suggestions.append(
+                f"{existing[0]} covers {table} ({', '.join(columns)}) but was not used: "
+                f"run ANALYZE, or check that the predicates can use it"
+            )
+        else:
+            suggestions.append(f"CREATE INDEX idx_{table}_{'_'.join(columns)} ON {table} ({', '.join(columns)})")
+    return suggestions
+
+
+def _explain_prefix(conn, cursor, statement, parameters, context, executemany):
+    prefix = context.execution_options.get("explain_prefix") if context is not None else None
+    if prefix:
+        statement = prefix + statement
+    return statement, parameters
+
+
+def explain(statement, params):
+    """
+    returns (sql, plan rows) of statement, which is compiled and bound as it would be for
+    execution and then run with the dialect's EXPLAIN prefix, never for real
+    """
+    engine = db.engine
+    prefix = EXPLAIN_PREFIXES.get(engine.dialect.name)
+    if prefix is None:
+        raise NotImplementedError(f"no EXPLAIN support for {engine.dialect.name}")
+    if not event.contains(engine, "before_cursor_execute", _explain_prefix):
+        event.listen(engine, "before_cursor_execute", _explain_prefix, retval=True)
+    with engine.connect() as conn:
+        result = conn.execution_options(explain_prefix=prefix).execute(statement, params)
+        sql = result.context.statement
+        if sql.startswith(prefix):
+            sql = sql[len(prefix):]
+        rows = result.mappings().fetchall()
+        conn.rollback()
+    return sql, rows
+
+
+def _findings_sqlite(rows, aliases, tables):
+    plan, findings = [], []
+    for row in rows:
+        detail = row["detail"]
+        plan.append(detail)
+        scan = re.match(r"SCAN (\w+)", detail)
+        if scan and aliases.get(scan.group(1), scan.group(1)) in CHECKED_TABLES:
+            findings.append(Finding("scan", aliases.get(scan.group(1), scan.group(1)), detail))
+        if "TEMP B-TREE" in detail:
+            findings.extend(Finding("temp_btree", table, detail) for table in tables)
+    return plan, findings
+
+
+def _findings_mysql(rows, aliases, tables):
+    plan, findings = [], []
+    for row in rows:
+        table = aliases.get(row["table"], row["table"])
+        extra = row.get("Extra") or ""
+        plan.append(f"{row['table']}: type={row['type']} key={row['key']} rows={row['rows']} {extra}".strip())
+        if table not in CHECKED_TABLES:
+            continue
+        if row["type"] in ("ALL", "index"):
+            findings.append(Finding("scan", table, plan[-1]))
+        if "Using temporary" in extra or "Using filesort" in extra:
+            findings.append(Finding("temp_btree", table, plan[-1]))
+    return plan, findings
+
+
+def check_statement(entry):
+    statement, params = resolve(entry)
+    sql, rows = explain(statement, params)
+    aliases = table_aliases(sql)
+    tables = sorted({table for table in aliases.values() if table in CHECKED_TABLES})
+    if db.engine.dialect.name == "sqlite":
+        plan, findings = _findings_sqlite(rows, aliases, tables)
+    else:
+        plan, findings = _findings_mysql(rows, aliases, tables)
+    failing_tables = sorted({finding.table for finding in findings if finding.kind not in entry.allow})
+    return PlanCheck(
+        name=entry.name,
+        sql=_long_list.sub(lambda m: f"(?, ... {m.group(0).count('?')} values)", " ".join(sql.split())),
+        plan=plan,
+        findings=findings,
+        suggestions=_suggestions(sql, failing_tables, aliases),
+        allow=entry.allow,
+    )
+
+
+def check_all(analyze=False):
+    """
+    checks every registered statement, ANALYZE first refreshes the planner statistics
+    """
+    if analyze:
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE" if db.engine.dialect.name == "sqlite" else f"ANALYZE TABLE {', '.join(CHECKED_TABLES)}")
+    return [check_statement(entry) for entry in registered_statements()]
@@ -0,0 +1,85 @@
+import os
+import time
+from contextlib import contextmanager
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from app.utils.shared_slots import SharedSlots
+
+REPLICA_BIND = "replica"
+
+
+class RoutingSession(Session):
+    """
+    session sending the statements of read-only requests (see the replica_reads decorator)
+    to the "replica" bind of SQLALCHEMY_BINDS. flushes and everything outside those
+    requests go to the primary, as does every request when no replica is configured
+    """
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get("use_replica"):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@contextmanager
+def on_primary():
+    """
+    runs the block's reads on the primary, e.g. to load caches that outlive the request
+    """
+    previous = g.get("use_replica", False)
+    g.use_replica = False
+    try:
+        yield
+    finally:
+        g.use_replica = previous
+
+
+class ReadReplica:
+    """
+    routing of read-only requests to the replica with a read-your-writes window: a user
+    who subscribed, changed plan or cancelled in the last READ_YOUR_WRITES_SECONDS reads
+    from the primary, so they see their write whatever the replication lag.
+
+    the pins are shared by every gunicorn worker on the host through a SharedSlots file of
+    READ_YOUR_WRITES_SLOTS timestamps. users sharing a slot pin each other, which costs a
+    primary read and never serves a stale one. workers on other hosts do not see the
+    pins, put the hosts behind a sticky load balancer or size the window above the
+    replication lag and accept the rest.
+    """
+    def __init__(self, window=5.0, slots=65536):
+        self.window = window
+        self.slots = slots
+        self.enabled = False
+        self._pins = None
+
+    def init_app(self, app):
+        self.window = app.config.get("READ_YOUR_WRITES_SECONDS", self.window)
+        self.slots = app.config.get("READ_YOUR_WRITES_SLOTS", self.slots)
+        pins_file = app.config.get("READ_YOUR_WRITES_FILE") or os.path.join(app.instance_path, "primary_pins")
+        self.enabled = REPLICA_BIND in (app.config.get("SQLALCHEMY_BINDS") or {})
+        self._pins = SharedSlots(pins_file, self.slots, "d")
+        app.extensions["read_replica"] = self
+
+        @app.before_request
+        def reset_routing():
+            # g can outlive a request when an app context was already pushed (e.g. in tests)
+            g.use_replica = False
+
+    def pin(self, user_id):
+        """
+        keeps user_id's reads on the primary for the window, call after committing a write
+        """
+        if self.enabled and user_id is not None:
+            self._pins.set(user_id, time.time())
+
+    def is_pinned(self, user_id):
+        if user_id is None:
+            return False
+        return time.time() - self._pins.get(user_id) < self.window
+
+    def route_request(self, user_id):
+        """
+        sends the current request's reads to the replica unless user_id is pinned
+        """
+        g.use_replica = self.enabled and not self.is_pinned(user_id)
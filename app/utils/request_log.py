@@ -0,0 +1,55 @@
+"""
+opt-in request log, replayed by benchmarks/replay.py.
+
+with REQUEST_LOG_PATH set, every request is appended to that file as one JSON object per
+line: {"ts", "method", "path", "query", "json", "user_id", "status", "duration_ms"}.
+password fields are written as null, a replay logs in with the password it is given.
+each line is a single O_APPEND write, so the workers of one host can share the file.
+"""
+import json
+import os
+import time
+from flask import g, request
+
+REDACTED_FIELDS = {"password"}
+
+
+def _redact(body):
+    if isinstance(body, dict):
+        return {key: None if key in REDACTED_FIELDS else value for key, value in body.items()}
+    return body
+
+
+def init_request_log(app):
+    path = app.config.get("REQUEST_LOG_PATH")
+    if not path:
+        return
+    # opened lazily, once per worker process
+    state = {"fd": None, "pid": None}
+
+    @app.before_request
+    def start_request_log():
+        # g can outlive a request when an app context was already pushed (e.g. in tests)
+        g.pop("principal_id", None)
+        g.request_log_started = time.perf_counter()
+
+    @app.after_request
+    def write_request_log(response):
+        started = g.pop("request_log_started", None)
+        if started is None:
+            return response
+        if state["pid"] != os.getpid():
+            state["fd"] = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o640)
+            state["pid"] = os.getpid()
+        entry = {
+            "ts": round(time.time(), 6),
+            "method": request.method,
+            "path": request.path,
+            "query": request.query_string.decode() or None,
+            "json": _redact(request.get_json(silent=True)),
+            "user_id": g.get("principal_id"),
+            "status": response.status_code,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+        os.write(state["fd"], (json.dumps(entry, separators=(",", ":")) + "\n").encode())
+        return response
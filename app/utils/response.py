@@ -1,14 +1,87 @@
-from flask import jsonify
+from flask import current_app, jsonify, request, stream_with_context
 
-def make_response(message=None, data=None, error=None, status_code=200):
+def _dumps(obj):
+    # same compact output as jsonify
+    return current_app.json.dumps(obj, separators=(",", ":"))
+
+def row_dicts(rows):
+    """
+    dicts of Result rows (fetched without .mappings()), ready for the JSON provider
+
+    OPTIMIZATION: the column names are looked up once per call and zipped with each row's
+    values, which costs about half as much as converting every RowMapping with dict()
+    """
+    if not rows:
+        return []
+    keys = rows[0]._fields
+    return [dict(zip(keys, row)) for row in rows]
+
+def make_response(message=None, data=None, error=None, status_code=200, meta=None):
     """
     utility function for creating a response object
     this was created to ensure consistent response format across the app
     while ensuring DRYness
+
+    meta (e.g. pagination cursors) is only added to the envelope when given
     """
     response = {
         "message": message,
         "data": data,
         "error": error
     }
+    if meta is not None:
+        response["meta"] = meta
     return jsonify(response), status_code
+
+def render_body(message=None, data=None, error=None, meta=None):
+    """
+    serializes the same envelope as make_response into a string, for responses
+    that are built once and then served many times from a cache
+    """
+    response = {
+        "message": message,
+        "data": data,
+        "error": error
+    }
+    if meta is not None:
+        response["meta"] = meta
+    return f"{_dumps(response)}\n"
+
+def make_cached_response(body, etag, status_code=200):
+    """
+    utility function for serving a pre-rendered body with a strong ETag.
+    answers 304 without a body when the client already holds the current version
+    """
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(body, status=status_code, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+def make_streaming_response(batches, message=None, ndjson=False):
+    """
+    utility function for streaming rows without materializing them, batches is an
+    iterable of lists of rows (e.g. Result.partitions()).
+
+    with ndjson=True every row is written as its own JSON line, otherwise the rows are
+    written as the data array of the usual envelope (keys in the same order as jsonify)
+    """
+    def generate_ndjson():
+        for batch in batches:
+            yield "".join(f"{_dumps(row)}\n" for row in row_dicts(batch))
+
+    def generate_envelope():
+        yield '{"data":['
+        separator = ""
+        for batch in batches:
+            if batch:
+                # one dumps call per batch, the brackets of the dumped list are dropped
+                yield separator + _dumps(row_dicts(batch))[1:-1]
+                separator = ","
+        yield f'],"error":null,"message":{_dumps(message)}}}\n'
+
+    if ndjson:
+        return current_app.response_class(stream_with_context(generate_ndjson()), mimetype="application/x-ndjson")
+    return current_app.response_class(stream_with_context(generate_envelope()), mimetype="application/json")
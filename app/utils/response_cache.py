@@ -0,0 +1,201 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from flask import g, has_app_context
+from app.utils.metrics import record_cache_lookup
+from app.utils.shared_slots import SharedSlots
+
+CachedResponse = namedtuple("CachedResponse", ["body", "etag"])
+_Entry = namedtuple("_Entry", ["version", "expires_at", "response", "size"])
+
+# bookkeeping bytes per entry besides the body, keeps many tiny entries within the bound
+_ENTRY_OVERHEAD = 256
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+
+
+def _random_version():
+    return int.from_bytes(os.urandom(8), "little")
+
+
+class UserResponseCache:
+    """
+    per-user cache of rendered responses (GET /active and the first page of GET /history),
+    which only change when the user subscribes, changes plan or cancels, or when the expiry
+    sweeper expires one of their subscriptions.
+
+    entries are keyed by the user's version, a random stamp in a SharedSlots file that the
+    writes and the sweeper replace after committing (invalidate), so a write in any worker
+    (or the CLI) of the host invalidates the entries of every worker. the version is read
+    before the database, so an entry can never hold data older than its version. users
+    sharing a slot invalidate each other, which only costs misses.
+
+    entries are evicted least recently used first once they take more than
+    RESPONSE_CACHE_MAX_BYTES, and expire after RESPONSE_CACHE_TTL seconds (which bounds
+    staleness for changes the version file does not see, e.g. writes made on other hosts)
+    or at the expiry the loader gives (e.g. ends_at of the active subscription).
+    concurrent misses of the same entry in a worker run the loader once (single-flight).
+    responses loaded from the read replica are not stored, as the replica may not have
+    caught up with the version yet.
+    """
+    def __init__(self, max_bytes=32 * 2**20, ttl=60, slots=65536, flight_timeout=5):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.slots = slots
+        self.flight_timeout = flight_timeout
+        self._versions = None
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def init_app(self, app):
+        self.max_bytes = app.config.get("RESPONSE_CACHE_MAX_BYTES", self.max_bytes)
+        self.ttl = app.config.get("RESPONSE_CACHE_TTL", self.ttl)
+        self.slots = app.config.get("RESPONSE_CACHE_SLOTS", self.slots)
+        versions_file = app.config.get("RESPONSE_CACHE_VERSIONS_FILE") or os.path.join(
+            app.instance_path, "response_cache.versions"
+        )
+        self._versions = SharedSlots(versions_file, self.slots, "Q")
+        self.clear()
+        app.extensions["response_cache"] = self
+
+    def get_or_load(self, user_id, kind, load):
+        """
+        returns the CachedResponse of kind for user_id, calling load() on a miss. load
+        returns (body, expires_at) where expires_at (datetime, ISO string or None) ends
+        the entry's validity before the TTL
+        """
+        if self.ttl <= 0:
+            return self._render(load()[0])
+        key = (user_id, kind)
+        version = self._versions.get(user_id)
+        with self._lock:
+            response = self._hit(key, version)
+            if response is not None:
+                return response
+            flight = self._flights.get((key, version))
+            leader = flight is None
+            if leader:
+                flight = self._flights[(key, version)] = _Flight()
+                self.misses += 1
+        if not leader:
+            if flight.done.wait(self.flight_timeout) and flight.response is not None:
+                with self._lock:
+                    self.coalesced += 1
+                record_cache_lookup("user_responses", "coalesced")
+                return flight.response
+            # the leader failed or is stuck, load without caching
+            return self._render(load()[0])
+        record_cache_lookup("user_responses", "miss")
+        try:
+            body, expires_at = load()
+            flight.response = self._render(body)
+            if not (has_app_context() and g.get("use_replica")):
+                self._store(key, version, flight.response, expires_at)
+            return flight.response
+        finally:
+            with self._lock:
+                self._flights.pop((key, version), None)
+            flight.done.set()
+
+    def _hit(self, key, version):
+        # with self._lock held
+        entry = self._entries.get(key)
+        if entry is None or entry.version != version or entry.expires_at <= time.monotonic():
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        record_cache_lookup("user_responses", "hit")
+        return entry.response
+
+    def peek(self, user_id, kind):
+        """
+        returns (CachedResponse or None, version) without loading, for callers that load
+        on their own (the async routes), which then hand the body to put with the version
+        """
+        version = self._versions.get(user_id)
+        if self.ttl <= 0:
+            return None, version
+        with self._lock:
+            return self._hit((user_id, kind), version), version
+
+    def put(self, user_id, kind, version, body, expires_at, store=True):
+        """
+        renders body, stores it under the version peek returned unless store is false
+        (e.g. for bodies read from the replica), returns the CachedResponse
+        """
+        response = self._render(body)
+        if self.ttl > 0:
+            with self._lock:
+                self.misses += 1
+            record_cache_lookup("user_responses", "miss")
+            if store:
+                self._store((user_id, kind), version, response, expires_at)
+        return response
+
+    def _render(self, body):
+        return CachedResponse(body=body, etag=hashlib.sha256(body.encode()).hexdigest()[:32])
+
+    def _store(self, key, version, response, expires_at):
+        now = time.monotonic()
+        expires = now + self.ttl
+        if isinstance(expires_at, str):
+            expires_at = datetime.fromisoformat(expires_at)
+        if expires_at is not None:
+            expires = min(expires, now + (expires_at - datetime.now()).total_seconds())
+        if expires <= now:
+            return
+        size = len(response.body) + _ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key] = _Entry(version, expires, response, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+
+    def invalidate(self, *user_ids):
+        """
+        replaces the versions of user_ids, call after committing a change to their data
+        """
+        for user_id in user_ids:
+            self._versions.set(user_id, _random_version())
+
+    def invalidate_all(self):
+        """
+        replaces every version, e.g. after the current_subscriptions projection is rebuilt
+        """
+        self._versions.fill(lambda slot: _random_version())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.coalesced = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
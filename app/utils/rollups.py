@@ -0,0 +1,213 @@
+"""
+maintenance of the analytics rollups (see PlanRollup and DailyRollup).
+
+plan_rollups mirrors the current_subscriptions projection grouped by plan: every change
+of a user's projection row moves them between plans, so the plan statements run next to
+the projection's, before it changes. daily_rollups counts the subscriptions started,
+cancelled and expired per day. like the projection's, the write helpers only execute
+statements and the caller commits.
+"""
+from collections import Counter, namedtuple
+from datetime import date, datetime
+from sqlalchemy import bindparam, delete, select, text, update
+from app.extensions import db
+from app.models.subscriptions import DailyRollup, PlanRollup
+from app.utils.current_subscriptions import expected_query
+from app.utils.statement_registry import register_statement
+
+DriftReport = namedtuple("DriftReport", ["plans", "days", "stale_plans", "stale_days"])
+
+plan_table = PlanRollup.__table__
+daily_table = DailyRollup.__table__
+DAILY_COUNTS = ["started", "cancelled", "expired"]
+
+# the user's projection row leaves its plan, run before the row is changed or deleted
+leave_plan_query = register_statement("rollups.leave_plan", text("""
+    UPDATE plan_rollups SET active_count = active_count - 1
+    WHERE plan_id = (SELECT plan_id FROM current_subscriptions WHERE user_id = :uid)
+"""), {"uid": 1})
+
+# the projection rows of expiring subscriptions leave their plans, run before they are deleted
+leave_plans_query = register_statement("rollups.leave_plans", text("""
+    UPDATE plan_rollups SET active_count = active_count - (
+        SELECT COUNT(*) FROM current_subscriptions c
+        WHERE c.plan_id = plan_rollups.plan_id AND c.subscription_id IN :ids
+    )
+    WHERE plan_id IN (SELECT plan_id FROM current_subscriptions WHERE subscription_id IN :ids)
+""").bindparams(bindparam("ids", expanding=True)), {"ids": [1, 2, 3]})
+
+# subscriptions cancelled by /cancel or expired, a subscription cancelled because its user
+# subscribed again (the next one starts when it ends) was replaced, not lost
+events_query = """
+    SELECT DATE(starts_at) AS day, 1 AS started, 0 AS cancelled, 0 AS expired FROM subscriptions
+    UNION ALL
+    SELECT DATE(s.ends_at), 0, 1, 0 FROM subscriptions s
+    WHERE s.status = 'cancelled' AND NOT EXISTS (
+        SELECT 1 FROM subscriptions s2
+        WHERE s2.user_id = s.user_id AND s2.starts_at = s.ends_at AND s2.id <> s.id
+    )
+    UNION ALL
+    SELECT DATE(ends_at), 0, 0, 1 FROM subscriptions WHERE status = 'expired'
+"""
+
+expected_plans_query = f"SELECT plan_id, COUNT(*) AS active_count FROM ({expected_query}) current GROUP BY plan_id"
+expected_days_query = f"""
+    SELECT day, SUM(started) AS started, SUM(cancelled) AS cancelled, SUM(expired) AS expired
+    FROM ({events_query}) events GROUP BY day
+"""
+
+
+def _day(value):
+    # DATE() and text() results are strings on SQLite
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _add(table, keys, rows):
+    """
+    adds the counts of rows (dicts holding the keys and counts) to the existing ones,
+    OPTIMIZATION: one upsert statement executed for every row, like set_current
+    """
+    if not rows:
+        return
+    counts = [column for column in rows[0] if column not in keys]
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects import mysql
+
+        stmt = mysql.insert(table)
+        stmt = stmt.on_duplicate_key_update({k: table.c[k] + stmt.inserted[k] for k in counts})
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects import sqlite
+
+        stmt = sqlite.insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=keys, set_={k: table.c[k] + stmt.excluded[k] for k in counts})
+    else:
+        for row in rows:
+            where = [table.c[k] == row[k] for k in keys]
+            if not db.session.execute(update(table).where(*where).values({k: table.c[k] + row[k] for k in counts})).rowcount:
+                db.session.execute(table.insert().values(**row))
+        return
+    db.session.execute(stmt, rows)
+
+
+def _count_day(day, column, count=1):
+    row = dict.fromkeys(DAILY_COUNTS, 0)
+    row.update(day=day, **{column: count})
+    _add(daily_table, ["day"], [row])
+
+
+def subscription_started(user_id, plan_id, replaced, now):
+    """
+    call before the projection row of the new subscription is written, replaced tells
+    whether subscribing cancelled an active subscription
+    """
+    if replaced:
+        db.session.execute(leave_plan_query, {"uid": user_id})
+    _add(plan_table, ["plan_id"], [{"plan_id": plan_id, "active_count": 1}])
+    _count_day(now.date(), "started")
+
+
+def plan_changed(user_id, plan_id):
+    """
+    call before the projection row is moved to plan_id
+    """
+    db.session.execute(leave_plan_query, {"uid": user_id})
+    _add(plan_table, ["plan_id"], [{"plan_id": plan_id, "active_count": 1}])
+
+
+def subscription_cancelled(user_id, now):
+    """
+    call before the projection row is deleted
+    """
+    db.session.execute(leave_plan_query, {"uid": user_id})
+    _count_day(now.date(), "cancelled")
+
+
+def subscriptions_expired(rows):
+    """
+    call before the projection rows of the expiring subscriptions (rows of id and ends_at)
+    are deleted, they are counted on the day they lapsed
+    """
+    if not rows:
+        return
+    db.session.execute(leave_plans_query, {"ids": [row["id"] for row in rows]})
+    days = Counter(_day(row["ends_at"]) for row in rows)
+    _add(daily_table, ["day"], [
+        {"day": day, "started": 0, "cancelled": 0, "expired": count} for day, count in sorted(days.items())
+    ])
+
+
+def add_seeded(plan_counts, day_counts):
+    """
+    adds the counts of bulk-inserted subscriptions, plan_counts is {plan_id: active users}
+    and day_counts {day: {"started": n, ...}}
+    """
+    _add(plan_table, ["plan_id"], [
+        {"plan_id": plan_id, "active_count": count} for plan_id, count in sorted(plan_counts.items())
+    ])
+    _add(daily_table, ["day"], [
+        {"day": day, **{column: counts.get(column, 0) for column in DAILY_COUNTS}} for day, counts in sorted(day_counts.items())
+    ])
+
+
+def plan_counts():
+    """
+    {plan_id: active users}, one row per plan
+    """
+    return dict(db.session.execute(select(plan_table.c.plan_id, plan_table.c.active_count)).all())
+
+
+def daily_counts(since):
+    """
+    {day: (started, cancelled, expired)} of the days from since on that have any
+    """
+    rows = db.session.execute(
+        select(daily_table.c.day, *(daily_table.c[column] for column in DAILY_COUNTS)).where(daily_table.c.day >= since)
+    )
+    return {row.day: tuple(row)[1:] for row in rows}
+
+
+def rebuild():
+    """
+    recomputes both rollups from the subscriptions table in one transaction (a full
+    scan of it), returns (plans, days) written
+    """
+    db.session.execute(delete(plan_table))
+    db.session.execute(delete(daily_table))
+    plans = [dict(row) for row in db.session.execute(text(expected_plans_query)).mappings()]
+    days = [
+        {"day": _day(row["day"]), **{column: int(row[column]) for column in DAILY_COUNTS}}
+        for row in db.session.execute(text(expected_days_query)).mappings()
+    ]
+    if plans:
+        db.session.execute(plan_table.insert(), plans)
+    if days:
+        db.session.execute(daily_table.insert(), days)
+    db.session.commit()
+    return len(plans), len(days)
+
+
+def verify():
+    """
+    compares the rollups with what rebuild() would write, without changing anything.
+    rows of zeros count as missing rows
+    """
+    def nonzero(rows):
+        return {key: counts for key, counts in rows if any(counts)}
+
+    expected_plans = nonzero((row.plan_id, (row.active_count,)) for row in db.session.execute(text(expected_plans_query)))
+    actual_plans = nonzero((plan_id, (count,)) for plan_id, count in plan_counts().items())
+    expected_days = nonzero(
+        (_day(row.day), tuple(int(row[i]) for i in range(1, 4))) for row in db.session.execute(text(expected_days_query))
+    )
+    actual_days = nonzero(daily_counts(date.min).items())
+    return DriftReport(
+        plans=len(expected_plans),
+        days=len(expected_days),
+        stale_plans=sorted(k for k in set(expected_plans) | set(actual_plans) if expected_plans.get(k) != actual_plans.get(k)),
+        stale_days=sorted(k for k in set(expected_days) | set(actual_days) if expected_days.get(k) != actual_days.get(k)),
+    )
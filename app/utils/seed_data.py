@@ -0,0 +1,223 @@
+"""
+synthetic data for load testing, used by "flask seed".
+
+users are generated in chunks of consecutive ids, each chunk from its own random stream
+(seeded by the run seed and the chunk number), so that chunks can be generated by a
+process pool in any order and a given seed always produces the same data. only the
+parent process writes: it numbers the subscriptions and inserts every chunk with one
+executemany per table and one commit per chunk.
+
+subscription histories are skewed like production ones: the number of subscriptions
+per user follows a Pareto distribution (most users have one or two, a few have dozens),
+plan popularity follows a Zipf-like distribution, and every user's history is a
+non-overlapping sequence of periods where each earlier subscription was either cancelled
+(when the user switched plans) or expired, and the last one is active, cancelled or expired.
+"""
+import multiprocessing
+import random
+import time
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, select
+from sqlalchemy.engine import make_url
+from app.extensions import db
+from app.models import CurrentSubscription, Subscription, SubscriptionPlan, User
+from app.utils import rollups
+
+SeedReport = namedtuple("SeedReport", ["users", "plans", "subscriptions", "statuses", "seconds"])
+
+PERIOD_DAYS = (7, 30, 30, 30, 90, 365)
+
+# column order of the rows built by generate_chunk, subscriptions.id and
+# current_subscriptions.subscription_id are added by the writer
+USER_COLUMNS = ["id", "email", "password", "is_admin", "token_version", "created_at", "updated_at"]
+SUBSCRIPTION_COLUMNS = ["user_id", "plan_id", "status", "starts_at", "ends_at", "created_at", "updated_at"]
+CURRENT_COLUMNS = ["user_id", "plan_id", "name", "description", "status", "starts_at", "ends_at"]
+
+_processors = {}
+
+
+def _row_processors(url, table, columns):
+    """
+    bind processors of the columns for the database at url (e.g. datetime -> string on
+    SQLite), cached per process
+    """
+    key = (url, table.name)
+    if key not in _processors:
+        dialect = make_url(url).get_dialect()()
+        _processors[key] = [table.c[column].type.dialect_impl(dialect).bind_processor(dialect) for column in columns]
+    return _processors[key]
+
+
+def _render(rows, processors):
+    return [
+        tuple(value if process is None else process(value) for value, process in zip(row, processors))
+        for row in rows
+    ]
+
+
+def generate_chunk(args):
+    """
+    generates the users first_id..first_id+count-1 and their subscriptions as rows ready
+    for the driver, returns (users, subscriptions, current, statuses, rollup counts) where
+    current rows come with the index of their subscription in place of its id, and the
+    rollup counts are the arguments of rollups.add_seeded
+    """
+    seed, chunk, first_id, count, plans, options, now, password_hash, url = args
+    rng = random.Random(f"{seed}:{chunk}")
+    plan_weights = [1 / (rank + 1) for rank in range(len(plans))]
+    users, subscriptions, current = [], [], []
+    statuses = {"active": 0, "cancelled": 0, "expired": 0}
+    plan_counts, day_counts = Counter(), defaultdict(Counter)
+    for user_id in range(first_id, first_id + count):
+        length = min(options["max_history"], int(rng.paretovariate(options["history_alpha"])))
+        periods = [timedelta(days=rng.choice(PERIOD_DAYS)) for _ in range(length)]
+        roll = rng.random()
+        if roll < options["active_ratio"]:
+            last_status = "active"
+        elif roll < options["active_ratio"] + (1 - options["active_ratio"]) / 2:
+            last_status = "cancelled"
+        else:
+            last_status = "expired"
+        # the last period ends in the future for active subscriptions (except a few lapsed
+        # ones still waiting for the expiry sweeper) and in the past otherwise
+        if last_status == "active" and rng.random() >= options["lapsed_ratio"]:
+            end = now + timedelta(seconds=rng.randrange(1, int(periods[-1].total_seconds())))
+        else:
+            end = now - timedelta(seconds=rng.randrange(3600, 90 * 86400))
+        history = []
+        for index in range(length - 1, -1, -1):
+            starts_at = end - periods[index]
+            if index == length - 1:
+                status = last_status
+            else:
+                status = "cancelled" if rng.random() < options["switch_ratio"] else "expired"
+            history.append((starts_at, end, status))
+            # a switch cancels the previous subscription when the next one starts, an
+            # expiry leaves a gap before the user subscribes again
+            end = starts_at if status == "cancelled" else starts_at - timedelta(days=rng.randrange(1, 60))
+        history.reverse()
+
+        users.append((user_id, f"user{user_id}@seed.example.com", password_hash, False, 0, history[0][0], history[0][0]))
+        for index, (starts_at, ends_at, status) in enumerate(history):
+            plan = rng.choices(plans, weights=plan_weights)[0]
+            statuses[status] += 1
+            # counted as rollups.rebuild() would: a cancelled subscription followed by one
+            # starting when it ends was replaced
+            day_counts[starts_at.date()]["started"] += 1
+            replaced = index + 1 < len(history) and history[index + 1][0] == ends_at
+            if status == "expired" or (status == "cancelled" and not replaced):
+                day_counts[ends_at.date()][status] += 1
+            subscriptions.append((
+                user_id, plan[0], status, starts_at, ends_at, starts_at,
+                ends_at if status != "active" else starts_at,
+            ))
+        if last_status == "active":
+            plan_counts[plan[0]] += 1
+            current.append((len(subscriptions) - 1, (user_id, plan[0], plan[1], plan[2], "active", starts_at, ends_at)))
+
+    # OPTIMIZATION: parameters are converted here, in the generator processes, so the
+    # writer only hands ready rows to the driver
+    current_processors = _row_processors(url, CurrentSubscription.__table__, CURRENT_COLUMNS)
+    return (
+        _render(users, _row_processors(url, User.__table__, USER_COLUMNS)),
+        _render(subscriptions, _row_processors(url, Subscription.__table__, SUBSCRIPTION_COLUMNS)),
+        [(index, row) for (index, _), row in zip(current, _render([row for _, row in current], current_processors))],
+        statuses,
+        (plan_counts, day_counts),
+    )
+
+
+def create_plans(count):
+    """
+    returns [(id, name, description)] of the plans, creating the missing ones
+    """
+    query = select(SubscriptionPlan.id, SubscriptionPlan.name, SubscriptionPlan.description).order_by(SubscriptionPlan.id)
+    existing = db.session.execute(query).all()
+    if len(existing) < count:
+        db.session.execute(insert(SubscriptionPlan), [
+            {"name": f"Plan {i}", "description": f"Seeded plan {i}", "price_cents": 500 * (i + 1)}
+            for i in range(len(existing), count)
+        ])
+        db.session.commit()
+        existing = db.session.execute(query).all()
+    return [tuple(row) for row in existing[:count]]
+
+
+def _insert_sql(connection, table, columns):
+    """
+    the dialect's own positional INSERT statement, for exec_driver_sql
+    """
+    compiled = insert(table).compile(dialect=connection.dialect, column_keys=columns)
+    # the statement lists the columns in table order, the rows have to match it
+    assert compiled.positiontup == columns, (compiled.positiontup, columns)
+    return str(compiled)
+
+
+def _chunks(pool, jobs):
+    if pool is None:
+        return map(generate_chunk, jobs)
+    return pool.imap(generate_chunk, jobs, chunksize=1)
+
+
+def seed(users, plans=5, chunk_size=5000, workers=1, password_hash="", random_seed=0,
+         active_ratio=0.6, lapsed_ratio=0.02, switch_ratio=0.3, history_alpha=1.5, max_history=50,
+         now=None, progress=None):
+    """
+    appends users (with ids after the current maximum) and their subscription histories,
+    keeping current_subscriptions and the rollups in sync, returns a SeedReport
+    """
+    started = time.perf_counter()
+    now = now or datetime.now()
+    plan_rows = create_plans(plans)
+    first_user = (db.session.execute(select(func.max(User.id))).scalar() or 0) + 1
+    next_subscription = (db.session.execute(select(func.max(Subscription.id))).scalar() or 0) + 1
+    connection = db.session.connection()
+    url = connection.engine.url.render_as_string(hide_password=False)
+    user_sql = _insert_sql(connection, User.__table__, USER_COLUMNS)
+    subscription_sql = _insert_sql(connection, Subscription.__table__, ["id"] + SUBSCRIPTION_COLUMNS)
+    current_sql = _insert_sql(connection, CurrentSubscription.__table__, CURRENT_COLUMNS[:1] + ["subscription_id"] + CURRENT_COLUMNS[1:])
+    db.session.commit()
+
+    options = {
+        "active_ratio": active_ratio,
+        "lapsed_ratio": lapsed_ratio,
+        "switch_ratio": switch_ratio,
+        "history_alpha": history_alpha,
+        "max_history": max_history,
+    }
+    jobs = [
+        (random_seed, chunk, first_user + offset, min(chunk_size, users - offset), plan_rows, options, now, password_hash, url)
+        for chunk, offset in enumerate(range(0, users, chunk_size))
+    ]
+    statuses = {"active": 0, "cancelled": 0, "expired": 0}
+    written_users = written_subscriptions = 0
+    pool = None
+    if workers > 1:
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        pool = multiprocessing.get_context(method).Pool(workers)
+    try:
+        for user_rows, subscription_rows, current_rows, chunk_statuses, rollup_counts in _chunks(pool, jobs):
+            connection = db.session.connection()
+            connection.exec_driver_sql(user_sql, user_rows)
+            connection.exec_driver_sql(subscription_sql, [
+                (next_subscription + offset,) + row for offset, row in enumerate(subscription_rows)
+            ])
+            if current_rows:
+                connection.exec_driver_sql(current_sql, [
+                    row[:1] + (next_subscription + index,) + row[1:] for index, row in current_rows
+                ])
+            rollups.add_seeded(*rollup_counts)
+            db.session.commit()
+            next_subscription += len(subscription_rows)
+            written_users += len(user_rows)
+            written_subscriptions += len(subscription_rows)
+            for status, count in chunk_statuses.items():
+                statuses[status] += count
+            if progress:
+                progress(written_users, written_subscriptions, time.perf_counter() - started)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return SeedReport(written_users, len(plan_rows), written_subscriptions, statuses, time.perf_counter() - started)
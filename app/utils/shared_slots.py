@@ -0,0 +1,48 @@
+import mmap
+import os
+import struct
+
+
+class SharedSlots:
+    """
+    fixed-size array of 8-byte values in an mmap'd file, shared by every process of the
+    host that maps the same path (the gunicorn workers, the CLI commands, the sweeper).
+
+    keys are spread over the slots by key % slots, so keys sharing a slot share its value:
+    users of it pick values for which a collision only costs extra work (e.g. a primary
+    read or a cache miss). values are read and written whole and unlocked, which is safe
+    for aligned 8-byte values; read-modify-write sequences are not atomic.
+    the file is mapped on first use, after gunicorn forked its workers
+    """
+    def __init__(self, path, slots, fmt="d"):
+        self.path = path
+        self.slots = slots
+        self._struct = struct.Struct(fmt)
+        self._map = None
+
+    def _mapped(self):
+        if self._map is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                size = self.slots * self._struct.size
+                if os.fstat(fd).st_size < size:
+                    os.ftruncate(fd, size)
+                self._map = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+        return self._map
+
+    def get(self, key):
+        return self._struct.unpack_from(self._mapped(), (key % self.slots) * self._struct.size)[0]
+
+    def set(self, key, value):
+        self._struct.pack_into(self._mapped(), (key % self.slots) * self._struct.size, value)
+
+    def fill(self, value_for_slot):
+        """
+        sets every slot to value_for_slot(slot)
+        """
+        mapped = self._mapped()
+        for slot in range(self.slots):
+            self._struct.pack_into(mapped, slot * self._struct.size, value_for_slot(slot))
@@ -0,0 +1,36 @@
+"""
+registry of the raw SQL statements the app executes, so that their query plans can be
+checked (see app/utils/query_plans.py and "flask explain-queries").
+
+statements are registered where they are defined, with sample bind values. statements
+whose text depends on the configuration (e.g. SUBSCRIPTION_STATUS_AUTHORITATIVE) are
+registered as a callable that builds them, and it runs in an app context.
+"""
+from collections import namedtuple
+
+RegisteredStatement = namedtuple("RegisteredStatement", ["name", "statement", "params", "allow"])
+
+_statements = {}
+
+
+def register_statement(name, statement, params=None, allow=()):
+    """
+    statement is an executable (e.g. a text() clause) or a callable returning one, params
+    the sample bind values (or a callable returning them). allow lists the findings that
+    are accepted for this statement by design: "scan" and/or "temp_btree"
+    """
+    _statements[name] = RegisteredStatement(name, statement, params or {}, frozenset(allow))
+    return statement
+
+
+def registered_statements():
+    return [_statements[name] for name in sorted(_statements)]
+
+
+def resolve(entry):
+    """
+    returns the (statement, params) of a registered entry, calling the factories
+    """
+    statement = entry.statement() if callable(entry.statement) else entry.statement
+    params = entry.params() if callable(entry.params) else entry.params
+    return statement, params
@@ -0,0 +1,63 @@
+"""
+cost of the admin analytics (active subscribers and MRR per plan, churn per day) read
+from the rollups by /api/analytics, against the same figures aggregated from the
+subscriptions table, per --users seeded users.
+
+    python -m benchmarks.bench_analytics --users 100000 --runs 20
+
+"scan/*" runs the backfill's queries (app/utils/rollups.py), which is what a dashboard
+aggregating the raw rows costs the database. "rollups/*" are full requests to the
+endpoints, authentication included. results are saved and compared like run_suite.py's.
+"""
+import argparse
+import sys
+import time
+from benchmarks.common import admin_headers, migrate_database, use_temp_database
+from benchmarks.results import DEFAULT_BASELINE, report, summarize
+
+use_temp_database("bench_analytics.db")
+
+from sqlalchemy import text  # noqa: E402
+from app import create_app  # noqa: E402
+from app.extensions import db, password_hasher  # noqa: E402
+from app.utils import rollups, seed_data  # noqa: E402
+
+
+def sample(runs, call):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples, sum(samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE.replace("baseline", "analytics-baseline"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative p95 slowdown")
+    args = parser.parse_args()
+
+    migrate_database()
+    app = create_app({"PASSWORD_HASH_WORKERS": 0})
+    with app.app_context():
+        seed_data.seed(args.users, workers=1, chunk_size=min(args.users, 20000), password_hash=password_hasher.hash("password"), random_seed=0)
+        subscriptions = db.session.execute(text("SELECT COUNT(*) FROM subscriptions")).scalar()
+    headers = admin_headers(app)
+    client = app.test_client()
+    results = {}
+    with app.app_context():
+        results["scan/plans"] = sample(args.runs, lambda: db.session.execute(text(rollups.expected_plans_query)).all())
+        results["scan/churn"] = sample(args.runs, lambda: db.session.execute(text(rollups.expected_days_query)).all())
+    for name in ("plans", "churn"):
+        assert client.get(f"/api/analytics/{name}", headers=headers).status_code == 200
+        results[f"rollups/{name}"] = sample(args.runs, lambda: client.get(f"/api/analytics/{name}", headers=headers))
+    print(f"{args.users} users, {subscriptions} subscriptions")
+    sys.exit(report("analytics", results, vars(args), args.baseline, args.save_baseline, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
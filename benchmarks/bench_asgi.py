@@ -0,0 +1,199 @@
+"""
+requests/sec and server memory of the read endpoints (GET /active, /history, /plans) with
+--connections concurrent keep-alive connections, for the gunicorn deployments the async
+serving mode would replace and for that mode (app/asgi.py under uvicorn):
+
+- "sync": gunicorn's sync workers, one request at a time per worker
+- "gthread": gunicorn with --threads threads per worker, gunicorn.conf.py's default
+- "asgi": uvicorn with the same number of workers
+
+    python -m benchmarks.bench_asgi --connections 1000 --seconds 20 --workers 2
+    python -m benchmarks.bench_asgi --modes asgi --response-cache-ttl 0
+
+gunicorn must be installed (it is in requirements.txt), there is no fallback server here.
+
+the clients are asyncio connections of this process, all opened before the clock starts,
+each sending its requests one after the other. the memory is the resident set of the
+server's whole process tree (supervisor and workers), sampled during the run: the peak is
+reported as rss_mb and scaled to rss_mb_per_1000. both modes use the same freshly seeded
+SQLite file. results are saved and compared like run_suite.py's.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from benchmarks import workload
+from benchmarks.common import free_port, migrate_database, start_asgi_server, start_server, use_temp_database
+from benchmarks.results import DEFAULT_BASELINE, report, summarize
+
+MIX = {"active": 0.6, "history": 0.3, "list_plans": 0.1}
+MODES = {
+    "sync": lambda port, env, args: start_server(port, env, args.workers, 1, fallback=False),
+    "gthread": lambda port, env, args: start_server(port, env, args.workers, args.threads, fallback=False),
+    "asgi": lambda port, env, args: start_asgi_server(port, env, args.workers),
+}
+
+
+def prepare(url, users, requests, seed):
+    from app import create_app
+    from app.extensions import password_hasher
+    from app.utils import seed_data
+
+    migrate_database(url)
+    app = create_app({"SQLALCHEMY_DATABASE_URI": url, "PASSWORD_HASH_WORKERS": 0})
+    with app.app_context():
+        seed_data.seed(users, workers=1, chunk_size=min(users, 20000), password_hash=password_hasher.hash("password"), random_seed=seed)
+        entries = workload.generate_mix(MIX, requests, seed=seed)
+        tokens = workload.Tokens().load(entries)
+    raw = []
+    for entry in entries:
+        method, url, headers, _ = workload.request_args(entry, tokens)
+        lines = [f"{method} {url} HTTP/1.1", "Host: 127.0.0.1"] + [f"{k}: {v}" for k, v in headers.items()]
+        raw.append(("\r\n".join(lines) + "\r\n\r\n").encode())
+    return raw
+
+
+def tree_rss_mb(pid):
+    """
+    resident set of pid and its descendants, in MB
+    """
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                total += next((int(line.split()[1]) for line in f if line.startswith("VmRSS:")), 0)
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+    return total / 1024
+
+
+async def read_response(reader):
+    """
+    reads one response, returns (status, whether the server closes the connection)
+    """
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+    headers = dict(line.lower().split(": ", 1) for line in lines[1:] if ": " in line)
+    if headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif status != 304:
+        await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, headers.get("connection") == "close" or lines[0].startswith("HTTP/1.0")
+
+
+async def load(port, raw, connections, seconds):
+    """
+    returns (latencies, errors, the wall time) of connections clients sending raw for seconds
+    """
+    latencies = []
+    errors = 0
+    opening = asyncio.Semaphore(64)
+    start = asyncio.Event()
+
+    async def connect():
+        async with opening:
+            return await asyncio.open_connection("127.0.0.1", port)
+
+    async def client(i, streams):
+        nonlocal errors
+        reader, writer = streams
+        await start.wait()
+        deadline = time.perf_counter() + seconds
+        index = i
+        try:
+            while time.perf_counter() < deadline:
+                request = raw[index % len(raw)]
+                index += connections
+                began = time.perf_counter()
+                writer.write(request)
+                await writer.drain()
+                status, close = await read_response(reader)
+                latencies.append(time.perf_counter() - began)
+                if status >= 400:
+                    errors += 1
+                if close:
+                    writer.close()
+                    reader, writer = await connect()
+        except (OSError, asyncio.IncompleteReadError):
+            errors += 1
+        finally:
+            writer.close()
+
+    streams = await asyncio.gather(*(connect() for _ in range(connections)), return_exceptions=True)
+    opened = [s for s in streams if not isinstance(s, BaseException)]
+    errors += len(streams) - len(opened)
+    tasks = [asyncio.create_task(client(i, s)) for i, s in enumerate(opened)]
+    began = time.perf_counter()
+    start.set()
+    await asyncio.gather(*tasks)
+    return latencies, errors, time.perf_counter() - began
+
+
+def run(mode, url, raw, args):
+    port = free_port()
+    env = {"DATABASE_URL": url, "RESPONSE_CACHE_TTL": str(args.response_cache_ttl)}
+    proc = MODES[mode](port, env, args)
+    peak = [tree_rss_mb(proc.pid)]
+    idle = peak[0]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(0.2):
+            peak[0] = max(peak[0], tree_rss_mb(proc.pid))
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        latencies, errors, seconds = asyncio.run(load(port, raw, args.connections, args.seconds))
+    finally:
+        done.set()
+        sampler.join()
+        proc.terminate()
+        proc.wait()
+    stats = summarize(latencies, seconds, errors)
+    stats["rss_mb"] = round(peak[0], 1)
+    stats["rss_mb_per_1000"] = round(peak[0] * 1000 / args.connections, 1)
+    print(f"{mode}: {idle:.1f} MB idle, {peak[0]:.1f} MB peak with {args.connections} connections")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--users", type=int, default=20000, help="seeded users")
+    parser.add_argument("--requests", type=int, default=20000, help="distinct requests, cycled through")
+    parser.add_argument("--workers", type=int, default=2, help="server worker processes")
+    parser.add_argument("--threads", type=int, default=4, help="threads per worker of the gthread mode")
+    parser.add_argument("--response-cache-ttl", type=float, default=60, help="RESPONSE_CACHE_TTL, 0 makes every read query")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE.replace("baseline", "asgi-baseline"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative p95 slowdown")
+    args = parser.parse_args()
+
+    url = f"sqlite:///{use_temp_database('bench_asgi.db')}"
+    raw = prepare(url, args.users, args.requests, args.seed)
+    results = {}
+    for mode in args.modes.split(","):
+        if mode not in MODES:
+            parser.error(f"unknown mode {mode}")
+        results[f"{mode}/reads"] = run(mode, url, raw, args)
+    sys.exit(report("asgi", results, vars(args), args.baseline, args.save_baseline, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
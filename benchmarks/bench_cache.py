@@ -0,0 +1,124 @@
+"""
+get/set latency of the cache backends (app/utils/cache) with several processes using the
+same cache at once, as gunicorn workers would.
+
+    python -m benchmarks.bench_cache --processes 4 --ops 20000 --keys 5000
+    python -m benchmarks.bench_cache --backends shared,tiered-shared --delete-share 0.1
+
+every process uses the cache like the principal cache does, on keys drawn from --keys
+principal-like values: a get, and a set with a TTL when it missed (cache-aside), or a
+delete (an invalidation) for --delete-share of the operations. "memory" gives each process its own LRU (the baseline, nothing is shared), "shared" maps
+one file, "network" talks to the fake network store served from another process, and
+the "tiered-" variants put the per-process near cache in front. hit rates are printed
+with the table, results are saved and compared like run_suite.py's.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from benchmarks.results import DEFAULT_BASELINE, report, summarize
+
+BACKENDS = ["memory", "shared", "tiered-shared", "network", "tiered-network"]
+
+
+def worker(url, near_entries, ops, keys, delete_share, seed, start, queue):
+    from app.utils.cache import create_backend
+    from app.utils.principal_cache import Principal
+
+    # one namespace per run, the fake network store outlives them
+    backend = create_backend(url, namespace=f"bench-{url}-{near_entries}", near_entries=near_entries)
+    rng = random.Random(seed)
+    samples = {"get": [], "set": [], "delete": []}
+    hits = 0
+    start.wait()
+    for _ in range(ops):
+        key = str(rng.randrange(keys))
+        began = time.perf_counter()
+        if rng.random() < delete_share:
+            backend.delete(key)
+            samples["delete"].append(time.perf_counter() - began)
+            continue
+        value = backend.get(key)
+        samples["get"].append(time.perf_counter() - began)
+        if value is not None:
+            hits += 1
+            continue
+        began = time.perf_counter()
+        backend.set(key, Principal(int(key), False, 0), ttl=30)
+        samples["set"].append(time.perf_counter() - began)
+    queue.put((samples, hits))
+
+
+def run(url, near_entries, args):
+    context = multiprocessing.get_context("fork")
+    start = context.Barrier(args.processes + 1)
+    queue = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(url, near_entries, args.ops, args.keys, args.delete_share, args.seed + i, start, queue))
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    start.wait()
+    began = time.perf_counter()
+    outcomes = [queue.get() for _ in processes]
+    seconds = time.perf_counter() - began
+    for process in processes:
+        process.join()
+    merged = {}
+    for samples, _ in outcomes:
+        for op, latencies in samples.items():
+            merged.setdefault(op, []).extend(latencies)
+    gets = len(merged["get"])
+    hit_rate = sum(hits for _, hits in outcomes) / gets if gets else 0.0
+    return merged, seconds, hit_rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--ops", type=int, default=20000, help="operations per process")
+    parser.add_argument("--keys", type=int, default=5000)
+    parser.add_argument("--delete-share", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE.replace("baseline", "cache-baseline"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative p95 slowdown")
+    args = parser.parse_args()
+
+    from app.utils.cache.fake import start_fake_server
+
+    manager = None
+    results = {}
+    hit_rates = {}
+    try:
+        for name in args.backends.split(","):
+            near_entries = 10000 if name.startswith("tiered-") else 0
+            kind = name.removeprefix("tiered-")
+            if kind == "memory":
+                url = "memory"
+            elif kind == "shared":
+                url = f"shared://{os.path.join(tempfile.mkdtemp(prefix='clue-bench-'), 'cache')}"
+            elif kind == "network":
+                if manager is None:
+                    manager, fake_url = start_fake_server()
+                url = fake_url
+            else:
+                parser.error(f"unknown backend {name}")
+            samples, seconds, hit_rates[name] = run(url, near_entries, args)
+            for op, latencies in samples.items():
+                results[f"{name}/{op}"] = summarize(latencies, seconds)
+    finally:
+        if manager is not None:
+            manager.shutdown()
+    for name, hit_rate in hit_rates.items():
+        print(f"{name}: {hit_rate:.1%} of gets hit")
+    sys.exit(report("cache", results, vars(args), args.baseline, args.save_baseline, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
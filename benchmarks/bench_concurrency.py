@@ -0,0 +1,89 @@
+"""
+mixed read/write throughput under each engine profile (DB_ENGINE_PROFILE, see
+app/utils/engine_profiles.py), replayed over HTTP by concurrent clients.
+
+    python -m benchmarks.bench_concurrency --users 20000 --requests 5000 --concurrency 16
+    python -m benchmarks.bench_concurrency --write-share 0.5 --profiles stock,web
+
+every profile gets its own freshly seeded SQLite database, as the journal mode is a
+property of the database file. the reads are GET /active, /history and /plans, the
+writes POST /subscribe, /change-plan and /cancel. the server is gunicorn when it is
+installed (several worker processes contending for the database), otherwise werkzeug's
+threaded server. results are saved and compared like run_suite.py's.
+"""
+import argparse
+import os
+import sys
+from benchmarks import workload
+from benchmarks.common import free_port, migrate_database, start_server, use_temp_database
+from benchmarks.replay import replay
+from benchmarks.results import DEFAULT_BASELINE, report, summarize
+
+READS = {"active": 6, "history": 3, "list_plans": 1}
+WRITES = {"subscribe": 4, "change_plan": 3, "cancel": 3}
+WRITE_PATHS = ("/api/subscriptions/subscribe", "/api/subscriptions/change-plan", "/api/subscriptions/cancel")
+
+
+def prepare(url, users, mix, requests, seed):
+    """
+    migrates and seeds the database at url, returns the entries to replay and their tokens
+    """
+    from app import create_app
+    from app.extensions import password_hasher
+    from app.utils import seed_data
+
+    migrate_database(url)
+    app = create_app({"SQLALCHEMY_DATABASE_URI": url, "PASSWORD_HASH_WORKERS": 0})
+    with app.app_context():
+        seed_data.seed(users, workers=1, chunk_size=min(users, 20000), password_hash=password_hasher.hash("password"), random_seed=seed)
+        entries = workload.generate_mix(mix, requests, seed=seed)
+        tokens = workload.Tokens().load(entries)
+    return entries, tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", default="stock,web")
+    parser.add_argument("--users", type=int, default=20000, help="seeded users per database")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--write-share", type=float, default=0.3, help="share of the requests that write")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=4, help="gunicorn threads per worker")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE.replace("baseline", "concurrency-baseline"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative p95 slowdown")
+    args = parser.parse_args()
+
+    reads = sum(READS.values())
+    writes = sum(WRITES.values())
+    mix = {name: (1 - args.write_share) * weight / reads for name, weight in READS.items()}
+    mix.update({name: args.write_share * weight / writes for name, weight in WRITES.items()})
+
+    results = {}
+    for profile in args.profiles.split(","):
+        use_temp_database(f"bench_concurrency_{profile}.db")
+        url = os.environ["DATABASE_URL"]
+        entries, tokens = prepare(url, args.users, mix, args.requests, args.seed)
+        port = free_port()
+        proc = start_server(port, {"DATABASE_URL": url, "DB_ENGINE_PROFILE": profile}, args.workers, args.threads)
+        try:
+            by_route, seconds = replay(entries, tokens, f"http://127.0.0.1:{port}", args.concurrency, "password")
+        finally:
+            proc.terminate()
+            proc.wait()
+        groups = {"reads": ([], 0), "writes": ([], 0)}
+        for key, (latencies, errors) in by_route.items():
+            group = "writes" if key.split(" ", 1)[1] in WRITE_PATHS else "reads"
+            samples, failed = groups[group]
+            groups[group] = (samples + latencies, failed + errors)
+        for group, (samples, errors) in groups.items():
+            results[f"{profile}/{group}"] = summarize(samples, seconds, errors)
+        everything = groups["reads"][0] + groups["writes"][0]
+        results[f"{profile}/total"] = summarize(everything, seconds, groups["reads"][1] + groups["writes"][1])
+    sys.exit(report("concurrency", results, vars(args), args.baseline, args.save_baseline, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
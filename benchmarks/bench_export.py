@@ -0,0 +1,84 @@
+"""
+memory/latency benchmark of GET /api/subscriptions/active/all, comparing the buffered
+JSON response with the two streaming export formats.
+
+    python -m benchmarks.bench_export --sizes 10000,100000,1000000
+
+peak memory is the Python heap peak (tracemalloc) while the response is produced and
+consumed, time to first byte is measured up to the first chunk the client receives.
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from benchmarks.common import admin_headers, migrate_database, use_temp_database
+
+use_temp_database("bench_export.db")
+
+from sqlalchemy import insert  # noqa: E402
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.models import Subscription, SubscriptionPlan, User  # noqa: E402
+
+FORMATS = ["json", "json-stream", "ndjson"]
+
+
+def grow_to(app, size, batch=20000):
+    with app.app_context():
+        if not db.session.query(SubscriptionPlan).first():
+            db.session.add(SubscriptionPlan(name="Bench", description="Bench plan", price_cents=1000))
+            db.session.commit()
+        plan_id = db.session.query(SubscriptionPlan.id).scalar()
+        start = db.session.query(Subscription).count()
+        now = datetime.now()
+        for offset in range(start, size, batch):
+            ids = range(offset, min(offset + batch, size))
+            result = db.session.execute(insert(User).returning(User.id), [
+                {"email": f"bench{i}@example.com", "password": "x"} for i in ids
+            ])
+            db.session.execute(insert(Subscription), [
+                {"user_id": uid, "plan_id": plan_id, "status": "active",
+                 "starts_at": now, "ends_at": now + timedelta(days=30)}
+                for uid in result.scalars()
+            ])
+            db.session.commit()
+
+
+def measure(client, headers, export_format):
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = client.get(f"/api/subscriptions/active/all?format={export_format}", headers=headers, buffered=False)
+    first_byte = None
+    size = 0
+    for chunk in response.response:
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+    response.close()
+    total = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return first_byte or total, total, peak, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    args = parser.parse_args()
+
+    migrate_database()
+    app = create_app()
+    headers = admin_headers(app)
+    client = app.test_client()
+
+    print(f"{'rows':>9} {'format':<12} {'ttfb ms':>9} {'total ms':>9} {'peak MiB':>9} {'body MiB':>9}")
+    for size in sorted(int(s) for s in args.sizes.split(",")):
+        grow_to(app, size)
+        for export_format in FORMATS:
+            ttfb, total, peak, body = measure(client, headers, export_format)
+            print(f"{size:>9} {export_format:<12} {ttfb * 1000:>9.1f} {total * 1000:>9.1f} "
+                  f"{peak / 2**20:>9.1f} {body / 2**20:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+cost of a client retry storm on POST /api/subscriptions/subscribe: --users users each send
+the request and then --retries retries of it, without and with an Idempotency-Key.
+
+    python -m benchmarks.bench_idempotency --users 200 --retries 10
+
+"plain/*" retries run the write again (cancel UPDATE, INSERT, projection and rollups),
+"keyed/*" retries are answered with the stored response. "*/first" is the first request,
+"*/retry" a retry. results are saved and compared like run_suite.py's.
+"""
+import argparse
+import sys
+import time
+from benchmarks.common import migrate_database, use_temp_database
+from benchmarks.results import DEFAULT_BASELINE, report, summarize
+
+use_temp_database("bench_idempotency.db")
+
+from sqlalchemy import event, func, select  # noqa: E402
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.models import Subscription, SubscriptionPlan, User  # noqa: E402
+from app.utils.auth_utils import AuthUtils  # noqa: E402
+
+
+def storm(client, users, retries, keyed, counter):
+    first, retry, statements = [], [], []
+    for index, headers in enumerate(users):
+        if keyed:
+            headers = {**headers, "Idempotency-Key": f"subscribe-{index}"}
+        for attempt in range(retries + 1):
+            counter.clear()
+            started = time.perf_counter()
+            r = client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers=headers)
+            (retry if attempt else first).append(time.perf_counter() - started)
+            assert r.status_code == 200, r.get_data(as_text=True)
+            if attempt:
+                statements.append(len(counter))
+    return first, retry, statements
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--retries", type=int, default=10)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE.replace("baseline", "idempotency-baseline"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative p95 slowdown")
+    args = parser.parse_args()
+
+    migrate_database()
+    app = create_app({"PASSWORD_HASH_WORKERS": 0})
+    results = {}
+    with app.app_context():
+        db.session.add(SubscriptionPlan(name="Basic", description="Basic plan", price_cents=1000))
+        counter = []
+        event.listen(db.engine, "before_cursor_execute", lambda *call: counter.append(call[2]))
+        client = app.test_client()
+        for mode in ("plain", "keyed"):
+            users = [User(email=f"{mode}{i}@example.com", password="x") for i in range(args.users)]
+            db.session.add_all(users)
+            db.session.commit()
+            headers = [{"Authorization": f"Bearer {AuthUtils.generate_token(user.id)}"} for user in users]
+            before = db.session.execute(select(func.count()).select_from(Subscription)).scalar()
+            db.session.remove()
+            started = time.perf_counter()
+            first, retry, statements = storm(client, headers, args.retries, mode == "keyed", counter)
+            elapsed = time.perf_counter() - started
+            rows = db.session.execute(select(func.count()).select_from(Subscription)).scalar() - before
+            db.session.remove()
+            results[f"{mode}/first"] = summarize(first, sum(first))
+            results[f"{mode}/retry"] = summarize(retry, sum(retry), statements=statements)
+            print(f"{mode}: {rows} subscription rows for {args.users} users in {elapsed:.2f}s")
+    sys.exit(report("idempotency", results, vars(args), args.baseline, args.save_baseline, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
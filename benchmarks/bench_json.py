@@ -0,0 +1,76 @@
+"""
+serialization cost of the row lists of /active/all and /history, per --rows rows, under
+each JSON provider (see app/utils/json_provider.py).
+
+    python -m benchmarks.bench_json --rows 10000 --runs 20
+
+the rows come from the /active/all query on a seeded SQLite file, with starts_at and
+ends_at typed as DATETIME so that they are datetime objects, as MySQL returns them
+(SQLite's raw text() results would hand over strings). "jsonify" is the code path before
+JSON_PROVIDER: dict() of every RowMapping and Flask's provider. the other entries build
+the dicts with row_dicts() and serialize with the named provider; "orjson/mappings"
+isolates the provider's share. every sample is one make_response() of the whole list,
+body included. results are saved and compared like run_suite.py's.
+"""
+import argparse
+import sys
+import time
+from benchmarks.common import migrate_database, use_temp_database
+from benchmarks.results import DEFAULT_BASELINE, report, summarize
+
+use_temp_database("bench_json.db")
+
+from sqlalchemy import DateTime, text  # noqa: E402
+from app import create_app  # noqa: E402
+from app.extensions import db, password_hasher  # noqa: E402
+from app.routes.subscriptions import all_active_query  # noqa: E402
+from app.utils import seed_data  # noqa: E402
+from app.utils.json_provider import init_json_provider  # noqa: E402
+from app.utils.response import make_response, row_dicts  # noqa: E402
+
+VARIANTS = {
+    # name: (JSON_PROVIDER, rows as mappings)
+    "jsonify": ("flask", True),
+    "iso/row_dicts": ("iso", False),
+    "orjson/mappings": ("orjson", True),
+    "orjson/row_dicts": ("orjson", False),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE.replace("baseline", "json-baseline"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative p95 slowdown")
+    args = parser.parse_args()
+
+    migrate_database()
+    app = create_app({"PASSWORD_HASH_WORKERS": 0, "SUBSCRIPTION_STATUS_AUTHORITATIVE": True})
+    results = {}
+    with app.app_context():
+        # every seeded user has an active subscription, so --rows users give --rows rows
+        seed_data.seed(args.rows, workers=1, chunk_size=min(args.rows, 20000), active_ratio=1.0,
+                       lapsed_ratio=0.0, password_hash=password_hasher.hash("password"), random_seed=0)
+        query = text(all_active_query()).columns(starts_at=DateTime, ends_at=DateTime)
+        rows = db.session.execute(query).fetchall()[:args.rows]
+        mappings = [row._mapping for row in rows]
+        with app.test_request_context():
+            for name, (provider, use_mappings) in VARIANTS.items():
+                app.config["JSON_PROVIDER"] = provider
+                init_json_provider(app)
+                samples = []
+                for _ in range(args.runs):
+                    started = time.perf_counter()
+                    data = [dict(row) for row in mappings] if use_mappings else row_dicts(rows)
+                    response, _ = make_response(message="All active subscriptions fetched successfully", data=data)
+                    response.get_data()
+                    samples.append(time.perf_counter() - started)
+                results[name] = summarize(samples, sum(samples))
+    print(f"{len(rows)} rows per sample")
+    sys.exit(report("json", results, vars(args), args.baseline, args.save_baseline, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
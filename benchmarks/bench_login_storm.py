@@ -0,0 +1,114 @@
+"""
+latency of GET /api/subscriptions/active while a login storm is running, with password
+hashing on the request thread (PASSWORD_HASH_WORKERS=0) and on the process pool.
+
+    python -m benchmarks.bench_login_storm --duration 10 --storm 16 --readers 4
+
+the app runs in a separate server process: gunicorn (with gunicorn.conf.py) when it is
+installed, otherwise werkzeug's threaded development server. every scenario first measures
+the readers alone, then with the storm threads posting logins as fast as they are answered.
+"""
+import argparse
+import http.client
+import json
+import os
+import threading
+import time
+from benchmarks.common import free_port, migrate_database, percentile, start_server, use_temp_database
+
+PASSWORD = "bench-password"
+
+
+def seed(env):
+    """
+    creates the schema, the storm user and a reader, returns the reader's token
+    """
+    os.environ.update(env)
+    from app import create_app
+    from app.extensions import db
+    from app.models import User
+    from app.utils.auth_utils import AuthUtils
+
+    migrate_database()
+    app = create_app({"PASSWORD_HASH_WORKERS": 0})
+    with app.app_context():
+        users = []
+        for email in ("storm@example.com", "reader@example.com"):
+            user = User(email=email)
+            user.set_password(PASSWORD)
+            users.append(user)
+        db.session.add_all(users)
+        db.session.commit()
+        return AuthUtils.generate_token(users[1].id, token_version=users[1].token_version)
+
+
+def request(conn, method, path, body=None, headers=None):
+    conn.request(method, path, body=body, headers=headers or {})
+    response = conn.getresponse()
+    response.read()
+    return response.status
+
+
+def reader(port, token, stop, samples):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    headers = {"Authorization": f"Bearer {token}"}
+    while not stop.is_set():
+        started = time.perf_counter()
+        request(conn, "GET", "/api/subscriptions/active", headers=headers)
+        samples.append(time.perf_counter() - started)
+
+
+def stormer(port, stop, statuses):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    body = json.dumps({"email": "storm@example.com", "password": PASSWORD})
+    headers = {"Content-Type": "application/json"}
+    while not stop.is_set():
+        statuses.append(request(conn, "POST", "/api/login", body=body, headers=headers))
+
+
+def run_load(port, token, readers, storm, duration):
+    stop = threading.Event()
+    samples, statuses = [], []
+    threads = [threading.Thread(target=reader, args=(port, token, stop, samples)) for _ in range(readers)]
+    threads += [threading.Thread(target=stormer, args=(port, stop, statuses)) for _ in range(storm)]
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    return samples, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--storm", type=int, default=16, help="threads posting logins")
+    parser.add_argument("--readers", type=int, default=4, help="threads reading /active")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=4, help="gunicorn threads per worker")
+    parser.add_argument("--hash-workers", type=int, default=2, help="hashing processes per web worker")
+    args = parser.parse_args()
+
+    use_temp_database("bench_login_storm.db")
+    env = {"DATABASE_URL": os.environ["DATABASE_URL"]}
+    token = seed(env)
+    scenarios = [("inline", 0), ("pool", args.hash_workers)]
+
+    print(f"{'hashing':<8} {'storm':>6} {'reads':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'logins':>7} {'shed':>6}")
+    for name, hash_workers in scenarios:
+        port = free_port()
+        proc = start_server(port, {**env, "PASSWORD_HASH_WORKERS": str(hash_workers)}, args.workers, args.threads)
+        try:
+            for storm in (0, args.storm):
+                samples, statuses = run_load(port, token, args.readers, storm, args.duration)
+                print(f"{name:<8} {storm:>6} {len(samples):>7} "
+                      f"{percentile(samples, 50) * 1000:>8.1f} {percentile(samples, 95) * 1000:>8.1f} "
+                      f"{percentile(samples, 99) * 1000:>8.1f} {statuses.count(200):>7} {statuses.count(503):>6}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
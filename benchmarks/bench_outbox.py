@@ -0,0 +1,93 @@
+"""
+throughput of the outbox dispatcher, against the /active/all polling it replaces for the
+downstream systems, with --users seeded users and --events pending outbox events.
+
+    python -m benchmarks.bench_outbox --users 20000 --events 50000 --batch-size 500
+
+"poll/active-all" is one poll of GET /api/subscriptions/active/all, which a consumer had to
+repeat to notice changes. "dispatch/<sink>" is one batch delivered to the memory or file
+sink (app/utils/outbox_sinks.py), checkpoint included. results are saved and compared like
+run_suite.py's.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from benchmarks.common import admin_headers, migrate_database, use_temp_database
+from benchmarks.results import DEFAULT_BASELINE, report, summarize
+
+use_temp_database("bench_outbox.db")
+
+from datetime import datetime  # noqa: E402
+from sqlalchemy import delete, insert  # noqa: E402
+from app import create_app  # noqa: E402
+from app.extensions import db, outbox_dispatcher, password_hasher  # noqa: E402
+from app.models import OutboxCheckpoint, OutboxEvent  # noqa: E402
+from app.utils import outbox, seed_data  # noqa: E402
+from app.utils.outbox_sinks import create_sink  # noqa: E402
+
+
+def fill_outbox(count):
+    now = datetime.now()
+    rows = [
+        outbox._row("subscription.plan_changed", i % 1000 + 1, i + 1, {"plan_id": 1, "plan_name": "Basic", "price_cents": 1000}, now)
+        for i in range(count)
+    ]
+    for start in range(0, count, 5000):
+        db.session.execute(insert(OutboxEvent), rows[start:start + 5000])
+    db.session.commit()
+
+
+def drain(sink):
+    db.session.execute(delete(OutboxCheckpoint))
+    db.session.commit()
+    outbox_dispatcher.sink = sink
+    latencies, delivered = [], 0
+    started = time.perf_counter()
+    while True:
+        batch_started = time.perf_counter()
+        batch = outbox_dispatcher.dispatch_batch()
+        if not batch.delivered:
+            break
+        latencies.append(time.perf_counter() - batch_started)
+        delivered += batch.delivered
+    return latencies, delivered, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--events", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE.replace("baseline", "outbox-baseline"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative p95 slowdown")
+    args = parser.parse_args()
+
+    migrate_database()
+    app = create_app({"PASSWORD_HASH_WORKERS": 0, "OUTBOX_BATCH_SIZE": args.batch_size, "RESPONSE_CACHE_TTL": 0})
+    headers = admin_headers(app)
+    client = app.test_client()
+    results = {}
+    with app.app_context():
+        seed_data.seed(args.users, workers=1, chunk_size=min(args.users, 20000), password_hash=password_hasher.hash("password"), random_seed=0)
+        polls = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            assert client.get("/api/subscriptions/active/all", headers=headers).status_code == 200
+            polls.append(time.perf_counter() - started)
+        results["poll/active-all"] = summarize(polls, sum(polls))
+
+        fill_outbox(args.events)
+        path = os.path.join(tempfile.mkdtemp(prefix="clue-bench-"), "events.jsonl")
+        for name, url in (("memory", "memory://"), ("file", f"file://{path}")):
+            latencies, delivered, seconds = drain(create_sink(url))
+            results[f"dispatch/{name}"] = summarize(latencies, seconds)
+            print(f"{name}: {delivered} events in {seconds:.2f}s ({delivered / seconds:.0f} events/s)")
+    sys.exit(report("outbox", results, vars(args), args.baseline, args.save_baseline, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+cold start of a web worker: the time from importing the app to its first response,
+measured in fresh interpreters so that nothing is imported or connected yet.
+
+    python -m benchmarks.bench_startup --runs 20 --save-baseline   # record the reference run
+    python -m benchmarks.bench_startup --runs 20                   # compare against it
+    python -m benchmarks.bench_startup --create-all                # also time workers running db.create_all()
+
+every run reports the import of the app package, create_app(), the first request
+(GET /api/subscriptions/plans through the test client, which opens the first database
+connection and loads the plan catalog), the total from import to first response and the
+whole process including the interpreter's own startup. the database is a migrated SQLite
+file unless --database-url is given. results are saved and compared like run_suite.py's.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from benchmarks.common import migrate_database, use_temp_database
+from benchmarks.results import DEFAULT_BASELINE, report, summarize
+
+PHASES = ("import", "create_app", "first_response", "total", "process")
+
+
+def child(create_all):
+    started = time.perf_counter()
+    from app import create_app
+
+    imported = time.perf_counter()
+    app = create_app()
+    if create_all:
+        from app.extensions import db
+
+        with app.app_context():
+            db.create_all()
+    created = time.perf_counter()
+    response = app.test_client().get("/api/subscriptions/plans")
+    answered = time.perf_counter()
+    if response.status_code != 200:
+        raise SystemExit(f"first request failed with status {response.status_code}")
+    print(json.dumps({
+        "import": imported - started,
+        "create_app": created - imported,
+        "first_response": answered - created,
+        "total": answered - started,
+    }))
+
+
+def measure(runs, env, create_all):
+    """
+    {phase: [seconds per run]}
+    """
+    samples = {phase: [] for phase in PHASES}
+    cmd = [sys.executable, "-m", "benchmarks.bench_startup", "--child"] + (["--create-all"] if create_all else [])
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run(cmd, env=env, capture_output=True, text=True, check=True)
+        samples["process"].append(time.perf_counter() - started)
+        for phase, seconds in json.loads(result.stdout.splitlines()[-1]).items():
+            samples[phase].append(seconds)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--database-url", help="an already migrated database, default a fresh SQLite file")
+    parser.add_argument("--create-all", action="store_true", help="also measure workers that run db.create_all() at boot")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE.replace("baseline", "startup-baseline"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative p95 slowdown")
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args.create_all)
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        use_temp_database("bench_startup.db")
+    migrate_database()
+    env = dict(os.environ, PASSWORD_HASH_WORKERS="0")
+
+    results = {}
+    scenarios = [("boot", False)] + ([("boot+create_all", True)] if args.create_all else [])
+    for name, create_all in scenarios:
+        measure(1, env, create_all)  # warms the OS file cache and writes the bytecode
+        for phase, samples in measure(args.runs, env, create_all).items():
+            results[f"{name}/{phase}"] = summarize(samples, 0)
+    sys.exit(report("startup", results, vars(args), args.baseline, args.save_baseline, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+helpers shared by the benchmark scripts, run them from the repo root as modules
+(e.g. python -m benchmarks.bench_export)
+"""
+import os
+import tempfile
+
+
+def use_temp_database(name="bench.db"):
+    """
+    points DATABASE_URL at a fresh SQLite file, must run before the app package is imported
+    """
+    path = os.path.join(tempfile.mkdtemp(prefix="clue-bench-"), name)
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    return path
+
+
+def migrate_database(url=None):
+    """
+    brings the database at url (default DATABASE_URL) to the latest schema, as
+    "flask db upgrade" does at deploy time, the app itself does not create tables
+    """
+    from sqlalchemy import create_engine
+    from app.utils import migrations
+
+    engine = create_engine(url or os.environ["DATABASE_URL"])
+    migrations.upgrade(engine)
+    engine.dispose()
+
+
+def admin_headers(app):
+    from app.extensions import db
+    from app.models import User
+    from app.utils.auth_utils import AuthUtils
+
+    with app.app_context():
+        admin = db.session.query(User).filter_by(email="bench-admin@example.com").first()
+        if not admin:
+            admin = User(email="bench-admin@example.com", password="x", is_admin=True)
+            db.session.add(admin)
+            db.session.commit()
+        token = AuthUtils.generate_token(admin.id, is_admin=True, token_version=admin.token_version)
+    return {"Authorization": f"Bearer {token}"}
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, round(pct / 100 * len(samples)) - 1))
+    return samples[index]
+
+
+def free_port():
+    import socket
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, env=None, workers=2, threads=4, fallback=True):
+    """
+    starts the app on 127.0.0.1:port in a separate process and waits until it accepts
+    connections: gunicorn (with gunicorn.conf.py, sync workers when threads is 1) when it is
+    installed, otherwise werkzeug's threaded server (benchmarks/serve.py), unless fallback is
+    False. returns the process, terminate() stops it
+    """
+    import shutil
+    import sys
+
+    if shutil.which("gunicorn"):
+        cmd = ["gunicorn", "-w", str(workers), "--threads", str(threads),
+               "-b", f"127.0.0.1:{port}", "app:create_app()"]
+    elif fallback:
+        cmd = [sys.executable, "-m", "benchmarks.serve", str(port)]
+    else:
+        raise RuntimeError("gunicorn is not installed, pip install -r requirements.txt")
+    return _wait_until_listening(cmd, port, env)
+
+
+def start_asgi_server(port, env=None, workers=2):
+    """
+    starts the async serving mode (app/asgi.py) under uvicorn, like start_server
+    """
+    import sys
+
+    cmd = [sys.executable, "-m", "uvicorn", "--factory", "app.asgi:create_asgi_app", "--workers", str(workers),
+           "--host", "127.0.0.1", "--port", str(port), "--no-access-log", "--log-level", "warning"]
+    return _wait_until_listening(cmd, port, env)
+
+
+def _wait_until_listening(cmd, port, env):
+    import socket
+    import subprocess
+    import time
+
+    proc = subprocess.Popen(cmd, env={**os.environ, **(env or {})}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with status {proc.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("server did not start")
@@ -0,0 +1,47 @@
+"""
+generates a JSONL request log for benchmarks/replay.py from the routes of
+benchmarks/workload.py, for when no recorded log (REQUEST_LOG_PATH) is at hand.
+
+    python -m benchmarks.make_request_log --database-url sqlite:////tmp/seeded.db --requests 20000 --out requests.log
+    python -m benchmarks.make_request_log ... --mix active=80,history=15,subscribe=5
+
+the database has to be seeded ("flask seed"), the entries refer to its users and plans.
+"""
+import argparse
+import json
+import os
+from benchmarks import workload
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in workload.ROUTES:
+            raise argparse.ArgumentTypeError(f"unknown route {name}, known: {', '.join(workload.ROUTES)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL"), required="DATABASE_URL" not in os.environ)
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--mix", type=parse_mix, default=workload.DEFAULT_MIX, help="route=weight,...")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    from app import create_app
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": args.database_url})
+    with app.app_context():
+        entries = workload.generate_mix(args.mix, args.requests, seed=args.seed)
+    with open(args.out, "w") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+    print(f"wrote {len(entries)} requests to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+replays a JSONL request log (the format written by REQUEST_LOG_PATH, or generated by
+benchmarks/make_request_log.py) over HTTP and reports p50/p95/p99 and throughput per route.
+
+    python -m benchmarks.replay requests.log --database-url sqlite:////tmp/seeded.db --concurrency 16
+    python -m benchmarks.replay requests.log --url http://127.0.0.1:8000 --database-url ...
+
+without --url the app is started locally against --database-url (gunicorn when installed,
+see benchmarks/common.py). the database is also used to mint a token for every user_id of
+the log, with the app's JWT_SECRET, so it has to hold the users the log refers to (e.g.
+seeded with "flask seed"). redacted passwords are replaced by --password.
+
+--concurrency clients replay the log in order, each taking the next entry as soon as its
+previous request is answered. results are saved and compared like run_suite.py's.
+"""
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+from benchmarks import workload
+from benchmarks.common import free_port, start_server
+from benchmarks.results import DEFAULT_BASELINE, report, summarize
+
+
+def read_log(path, limit=None):
+    entries = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+                if limit and len(entries) >= limit:
+                    break
+    return entries
+
+
+def replay(entries, tokens, base_url, concurrency, password):
+    """
+    returns {"METHOD path": (latencies, errors)} and the wall time of the replay
+    """
+    target = urlsplit(base_url)
+    position = iter(range(len(entries)))
+    lock = threading.Lock()
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+
+    def client():
+        conn = http.client.HTTPConnection(target.hostname, target.port)
+        while True:
+            with lock:
+                index = next(position, None)
+            if index is None:
+                return
+            entry = entries[index]
+            method, url, headers, body = workload.request_args(entry, tokens, password)
+            payload = None
+            if body is not None:
+                payload = json.dumps(body)
+                headers = {**headers, "Content-Type": "application/json"}
+            started = time.perf_counter()
+            try:
+                conn.request(method, url, body=payload, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(target.hostname, target.port)
+                status = 599
+            elapsed = time.perf_counter() - started
+            key = f"{entry['method']} {entry['path']}"
+            with lock:
+                latencies[key].append(elapsed)
+                errors[key] += status >= 500
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {key: (latencies[key], errors[key]) for key in latencies}, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="JSONL request log")
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL"), required="DATABASE_URL" not in os.environ)
+    parser.add_argument("--url", help="replay against this running server instead of starting one")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers of the local server")
+    parser.add_argument("--threads", type=int, default=4, help="gunicorn threads per worker")
+    parser.add_argument("--limit", type=int, help="replay only the first entries of the log")
+    parser.add_argument("--password", default="password", help="password of the logins and registrations")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE.replace("baseline", "replay-baseline"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative p95 slowdown")
+    args = parser.parse_args()
+
+    from app import create_app
+
+    entries = read_log(args.log, args.limit)
+    app = create_app({"SQLALCHEMY_DATABASE_URI": args.database_url})
+    with app.app_context():
+        tokens = workload.Tokens().load(entries)
+
+    proc = None
+    base_url = args.url
+    if not base_url:
+        port = free_port()
+        proc = start_server(port, {"DATABASE_URL": args.database_url}, args.workers, args.threads)
+        base_url = f"http://127.0.0.1:{port}"
+    try:
+        by_route, seconds = replay(entries, tokens, base_url, args.concurrency, args.password)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    results = {key: summarize(latencies, seconds, errors) for key, (latencies, errors) in sorted(by_route.items())}
+    everything = [latency for latencies, _ in by_route.values() for latency in latencies]
+    results["total"] = summarize(everything, seconds, sum(errors for _, errors in by_route.values()))
+    sys.exit(report("replay", results, vars(args), args.baseline, args.save_baseline, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+saving benchmark results and comparing them with a baseline.
+
+a results file is {"meta": {...}, "results": {key: stats}}, where stats holds requests,
+errors, p50_ms, p95_ms, p99_ms, rps and, for in-process runs, the statement count per
+request. files go to benchmarks/results/ (ignored by git, baselines are per machine).
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+from benchmarks.common import percentile
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+DEFAULT_BASELINE = os.path.join(RESULTS_DIR, "baseline.json")
+
+
+def summarize(latencies, seconds, errors=0, statements=None):
+    """
+    stats of one route from its latencies (seconds) and the wall time they took
+    """
+    stats = {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "rps": round(len(latencies) / seconds, 1) if seconds else 0.0,
+    }
+    if statements:
+        stats["statements"] = max(statements)
+    return stats
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save(kind, results, args, path=None):
+    """
+    writes the results with the run's settings, returns the file path
+    """
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = path or os.path.join(RESULTS_DIR, f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    document = {
+        "meta": {
+            "kind": kind,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "args": args,
+        },
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+    return path
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results, baseline, threshold=0.2, noise_ms=1.0):
+    """
+    lists the regressions of results against baseline results: a p95 more than threshold
+    (relative) and noise_ms (absolute) slower, or more statements per request, which is
+    deterministic and compared exactly
+    """
+    regressions = []
+    for key, stats in sorted(results.items()):
+        base = baseline.get(key)
+        if not base:
+            continue
+        if stats["p95_ms"] > base["p95_ms"] * (1 + threshold) and stats["p95_ms"] - base["p95_ms"] > noise_ms:
+            regressions.append(f"{key}: p95 {base['p95_ms']:.2f}ms -> {stats['p95_ms']:.2f}ms")
+        if "statements" in stats and "statements" in base and stats["statements"] > base["statements"]:
+            regressions.append(f"{key}: {base['statements']} -> {stats['statements']} statements per request")
+    return regressions
+
+
+def print_table(results):
+    print(f"{'route':<40} {'reqs':>6} {'errs':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'stmts':>6}")
+    for key, stats in results.items():
+        print(f"{key:<40} {stats['requests']:>6} {stats['errors']:>5} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} "
+              f"{stats['p99_ms']:>8.2f} {stats['rps']:>8.1f} {stats.get('statements', ''):>6}")
+
+
+def report(kind, results, args, baseline_path, save_baseline, threshold):
+    """
+    prints and saves the results, compares them with the baseline when there is one,
+    returns the exit status (1 on regressions)
+    """
+    print_table(results)
+    path = save(kind, results, args)
+    print(f"\nresults saved to {path}")
+    if save_baseline:
+        save(kind, results, args, path=baseline_path)
+        print(f"baseline saved to {baseline_path}")
+        return 0
+    if not os.path.exists(baseline_path):
+        return 0
+    regressions = compare(results, load(baseline_path)["results"], threshold=threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regressions against {baseline_path}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"no regressions against {baseline_path}")
+    return 0
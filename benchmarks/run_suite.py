@@ -0,0 +1,119 @@
+"""
+benchmark of every route in app/routes/auth.py and app/routes/subscriptions.py against
+seeded datasets of several sizes, run in-process through the Flask test client so that
+the numbers only depend on the app and the database.
+
+    python -m benchmarks.run_suite --sizes 1000,10000,100000 --requests 200
+    python -m benchmarks.run_suite --save-baseline      # record the reference run
+    python -m benchmarks.run_suite                      # compare against it
+
+each size gets a fresh SQLite database filled by the same generator as "flask seed",
+--database-url runs the suite once against an existing (already seeded) database instead.
+besides p50/p95/p99 and throughput, every route reports the most statements one of its
+requests executed (from the Server-Timing header of DB_INSTRUMENTATION), which does not
+depend on machine noise. results are saved to benchmarks/results/ and compared with the
+baseline: the run exits with status 1 when a route got slower than --threshold or runs
+more statements than in the baseline.
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+from benchmarks import workload
+from benchmarks.results import DEFAULT_BASELINE, report, summarize
+
+STATEMENTS = re.compile(r'desc="(\d+) queries"')
+
+
+def run_routes(app, routes, requests, warmup, seed):
+    from app.extensions import db
+
+    client = app.test_client()
+    with app.app_context():
+        entries_by_route = workload.generate(routes, requests, seed=seed, warmup=warmup)
+        tokens = workload.Tokens().load([entry for entries in entries_by_route.values() for entry in entries])
+        db.session.remove()
+
+    results = {}
+    for name, entries in entries_by_route.items():
+        latencies, statements, errors = [], [], 0
+        started = None
+        for index, entry in enumerate(entries):
+            if index == warmup:
+                started = time.perf_counter()
+            method, url, headers, body = workload.request_args(entry, tokens)
+            request_started = time.perf_counter()
+            response = client.open(url, method=method, headers=headers, json=body)
+            response.get_data()
+            elapsed = time.perf_counter() - request_started
+            if started is None:
+                continue
+            latencies.append(elapsed)
+            errors += response.status_code >= 500
+            match = STATEMENTS.search(response.headers.get("Server-Timing", ""))
+            if match:
+                statements.append(int(match.group(1)))
+        results[name] = summarize(latencies, time.perf_counter() - started, errors, statements)
+    return results
+
+
+def build_app(url):
+    from app import create_app
+    from benchmarks.common import migrate_database
+
+    migrate_database(url)
+
+    # instrumented for the statement counts, without logging the seeding inserts as slow
+    return create_app({"SQLALCHEMY_DATABASE_URI": url, "DB_INSTRUMENTATION": True, "SLOW_QUERY_THRESHOLD_MS": float("inf")})
+
+
+def seed_database(app, size, workers):
+    from app.extensions import password_hasher, plan_catalog
+    from app.utils import seed_data
+
+    with app.app_context():
+        started = time.perf_counter()
+        seed_data.seed(size, workers=workers, chunk_size=min(size, 20000), password_hash=password_hasher.hash("password"))
+        plan_catalog.invalidate()
+    print(f"seeded {size} users in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="seeded users per dataset")
+    parser.add_argument("--database-url", help="run once against this already seeded database")
+    parser.add_argument("--requests", type=int, default=200, help="requests per route, scaled by the route's share")
+    parser.add_argument("--warmup", type=int, default=5, help="untimed requests per route")
+    parser.add_argument("--routes", default=",".join(workload.ROUTES), help="comma separated route names")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="seeding processes")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative p95 slowdown")
+    args = parser.parse_args()
+
+    from app.extensions import principal_cache
+
+    routes = args.routes.split(",")
+    results = {}
+    if args.database_url:
+        datasets = [("db", args.database_url, None)]
+    else:
+        directory = tempfile.mkdtemp(prefix="clue-suite-")
+        datasets = [(size, f"sqlite:///{os.path.join(directory, f'suite-{size}.db')}", int(size))
+                    for size in args.sizes.split(",")]
+    for label, url, size in datasets:
+        app = build_app(url)
+        if size:
+            seed_database(app, size, args.workers)
+        # the principal cache is per process and the datasets reuse user ids
+        principal_cache.clear()
+        for name, stats in run_routes(app, routes, args.requests, args.warmup, args.seed).items():
+            results[f"{label}/{name}"] = stats
+    sys.exit(report("suite", results, vars(args), args.baseline, args.save_baseline, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
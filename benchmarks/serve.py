@@ -0,0 +1,12 @@
+"""
+werkzeug's threaded server, used by the benchmarks when gunicorn is not installed.
+the app is configured from the environment (e.g. DATABASE_URL)
+
+    python -m benchmarks.serve 8000
+"""
+import sys
+from werkzeug.serving import make_server
+from app import create_app
+
+if __name__ == "__main__":
+    make_server("127.0.0.1", int(sys.argv[1]), create_app(), threaded=True).serve_forever()
@@ -0,0 +1,213 @@
+"""
+the request mix of the benchmark suite, as entries of the request log format written by
+REQUEST_LOG_PATH (see app/utils/request_log.py), so that generated workloads and recorded
+production traffic are executed by the same code:
+
+    {"method": "GET", "path": "/api/subscriptions/active", "query": null, "json": null, "user_id": 42}
+
+every route of app/routes/auth.py and app/routes/subscriptions.py has a generator below.
+generators run in an app context against a seeded database (see "flask seed") and only
+produce entries, executing them is left to run_suite.py (in-process) and replay.py (HTTP).
+"""
+import random
+from collections import namedtuple
+from urllib.parse import urlencode
+from sqlalchemy import func, select
+
+Context = namedtuple("Context", ["admin_id", "first_user", "last_user", "plan_ids"])
+
+ADMIN_EMAIL = "bench-admin@example.com"
+
+
+def load_context(password_hash):
+    """
+    seeded user id range and plan ids of the current database, creates the admin
+    """
+    from app.extensions import db
+    from app.models import SubscriptionPlan, User
+
+    admin_id = db.session.execute(select(User.id).where(User.email == ADMIN_EMAIL)).scalar()
+    if admin_id is None:
+        admin = User(email=ADMIN_EMAIL, password=password_hash, is_admin=True)
+        db.session.add(admin)
+        db.session.commit()
+        admin_id = admin.id
+    first_user, last_user = db.session.execute(
+        select(func.min(User.id), func.max(User.id)).where(User.email.like("%@seed.example.com"))
+    ).one()
+    plan_ids = db.session.execute(select(SubscriptionPlan.id).order_by(SubscriptionPlan.id)).scalars().all()
+    return Context(admin_id, first_user, last_user, plan_ids)
+
+
+def _entry(method, path, user_id=None, query=None, json=None):
+    return {"method": method, "path": path, "query": urlencode(query) if query else None, "json": json, "user_id": user_id}
+
+
+def _user(ctx, rng):
+    return rng.randint(ctx.first_user, ctx.last_user)
+
+
+def register(ctx, rng, i):
+    return _entry("POST", "/api/register", json={"email": f"bench-{rng.getrandbits(48):x}-{i}@example.com", "password": None})
+
+
+def login(ctx, rng, i):
+    return _entry("POST", "/api/login", json={"email": f"user{_user(ctx, rng)}@seed.example.com", "password": None})
+
+
+def create_plan(ctx, rng, i):
+    return _entry("POST", "/api/subscriptions/plans", ctx.admin_id,
+                  json={"name": f"Bench {i}", "description": "Benchmark plan", "price_cents": 100 * rng.randint(1, 50)})
+
+
+def list_plans(ctx, rng, i):
+    return _entry("GET", "/api/subscriptions/plans", _user(ctx, rng))
+
+
+def subscribe(ctx, rng, i):
+    return _entry("POST", "/api/subscriptions/subscribe", _user(ctx, rng),
+                  json={"plan_id": rng.choice(ctx.plan_ids), "duration_days": 30})
+
+
+def change_plan(ctx, rng, i):
+    return _entry("POST", "/api/subscriptions/change-plan", _user(ctx, rng), json={"plan_id": rng.choice(ctx.plan_ids)})
+
+
+def cancel(ctx, rng, i):
+    return _entry("POST", "/api/subscriptions/cancel", _user(ctx, rng))
+
+
+def active(ctx, rng, i):
+    return _entry("GET", "/api/subscriptions/active", _user(ctx, rng))
+
+
+def active_all(ctx, rng, i):
+    return _entry("GET", "/api/subscriptions/active/all", ctx.admin_id, query={"format": "ndjson"})
+
+
+def active_all_filtered(ctx, rng, i):
+    user_ids = ",".join(str(_user(ctx, rng)) for _ in range(100))
+    return _entry("GET", "/api/subscriptions/active/all", ctx.admin_id, query={"user_ids": user_ids})
+
+
+def active_batch(ctx, rng, i):
+    return _entry("POST", "/api/subscriptions/active/batch", ctx.admin_id,
+                  json={"user_ids": [_user(ctx, rng) for _ in range(500)]})
+
+
+def history(ctx, rng, i):
+    return _entry("GET", "/api/subscriptions/history", _user(ctx, rng), query={"page_size": 20})
+
+
+def history_deep(ctx, rng, i):
+    """
+    the page after the first 20 rows of a user with a long history, through its cursor
+    """
+    from app.extensions import db
+    from app.models import Subscription
+    from app.utils.pagination import encode_cursor
+
+    user_id = _user(ctx, rng)
+    row = db.session.execute(
+        select(Subscription.starts_at, Subscription.id)
+        .where(Subscription.user_id == user_id)
+        .order_by(Subscription.starts_at.desc(), Subscription.id.desc())
+        .offset(19).limit(1)
+    ).first()
+    query = {"page_size": 20}
+    if row:
+        query["cursor"] = encode_cursor(row.starts_at, row.id)
+    return _entry("GET", "/api/subscriptions/history", user_id, query=query)
+
+
+# name -> (generator, share of the suite's request count), reads before writes so that
+# the writes do not change the data the reads of the same size run against
+ROUTES = {
+    "list_plans": (list_plans, 1.0),
+    "active": (active, 1.0),
+    "history": (history, 1.0),
+    "history_deep": (history_deep, 0.5),
+    "active_all_filtered": (active_all_filtered, 0.5),
+    "active_batch": (active_batch, 0.25),
+    "active_all": (active_all, 0.02),
+    "login": (login, 0.1),
+    "register": (register, 0.1),
+    "subscribe": (subscribe, 0.5),
+    "change_plan": (change_plan, 0.5),
+    "cancel": (cancel, 0.5),
+    "create_plan": (create_plan, 0.05),
+}
+
+# traffic shares of a generated replay log
+DEFAULT_MIX = {
+    "active": 50, "history": 15, "history_deep": 3, "list_plans": 10, "login": 5, "subscribe": 5,
+    "change_plan": 4, "cancel": 3, "active_batch": 2, "active_all_filtered": 2, "register": 1,
+}
+
+
+def generate(routes, requests, seed=0, warmup=0):
+    """
+    returns {route name: [entries]} with warmup + max(1, share * requests) entries per route
+    """
+    from app.extensions import password_hasher
+
+    ctx = load_context(password_hasher.hash("password"))
+    workload = {}
+    for name in routes:
+        generator, share = ROUTES[name]
+        rng = random.Random(f"{seed}:{name}")
+        workload[name] = [generator(ctx, rng, i) for i in range(warmup + max(1, int(share * requests)))]
+    return workload
+
+
+def generate_mix(mix, requests, seed=0):
+    """
+    returns requests entries drawn from the routes in proportion to mix
+    """
+    from app.extensions import password_hasher
+
+    ctx = load_context(password_hasher.hash("password"))
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    return [ROUTES[name][0](ctx, rng, i) for i, name in enumerate(rng.choices(names, weights=weights, k=requests))]
+
+
+class Tokens:
+    """
+    mints (and caches) a token for every user_id of the entries, using the app's secret
+    """
+    def __init__(self):
+        self._tokens = {}
+
+    def load(self, entries):
+        from app.extensions import db
+        from app.models import User
+        from app.utils.auth_utils import AuthUtils
+
+        missing = {entry["user_id"] for entry in entries if entry.get("user_id")} - set(self._tokens)
+        missing = sorted(missing)
+        for offset in range(0, len(missing), 500):
+            rows = db.session.execute(
+                select(User.id, User.is_admin, User.token_version).where(User.id.in_(missing[offset:offset + 500]))
+            ).all()
+            for row in rows:
+                self._tokens[row.id] = AuthUtils.generate_token(
+                    row.id, expires_in=86400, is_admin=row.is_admin, token_version=row.token_version
+                )
+        return self
+
+    def headers(self, entry):
+        token = self._tokens.get(entry.get("user_id"))
+        return {"Authorization": f"Bearer {token}"} if token else {}
+
+
+def request_args(entry, tokens, password="password"):
+    """
+    (method, url, headers, json body) of an entry, redacted passwords filled with password
+    """
+    url = entry["path"] + (f"?{entry['query']}" if entry.get("query") else "")
+    body = entry.get("json")
+    if isinstance(body, dict) and "password" in body:
+        body = {**body, "password": password}
+    return entry["method"], url, tokens.headers(entry), body
@@ -0,0 +1,24 @@
+# picked up automatically by gunicorn from the working directory (see Dockerfile)
+import os
+import shutil
+
+# workers write their Prometheus metrics to mmap-backed files in this directory and
+# /metrics aggregates them. it has to be set before prometheus_client is imported
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/clue-prometheus")
+
+# gthread workers: while a thread waits on the password hashing pool
+# (PASSWORD_HASH_WORKERS), the others keep serving requests
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+
+def on_starting(server):
+    # metrics files of a previous run would otherwise be added to the new one
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
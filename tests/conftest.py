@@ -1,20 +1,30 @@
 import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 import pytest
+from sqlalchemy import event
 from app import create_app, db
-from app.models import SubscriptionPlan, User
+from app.extensions import outbox_dispatcher
+from app.models import Subscription, SubscriptionPlan, User
+from app.utils import migrations
+from app.utils.outbox_sinks import MemorySink
 
 @pytest.fixture(scope="function")
 def app():
     os.environ["DATABASE_URL"] = "sqlite:///:memory:"
 
-    app = create_app()
+    # hashing inline with cheap parameters keeps the fixtures fast
+    # the schema is created below by the migrations, as "flask db upgrade" would
+    app = create_app({"PASSWORD_HASH_WORKERS": 0, "PASSWORD_HASH_METHOD": "pbkdf2:sha256:1000", "SCHEMA_CHECK": "off"})
     app.config.update({
         "TESTING": True,
+        # any route going over its declared query budget fails the test that called it
+        "QUERY_BUDGET_ENFORCE": True,
         "SQLALCHEMY_DATABASE_URI": os.environ["DATABASE_URL"],
     })
 
     with app.app_context():
-        db.create_all()
+        migrations.upgrade(db.engine)
 
         p1 = SubscriptionPlan(name="Basic", description="Basic plan", price_cents=1000)
         p2 = SubscriptionPlan(name="Pro", description="Pro plan", price_cents=2000)
@@ -28,8 +38,100 @@ def app():
 
         # teardown
         db.session.remove()
-        db.drop_all()
+        # only the primary: the replica bind of other tests' apps is not configured here
+        db.drop_all(bind_key=None)
+        migrations.version_table.drop(db.engine, checkfirst=True)
 
 @pytest.fixture(scope="function")
 def client(app):
     return app.test_client()
+
+@pytest.fixture
+def count_statements(app):
+    """
+    "with count_statements() as statements:" collects the SQL run on the primary inside the block
+    """
+    @contextmanager
+    def counting():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+
+    return counting
+
+
+@pytest.fixture
+def admin_headers(client):
+    r = client.post("/api/login", json={"email": "admin@test.com", "password": "password"})
+    return {"Authorization": f"Bearer {r.get_json()['data']['token']}"}
+
+
+@pytest.fixture
+def seed_active(app):
+    """
+    seed_active(count) adds count users, each with an active Basic subscription, and returns their ids
+    """
+    def seed(count):
+        users = [User(email=f"user{i}@test.com", password="x") for i in range(count)]
+        db.session.add_all(users)
+        db.session.flush()
+        now = datetime.now()
+        db.session.add_all([
+            Subscription(user_id=u.id, plan_id=1, status="active", starts_at=now, ends_at=now + timedelta(days=30))
+            for u in users
+        ])
+        db.session.commit()
+        return [u.id for u in users]
+
+    return seed
+
+
+@pytest.fixture
+def subscriber(client):
+    """
+    subscriber(email) registers a user and returns their Authorization header
+    """
+    def register(email):
+        r = client.post("/api/register", json={"email": email, "password": "password"})
+        return {"Authorization": f"Bearer {r.get_json()['data']['token']}"}
+
+    return register
+
+
+@pytest.fixture
+def racing(app):
+    """
+    makes the next n subscription INSERTs lose the race: a concurrent subscribe's active row
+    shows up in the transaction right before them
+    """
+    pending = []
+
+    def interleave(conn, cursor, statement, parameters, context, executemany):
+        if pending and statement.startswith("INSERT INTO subscriptions"):
+            pending.pop()
+            user_id = parameters[0]
+            cursor.execute(
+                "INSERT INTO subscriptions (user_id, plan_id, status, starts_at, ends_at) VALUES (?, 1, 'active', ?, ?)",
+                (user_id, str(datetime.now()), str(datetime.now() + timedelta(days=1))),
+            )
+
+    event.listen(db.engine, "before_cursor_execute", interleave)
+    yield lambda n: pending.extend([True] * n)
+    event.remove(db.engine, "before_cursor_execute", interleave)
+
+
+@pytest.fixture
+def sink(app):
+    """
+    a memory sink for the outbox dispatcher: the writes only append outbox events when a sink is set
+    """
+    outbox_dispatcher.sink = MemorySink()
+    yield outbox_dispatcher.sink
+    outbox_dispatcher.sink = None
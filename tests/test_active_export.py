@@ -0,0 +1,28 @@
+import json
+
+
+def test_streaming_formats_match_buffered_response(app, client, admin_headers, seed_active):
+    app.config["EXPORT_BATCH_SIZE"] = 7
+    seed_active(20)
+    headers = admin_headers
+
+    buffered = client.get("/api/subscriptions/active/all", headers=headers).get_json()
+
+    r = client.get("/api/subscriptions/active/all?format=json-stream", headers=headers)
+    assert r.status_code == 200
+    assert r.is_streamed
+    assert r.get_json() == buffered
+
+    r = client.get("/api/subscriptions/active/all?format=ndjson", headers=headers)
+    assert r.mimetype == "application/x-ndjson"
+    rows = [json.loads(line) for line in r.get_data(as_text=True).splitlines()]
+    assert rows == buffered["data"]
+    assert len(rows) == 20
+
+    r = client.get("/api/subscriptions/active/all?format=xml", headers=headers)
+    assert r.status_code == 400
+
+
+def test_streaming_empty_result(client, admin_headers):
+    r = client.get("/api/subscriptions/active/all?format=json-stream", headers=admin_headers)
+    assert r.get_json()["data"] == []
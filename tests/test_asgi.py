@@ -0,0 +1,153 @@
+import asyncio
+import json
+import pytest
+from app.asgi import async_database_url, create_asgi_app
+from app.extensions import db
+from app.models import SubscriptionPlan, User
+from app.utils import migrations
+from app.utils.auth_utils import AuthUtils
+
+pytest.importorskip("aiosqlite")
+
+
+async def call(asgi, method, path, headers=None, body=None):
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "server": ("testserver", 80),
+        "client": ("127.0.0.1", 50000),
+    }
+    if body is not None:
+        body = json.dumps(body).encode()
+        scope["headers"] += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    messages = [{"type": "http.request", "body": body or b"", "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi(scope, receive, send)
+    return sent[0]["status"], dict(sent[0]["headers"]), b"".join(m.get("body", b"") for m in sent[1:])
+
+
+@pytest.fixture
+def served(tmp_path):
+    """
+    the ASGI app and the Flask app it wraps on one SQLite file, with a token per user
+    """
+    asgi = create_asgi_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'app.db'}",
+        "READ_YOUR_WRITES_FILE": str(tmp_path / "pins"),
+        "RESPONSE_CACHE_VERSIONS_FILE": str(tmp_path / "versions"),
+        "PLAN_CATALOG_VERSION_FILE": str(tmp_path / "plans.version"),
+        "PASSWORD_HASH_WORKERS": 0,
+        "SCHEMA_CHECK": "off",
+        "TESTING": True,
+    })
+    app = asgi.flask_app
+    with app.app_context():
+        migrations.upgrade(db.engine)
+        users = [User(email=f"user{i}@test.com", password="x", is_admin=i == 1) for i in range(2)]
+        db.session.add_all(users + [SubscriptionPlan(name="Basic", description="Basic plan", price_cents=1000)])
+        db.session.commit()
+        tokens = [{"Authorization": f"Bearer {AuthUtils.generate_token(user.id, is_admin=user.is_admin)}"} for user in users]
+        yield asgi, app.test_client(), tokens, users
+        db.session.remove()
+
+
+def test_async_reads_match_the_flask_routes(served):
+    asgi, client, (subscriber, other), _ = served
+
+    async def scenario():
+        try:
+            # writes go through the Flask app
+            status, _, _ = await call(asgi, "POST", "/api/subscriptions/subscribe", subscriber, {"plan_id": 1, "duration_days": 30})
+            assert status == 200
+            for path in ["/api/subscriptions/active", "/api/subscriptions/history", "/api/subscriptions/history?page_size=1",
+                         "/api/subscriptions/history?page=2", "/api/subscriptions/plans"]:
+                for headers in (subscriber, other):
+                    status, _, body = await call(asgi, "GET", path, headers)
+                    expected = client.get(path, headers=headers)
+                    assert status == expected.status_code
+                    assert json.loads(body) == expected.get_json()
+
+            status, headers, body = await call(asgi, "GET", "/api/subscriptions/active", subscriber)
+            assert json.loads(body)["data"]["name"] == "Basic"
+            etag = headers[b"etag"].decode()
+            assert etag == client.get("/api/subscriptions/active", headers=subscriber).headers["ETag"]
+            status, _, body = await call(asgi, "GET", "/api/subscriptions/active", {**subscriber, "If-None-Match": etag})
+            assert (status, body) == (304, b"")
+
+            status, _, body = await call(asgi, "GET", "/api/subscriptions/history?cursor=nope", subscriber)
+            assert status == 400 and json.loads(body)["message"] == "Invalid cursor"
+
+            # a write through the Flask app invalidates what the async routes cached
+            await call(asgi, "POST", "/api/subscriptions/cancel", subscriber)
+            _, _, body = await call(asgi, "GET", "/api/subscriptions/active", subscriber)
+            assert json.loads(body)["data"] is None
+        finally:
+            await asgi.close()
+
+    asyncio.run(scenario())
+
+
+def test_async_routes_check_tokens_like_the_decorators(served):
+    asgi, client, (token, _), (user, _) = served
+
+    async def scenario():
+        try:
+            for headers, message in [({}, "Unauthorized"), ({"Authorization": "Basic x"}, "Invalid token"),
+                                     ({"Authorization": "Bearer nope"}, "Invalid token")]:
+                status, _, body = await call(asgi, "GET", "/api/subscriptions/active", headers)
+                assert status == 401 and json.loads(body)["message"] == message
+            assert (await call(asgi, "GET", "/api/subscriptions/active", token))[0] == 200
+
+            # revoked through the Flask side, the async routes see the shared principal cache
+            with asgi.flask_app.app_context():
+                AuthUtils.revoke_user_tokens(db.session.merge(user))
+                db.session.commit()
+            status, _, body = await call(asgi, "GET", "/api/subscriptions/history", token)
+            assert status == 401 and json.loads(body)["message"] == "Invalid token"
+        finally:
+            await asgi.close()
+
+    asyncio.run(scenario())
+
+
+def test_other_routes_are_served_by_the_flask_app(served):
+    asgi, client, (subscriber, admin), _ = served
+
+    async def scenario():
+        try:
+            status, headers, body = await call(asgi, "POST", "/api/register", body={"email": "new@test.com", "password": "password"})
+            assert status == 201 and headers[b"content-type"] == b"application/json"
+            assert json.loads(body)["data"]["user_id"]
+            assert (await call(asgi, "GET", "/api/nope"))[0] == 404
+
+            # streamed responses are passed on chunk by chunk
+            await call(asgi, "POST", "/api/subscriptions/subscribe", subscriber, {"plan_id": 1, "duration_days": 30})
+            path = "/api/subscriptions/active/all?format=json-stream"
+            status, _, body = await call(asgi, "GET", path, admin)
+            assert status == 200 and json.loads(body) == client.get(path, headers=admin).get_json()
+            assert len(json.loads(body)["data"]) == 1
+        finally:
+            await asgi.close()
+
+    asyncio.run(scenario())
+
+
+def test_async_database_url():
+    assert str(async_database_url("sqlite:///app.db")) == "sqlite+aiosqlite:///app.db"
+    assert str(async_database_url("mysql://u:p@db/subs?charset=utf8mb4")).startswith("mysql+asyncmy://u:")
+    with pytest.raises(ValueError):
+        async_database_url("oracle://db")
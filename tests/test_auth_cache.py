@@ -0,0 +1,63 @@
+from sqlalchemy import text
+from app import db
+from app.extensions import principal_cache
+from app.models import User
+from app.utils import migrations
+from app.utils.auth_utils import AuthUtils
+
+
+def _login(client, email, password="password"):
+    r = client.post("/api/login", json={"email": email, "password": password})
+    assert r.status_code == 200
+    return r.get_json()["data"]["token"]
+
+
+def test_authenticated_requests_skip_user_lookup(client):
+    client.post("/api/register", json={"email": "user@test.com", "password": "password"})
+    token = _login(client, "user@test.com")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    before = principal_cache.stats()
+    for _ in range(5):
+        assert client.get("/api/subscriptions/active", headers=headers).status_code == 200
+    after = principal_cache.stats()
+
+    # only the first request needs the users table
+    assert after["db_lookups"] - before["db_lookups"] == 1
+    assert after["served_without_db"] - before["served_without_db"] == 4
+
+
+def test_revoked_and_demoted_tokens_are_rejected(app, client):
+    admin_token = _login(client, "admin@test.com")
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    assert client.get("/api/subscriptions/active/all", headers=headers).status_code == 200
+
+    # demotion takes effect once the cached principal is gone
+    admin = db.session.query(User).filter_by(email="admin@test.com").first()
+    admin.is_admin = False
+    db.session.commit()
+    principal_cache.invalidate(admin.id)
+    assert client.get("/api/subscriptions/active/all", headers=headers).status_code == 401
+    assert client.get("/api/subscriptions/active", headers=headers).status_code == 200
+
+    AuthUtils.revoke_user_tokens(admin)
+    db.session.commit()
+    assert client.get("/api/subscriptions/active", headers=headers).status_code == 401
+
+    new_token = _login(client, "admin@test.com")
+    r = client.get("/api/subscriptions/active", headers={"Authorization": f"Bearer {new_token}"})
+    assert r.status_code == 200
+
+
+def test_databases_from_before_token_versions_are_upgraded(app, client):
+    # users.token_version only exists once migration 0002 ran ("flask db upgrade")
+    db.session.remove()
+    with db.engine.begin() as conn:
+        conn.execute(text("ALTER TABLE users DROP COLUMN token_version"))
+        conn.execute(migrations.version_table.delete().where(migrations.version_table.c.version >= 2))
+    migrations.upgrade(db.engine)
+
+    token = _login(client, "admin@test.com")
+    assert client.get("/api/subscriptions/active/all", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+    assert "revoked" in app.test_cli_runner().invoke(args=["revoke-tokens", "admin@test.com"]).output
+    assert client.get("/api/subscriptions/active/all", headers={"Authorization": f"Bearer {token}"}).status_code == 401
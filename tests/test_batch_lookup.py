@@ -0,0 +1,43 @@
+def test_batch_lookup_runs_fixed_size_chunks(app, client, admin_headers, seed_active, count_statements):
+    app.config["BATCH_LOOKUP_CHUNK_SIZE"] = 100
+    user_ids = seed_active(250)
+
+    with count_statements() as executed:
+        # duplicates and unknown ids are fine
+        r = client.post(
+            "/api/subscriptions/active/batch",
+            json={"user_ids": user_ids + user_ids[:10] + [99999]},
+            headers=admin_headers,
+        )
+    statements = [statement for statement in executed if "IN (" in statement]
+
+    assert r.status_code == 200
+    assert sorted(row["user_id"] for row in r.get_json()["data"]) == sorted(user_ids)
+    assert len(statements) == 3
+    assert len(set(statements)) == 1
+
+    r = client.get(f"/api/subscriptions/active/all?user_ids={user_ids[0]},{user_ids[1]}", headers=admin_headers)
+    assert sorted(row["user_id"] for row in r.get_json()["data"]) == user_ids[:2]
+
+
+def test_batch_lookup_validation(app, client, admin_headers):
+    app.config["BATCH_LOOKUP_MAX_IDS"] = 5
+    r = client.post("/api/subscriptions/active/batch", json={"user_ids": [1, 2, 3, 4, 5, 6]}, headers=admin_headers)
+    assert r.status_code == 400
+    assert r.get_json()["error"] == {"user_ids": ["At most 5 user_ids are allowed"]}
+    # rejected on the count alone, the ids are not looked at
+    r = client.post("/api/subscriptions/active/batch", json={"user_ids": ["x"] * 6}, headers=admin_headers)
+    assert r.get_json()["error"] == {"user_ids": ["At most 5 user_ids are allowed"]}
+    r = client.post("/api/subscriptions/active/batch", json={"user_ids": ["x"]}, headers=admin_headers)
+    assert r.status_code == 400
+    r = client.post("/api/subscriptions/active/batch", json={"user_ids": []}, headers=admin_headers)
+    assert r.status_code == 400
+
+
+def test_batch_lookup_rejects_oversized_bodies(app, client, admin_headers):
+    app.config["MAX_CONTENT_LENGTH"] = 1000
+    r = client.post("/api/subscriptions/active/batch", json={"user_ids": list(range(1, 1000))}, headers=admin_headers)
+    assert r.status_code == 413
+    assert r.get_json()["message"] == "Request body is larger than 1000 bytes"
+    r = client.post("/api/subscriptions/active/batch", json={"user_ids": [1, 2]}, headers=admin_headers)
+    assert r.status_code == 200
@@ -0,0 +1,132 @@
+import multiprocessing
+import time
+import pytest
+from app.utils.cache import SharedMemoryBackend, create_backend
+from app.utils.cache.fake import FakeNetworkStore, start_fake_server
+from app.utils.cache.network import NetworkBackend
+from app.utils.principal_cache import Principal, PrincipalCache
+
+
+def poll_until(backend, received, timeout=2.0):
+    # the network backend receives messages on a listener thread
+    deadline = time.monotonic() + timeout
+    while not received and time.monotonic() < deadline:
+        backend.poll()
+        time.sleep(0.01)
+
+
+@pytest.fixture(params=["memory", "shared", "network", "tiered"])
+def backends(request, tmp_path):
+    """
+    two handles on the same cache, as two workers would hold
+    """
+    if request.param == "memory":
+        backend = create_backend("memory", namespace="test")
+        return backend, backend
+    if request.param == "network":
+        store = FakeNetworkStore()
+        return NetworkBackend(store, namespace="test"), NetworkBackend(store, namespace="test")
+    url = f"shared://{tmp_path / 'cache'}"
+    near_entries = 100 if request.param == "tiered" else 0
+    return tuple(create_backend(url, namespace="test", near_entries=near_entries) for _ in range(2))
+
+
+def test_get_set_delete_and_ttl(backends):
+    first, second = backends
+    assert first.get("missing") is None
+    assert first.set("principal", Principal(1, True, 3))
+    assert second.get("principal") == Principal(1, True, 3)
+    first.set("short", "lived", ttl=0.05)
+    assert second.get("short") == "lived"
+    time.sleep(0.06)
+    assert second.get("short") is None
+
+    second.delete("principal")
+    assert first.get("principal") is None
+
+
+def test_versioned_keys(backends):
+    first, second = backends
+    key = first.versioned_key("plans", "list")
+    first.set(key, [1, 2])
+    assert second.get(second.versioned_key("plans", "list")) == [1, 2]
+    assert second.bump("plans") == first.version("plans") == 1
+    assert first.get(first.versioned_key("plans", "list")) is None
+    # clearing drops the entries but not the versions, so old keys stay unreachable
+    first.clear()
+    assert second.version("plans") == 1
+
+
+def test_pub_sub_reaches_the_other_handle(backends):
+    first, second = backends
+    received = []
+    second.subscribe("events", received.append)
+    first.publish("events", {"user_id": 7})
+    poll_until(second, received)
+    assert received == [{"user_id": 7}]
+
+
+def test_near_cache_is_invalidated_through_the_messages(tmp_path):
+    url = f"shared://{tmp_path / 'cache'}"
+    first, second = (create_backend(url, near_entries=100, near_ttl=60) for _ in range(2))
+    first.set("user:1", "old")
+    assert second.get("user:1") == "old"
+    first.delete("user:1")
+    first.set("user:1", "new")
+    assert second.get("user:1") == "new"
+    first.bump("plans")
+    assert second.version("plans") == 1
+
+
+def test_shared_backend_evicts_within_a_bucket_and_skips_oversized_values(tmp_path):
+    backend = SharedMemoryBackend(str(tmp_path / "cache"), buckets=1, ways=2, slot_size=128)
+    backend.incr("counter")
+    assert not backend.set("big", "x" * 200)
+    backend.set("a", 1, ttl=10)
+    backend.set("b", 2, ttl=20)
+    # the full bucket drops the entry expiring first, never the counter
+    assert backend.get("a") is None and backend.get("b") == 2 and backend.get("counter") == 1
+    assert backend.stats()["oversized"] == 1
+
+
+def _child_writes(url):
+    backend = create_backend(url, namespace="test")
+    backend.set("from_child", "hello")
+    backend.incr("hits")
+    backend.publish("events", "done")
+
+
+@pytest.mark.parametrize("kind", ["shared", "network"])
+def test_other_processes_share_the_cache(kind, tmp_path):
+    manager = None
+    if kind == "shared":
+        url = f"shared://{tmp_path / 'cache'}"
+    else:
+        manager, url = start_fake_server()
+    try:
+        backend = create_backend(url, namespace="test")
+        received = []
+        backend.subscribe("events", received.append)
+        backend.incr("hits")
+        child = multiprocessing.get_context("fork").Process(target=_child_writes, args=(url,))
+        child.start()
+        child.join(10)
+        assert child.exitcode == 0
+        assert backend.get("from_child") == "hello"
+        assert backend.get("hits") == 2
+        poll_until(backend, received)
+        assert received == ["done"]
+    finally:
+        if manager:
+            manager.shutdown()
+
+
+def test_principal_cache_invalidation_reaches_every_worker(app, tmp_path):
+    app.config.update({"CACHE_BACKEND": f"shared://{tmp_path / 'cache'}", "CACHE_NEAR_ENTRIES": 100})
+    workers = [PrincipalCache(), PrincipalCache()]
+    for cache in workers:
+        cache.init_app(app)
+    workers[0].set(Principal(5, True, 0))
+    assert workers[1].get(5) == Principal(5, True, 0)
+    workers[0].invalidate(5)
+    assert workers[1].get(5) is None
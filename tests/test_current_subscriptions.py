@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+from app import db
+from app.extensions import expiry_sweeper
+from app.models import CurrentSubscription, Subscription
+from app.utils import current_subscriptions
+
+
+def _user_headers(client):
+    r = client.post("/api/register", json={"email": "user@test.com", "password": "password"})
+    data = r.get_json()["data"]
+    return data["user_id"], {"Authorization": f"Bearer {data['token']}"}
+
+
+def test_write_paths_keep_projection_in_sync(client):
+    user_id, headers = _user_headers(client)
+
+    client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers=headers)
+    client.post("/api/subscriptions/subscribe", json={"plan_id": 2, "duration_days": 30}, headers=headers)
+    row = db.session.get(CurrentSubscription, user_id)
+    assert (row.plan_id, row.name) == (2, "Pro")
+    assert current_subscriptions.verify().stale == []
+
+    client.post("/api/subscriptions/change-plan", json={"plan_id": 1}, headers=headers)
+    active = client.get("/api/subscriptions/active", headers=headers).get_json()["data"]
+    assert (active["plan_id"], active["name"], active["description"]) == (1, "Basic", "Basic plan")
+    assert active["id"] == db.session.get(CurrentSubscription, user_id).subscription_id
+
+    client.post("/api/subscriptions/cancel", headers=headers)
+    assert db.session.get(CurrentSubscription, user_id) is None
+    assert current_subscriptions.verify() == (0, [], [], [])
+
+
+def test_expiry_and_rebuild_verify_cli(app, client):
+    user_id, headers = _user_headers(client)
+    client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers=headers)
+
+    expiry_sweeper.run(now=datetime.now() + timedelta(days=31))
+    assert db.session.get(CurrentSubscription, user_id) is None
+
+    # rows written behind the projection's back show up as drift until rebuilt
+    now = datetime.now()
+    db.session.add(Subscription(user_id=user_id, plan_id=2, status="active", starts_at=now, ends_at=now + timedelta(days=5)))
+    db.session.commit()
+
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["current-subscriptions", "verify"])
+    assert result.exit_code == 1
+    assert "1 missing rows" in result.output
+
+    result = runner.invoke(args=["current-subscriptions", "rebuild"])
+    assert "1 rows" in result.output
+    result = runner.invoke(args=["current-subscriptions", "verify"])
+    assert result.exit_code == 0
+    assert client.get("/api/subscriptions/active", headers=headers).get_json()["data"]["plan_id"] == 2
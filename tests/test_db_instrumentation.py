@@ -0,0 +1,33 @@
+import json
+import re
+import logging
+from app.utils.db_instrumentation import fingerprint
+
+
+def test_fingerprint_groups_dynamic_in_lists():
+    two = fingerprint("SELECT * FROM subscriptions s WHERE s.status = 'active' AND s.user_id IN (?, ?)")
+    three = fingerprint("SELECT * FROM subscriptions s\n WHERE s.status = 'x' AND s.user_id IN (:uid0, :uid1, :uid2)")
+    assert two == three
+    assert two[1] == "SELECT * FROM subscriptions s WHERE s.status = ? AND s.user_id IN (...)"
+    assert fingerprint("SELECT 1 FROM plans LIMIT 5")[0] != two[0]
+
+
+def test_server_timing_and_slow_query_log(app, client, caplog):
+    r = client.get("/api/subscriptions/plans")
+    assert "Server-Timing" not in r.headers
+
+    app.config.update({"DB_INSTRUMENTATION": True, "SLOW_QUERY_THRESHOLD_MS": 0})
+    r = client.post("/api/login", json={"email": "admin@test.com", "password": "password"})
+    headers = {"Authorization": f"Bearer {r.get_json()['data']['token']}"}
+
+    caplog.clear()
+    with caplog.at_level(logging.WARNING, logger="app.slow_queries"):
+        r = client.get("/api/subscriptions/active/all?user_ids=1,2,3", headers=headers)
+
+    timing = r.headers["Server-Timing"]
+    assert re.search(r'^db;dur=[0-9.]+;desc="[12] queries"', timing)
+    assert "db-slowest;dur=" in timing
+
+    records = [json.loads(record.getMessage()) for record in caplog.records]
+    assert {record["endpoint"] for record in records} == {"subscriptions.get_all_active_subscriptions"}
+    assert any("IN (...)" in record["statement"] for record in records)
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+from sqlalchemy import event as sa_event, func, select
+from app import db
+from app.extensions import expiry_sweeper
+from app.models import DailyRollup, OutboxEvent, Subscription, User
+from app.utils.expiry_sweeper import ExpirySweeper
+
+
+def _seed(lapsed, live):
+    users = [User(email=f"user{i}@test.com", password="x") for i in range(lapsed + live)]
+    db.session.add_all(users)
+    db.session.flush()
+    now = datetime.now()
+    db.session.add_all([
+        Subscription(
+            user_id=u.id,
+            plan_id=1,
+            status="active",
+            starts_at=now - timedelta(days=40),
+            ends_at=now - timedelta(days=10) if i < lapsed else now + timedelta(days=20),
+        )
+        for i, u in enumerate(users)
+    ])
+    db.session.commit()
+
+
+def test_sweeper_expires_lapsed_rows_in_batches(app):
+    _seed(lapsed=7, live=3)
+
+    report = expiry_sweeper.run(batch_size=3, max_batches=2)
+    assert (report.expired, report.batches, report.pending) == (6, 2, 1)
+
+    report = expiry_sweeper.run(batch_size=3)
+    assert (report.expired, report.pending) == (1, 0)
+
+    counts = dict(db.session.query(Subscription.status, db.func.count()).group_by(Subscription.status).all())
+    assert counts == {"expired": 7, "active": 3}
+
+
+def test_cli_and_authoritative_reads(app):
+    _seed(lapsed=2, live=1)
+    result = app.test_cli_runner().invoke(args=["expire-subscriptions", "--batch-size", "10"])
+    assert "Expired 2 subscriptions in 1 batches" in result.output
+    assert "0 still pending" in result.output
+
+    # with the sweeper keeping status accurate, the reads only filter on status
+    app.config["SUBSCRIPTION_STATUS_AUTHORITATIVE"] = True
+    client = app.test_client()
+    r = client.post("/api/login", json={"email": "admin@test.com", "password": "password"})
+    headers = {"Authorization": f"Bearer {r.get_json()['data']['token']}"}
+    r = client.get("/api/subscriptions/active/all", headers=headers)
+    assert len(r.get_json()["data"]) == 1
+
+
+def test_rows_changed_since_the_select_are_not_counted(app, sink):
+    _seed(lapsed=3, live=0)
+    cancelled_id = db.session.execute(select(Subscription.id).order_by(Subscription.id)).scalars().first()
+
+    def cancel_first(conn, cursor, statement, parameters, context, executemany):
+        # the user cancels between the SELECT of the batch and its UPDATE
+        if statement.lstrip().startswith("UPDATE subscriptions") and "expired" in statement:
+            cursor.execute("UPDATE subscriptions SET status = 'cancelled' WHERE id = ?", (cancelled_id,))
+
+    sa_event.listen(db.engine, "before_cursor_execute", cancel_first)
+    try:
+        report = expiry_sweeper.run()
+    finally:
+        sa_event.remove(db.engine, "before_cursor_execute", cancel_first)
+    assert report.expired == 2
+    assert db.session.execute(select(func.sum(DailyRollup.expired))).scalar() == 2
+    expired_events = db.session.execute(
+        select(OutboxEvent.subscription_id).where(OutboxEvent.event_type == "subscription.expired")
+    ).scalars().all()
+    assert len(expired_events) == 2 and cancelled_id not in expired_events
+
+
+def test_only_the_lease_holder_sweeps(app):
+    first, second = ExpirySweeper(interval=60), ExpirySweeper(interval=60)
+    now = datetime.now()
+    assert first._lease(now) and first._lease(now)
+    assert not second._lease(now)
+    # until the holder stops renewing it
+    assert second._lease(now + timedelta(seconds=121))
+    assert not first._lease(now + timedelta(seconds=121))
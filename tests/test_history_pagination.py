@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models import Subscription
+
+
+def _user_token(client):
+    r = client.post("/api/register", json={"email": "user@test.com", "password": "password"})
+    data = r.get_json()["data"]
+    return data["user_id"], {"Authorization": f"Bearer {data['token']}"}
+
+
+def _seed_history(user_id, count):
+    base = datetime(2024, 1, 1)
+    # pairs of rows share starts_at so that the id tie-breaker is exercised
+    db.session.add_all([
+        Subscription(
+            user_id=user_id,
+            plan_id=1,
+            status="cancelled",
+            starts_at=base + timedelta(days=i // 2),
+            ends_at=base + timedelta(days=i // 2 + 1),
+        )
+        for i in range(count)
+    ])
+    db.session.commit()
+
+
+def test_cursor_pages_match_offset_pages(client):
+    user_id, headers = _user_token(client)
+    _seed_history(user_id, 25)
+
+    by_offset = []
+    for page in range(1, 4):
+        r = client.get(f"/api/subscriptions/history?page={page}&page_size=10", headers=headers)
+        by_offset += [row["id"] for row in r.get_json()["data"]]
+
+    by_cursor = []
+    r = client.get("/api/subscriptions/history?page_size=10", headers=headers)
+    while True:
+        body = r.get_json()
+        by_cursor += [row["id"] for row in body["data"]]
+        cursor = body["meta"]["next_cursor"]
+        if not cursor:
+            break
+        r = client.get(f"/api/subscriptions/history?page_size=10&cursor={cursor}", headers=headers)
+
+    assert len(by_cursor) == 25
+    assert by_cursor == by_offset
+
+
+def test_page_size_is_capped_and_bad_cursor_rejected(app, client):
+    user_id, headers = _user_token(client)
+    _seed_history(user_id, app.config["HISTORY_MAX_PAGE_SIZE"] + 5)
+
+    r = client.get("/api/subscriptions/history?page_size=100000", headers=headers)
+    body = r.get_json()
+    assert len(body["data"]) == app.config["HISTORY_MAX_PAGE_SIZE"]
+    assert body["meta"]["next_cursor"]
+
+    r = client.get("/api/subscriptions/history?cursor=not-a-cursor", headers=headers)
+    assert r.status_code == 400
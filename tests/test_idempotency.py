@@ -0,0 +1,164 @@
+import threading
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event, func, select
+from app import create_app
+from app.extensions import db, idempotency_keys
+from app.models import IdempotencyKey, Subscription, SubscriptionPlan, User
+from app.utils import migrations
+from app.utils.auth_utils import AuthUtils
+
+
+def _subscriptions():
+    return db.session.execute(select(func.count()).select_from(Subscription)).scalar()
+
+
+def test_retries_replay_the_stored_response(app, client, subscriber, count_statements):
+    headers = {**subscriber("user@test.com"), "Idempotency-Key": "subscribe-1"}
+    first = client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers=headers)
+    assert first.status_code == 200 and "Idempotent-Replayed" not in first.headers
+
+    with count_statements() as statements:
+        retry = client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers=headers)
+    assert retry.status_code == 200 and retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.get_json() == first.get_json()
+    # the claim attempt and the read of the stored response, nothing on the subscriptions
+    assert len(statements) == 2
+    assert not any("subscriptions" in statement for statement in statements)
+    assert _subscriptions() == 1
+
+    # without the header, or with another key, the request runs again
+    client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers={"Authorization": headers["Authorization"]})
+    assert _subscriptions() == 2
+
+
+def test_key_reuse_and_validation(client, subscriber):
+    headers = {**subscriber("user@test.com"), "Idempotency-Key": "key"}
+    assert client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers=headers).status_code == 200
+    # same key, other body or other route
+    r = client.post("/api/subscriptions/subscribe", json={"plan_id": 2, "duration_days": 30}, headers=headers)
+    assert r.status_code == 422
+    assert client.post("/api/subscriptions/cancel", headers=headers).status_code == 422
+    # keys are scoped to the user
+    other = {**subscriber("other@test.com"), "Idempotency-Key": "key"}
+    r = client.post("/api/subscriptions/subscribe", json={"plan_id": 2, "duration_days": 30}, headers=other)
+    assert r.status_code == 200 and "Idempotent-Replayed" not in r.headers
+
+    assert client.post("/api/subscriptions/cancel", headers={**headers, "Idempotency-Key": ""}).status_code == 400
+    assert client.post("/api/subscriptions/cancel", headers={**headers, "Idempotency-Key": "x" * 256}).status_code == 400
+
+
+def test_client_errors_are_stored_and_server_errors_released(app, client, subscriber):
+    headers = {**subscriber("user@test.com"), "Idempotency-Key": "change"}
+    r = client.post("/api/subscriptions/change-plan", json={"plan_id": 2}, headers=headers)
+    assert r.status_code == 400
+    r = client.post("/api/subscriptions/change-plan", json={"plan_id": 2}, headers=headers)
+    assert r.status_code == 400 and r.headers["Idempotent-Replayed"] == "true"
+
+    with app.app_context():
+        user_id = AuthUtils.get_principal_from_token(headers["Authorization"].split()[1]).id
+        idempotency_keys.begin(user_id, "failed", "fingerprint")
+        idempotency_keys.release(user_id, "failed")
+        assert db.session.execute(select(func.count()).select_from(IdempotencyKey)).scalar() == 1
+
+
+def test_pending_keys_make_duplicates_wait(app, client, subscriber):
+    headers = {**subscriber("user@test.com"), "Idempotency-Key": "pending"}
+    body = {"plan_id": 1, "duration_days": 30}
+    user_id = AuthUtils.get_principal_from_token(headers["Authorization"].split()[1]).id
+    fingerprint = idempotency_keys.fingerprint("POST", "/api/subscriptions/subscribe", client.application.json.dumps(body).encode())
+    # a claim made by another worker, still running
+    now = datetime.now()
+    db.session.add(IdempotencyKey(user_id=user_id, idempotency_key="pending", fingerprint=fingerprint,
+                                  locked_until=now + timedelta(seconds=30), expires_at=now + timedelta(days=1)))
+    db.session.commit()
+
+    idempotency_keys.wait_timeout, idempotency_keys.poll_interval = 0.2, 0.05
+    try:
+        r = client.post("/api/subscriptions/subscribe", json=body, headers=headers)
+        assert r.status_code == 409 and r.headers["Retry-After"] == "1"
+        assert _subscriptions() == 0
+
+        # its worker died: once the lock times out the next duplicate runs the request
+        db.session.execute(IdempotencyKey.__table__.update().values(locked_until=now - timedelta(seconds=1)))
+        db.session.commit()
+        r = client.post("/api/subscriptions/subscribe", json=body, headers=headers)
+        assert r.status_code == 200 and "Idempotent-Replayed" not in r.headers
+        assert _subscriptions() == 1
+    finally:
+        idempotency_keys.wait_timeout, idempotency_keys.poll_interval = 10, 0.05
+
+
+@pytest.fixture
+def file_app(tmp_path):
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'idempotency.db'}",
+        "RESPONSE_CACHE_VERSIONS_FILE": str(tmp_path / "versions"),
+        "READ_YOUR_WRITES_FILE": str(tmp_path / "pins"),
+        "PASSWORD_HASH_WORKERS": 0,
+        "SCHEMA_CHECK": "off",
+        "TESTING": True,
+    })
+    with app.app_context():
+        migrations.upgrade(db.engine)
+        user = User(email="user@test.com", password="x")
+        db.session.add_all([user, SubscriptionPlan(name="Basic", description="Basic plan", price_cents=1000)])
+        db.session.commit()
+        token = AuthUtils.generate_token(user.id)
+        db.session.remove()
+        yield app, {"Authorization": f"Bearer {token}"}
+        db.session.remove()
+
+
+def test_concurrent_duplicates_run_once(file_app):
+    app, headers = file_app
+    inserts = []
+    with app.app_context():
+        engine = db.engine
+
+    def count_inserts(conn, cursor, statement, *args):
+        if statement.startswith("INSERT INTO subscriptions"):
+            inserts.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count_inserts)
+    responses = []
+
+    def retry():
+        r = app.test_client().post(
+            "/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30},
+            headers={**headers, "Idempotency-Key": "storm"},
+        )
+        responses.append((r.status_code, r.get_json()["data"]["id"]))
+
+    try:
+        threads = [threading.Thread(target=retry) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        event.remove(engine, "before_cursor_execute", count_inserts)
+    assert len(inserts) == 1
+    assert len(responses) == 8 and len(set(responses)) == 1 and responses[0][0] == 200
+
+
+def test_expired_keys_are_purged_in_batches(app):
+    now = datetime.now()
+    user_id = db.session.execute(select(User.id)).scalar()
+    db.session.add_all([
+        IdempotencyKey(user_id=user_id, idempotency_key=f"key-{i}", fingerprint="f", status_code=200, body="{}",
+                       locked_until=now, expires_at=now + timedelta(seconds=-1 if i < 5 else 60))
+        for i in range(7)
+    ])
+    db.session.commit()
+    assert idempotency_keys.purge(batch_size=2) == 5
+
+    # an expired key is not replayed, even before it is purged
+    db.session.execute(IdempotencyKey.__table__.update().values(expires_at=now - timedelta(seconds=1)))
+    db.session.commit()
+    assert idempotency_keys.begin(user_id, "key-5", "other").state == "claimed"
+    idempotency_keys.release(user_id, "key-5")
+
+    result = app.test_cli_runner().invoke(args=["idempotency-keys", "purge", "--batch-size", "10"])
+    assert "Deleted 1 expired idempotency keys." in result.output
+    assert db.session.execute(select(func.count()).select_from(IdempotencyKey)).scalar() == 0
@@ -0,0 +1,65 @@
+import json
+from datetime import datetime
+import pytest
+from flask.json.provider import DefaultJSONProvider
+from app.utils.json_provider import PROVIDERS, init_json_provider
+from app.utils.response import row_dicts
+from app import db
+
+PAYLOAD = {
+    "message": "ok",
+    "data": [{"id": 1, "name": "Café", "ends_at": datetime(2026, 11, 16, 21, 43, 49, 368124), "price": 9.5}],
+    "error": None,
+}
+
+
+def test_orjson_and_iso_providers_agree(app):
+    app.config["JSON_PROVIDER"] = "iso"
+    init_json_provider(app)
+    iso = app.json.dumps(PAYLOAD, separators=(",", ":"))
+    app.config["JSON_PROVIDER"] = "orjson"
+    init_json_provider(app)
+    fast = app.json.dumps(PAYLOAD, separators=(",", ":"))
+
+    assert json.loads(fast) == json.loads(iso)
+    assert json.loads(fast)["data"][0]["ends_at"] == "2026-11-16T21:43:49.368124"
+    # sorted keys, like Flask's provider, whatever the provider
+    assert fast.startswith('{"data":[{"ends_at"')
+    assert app.json.loads(fast) == json.loads(iso)
+
+    app.config["JSON_PROVIDER"] = "flask"
+    init_json_provider(app)
+    assert json.loads(app.json.dumps(PAYLOAD))["data"][0]["ends_at"] == "Mon, 16 Nov 2026 21:43:49 GMT"
+
+    app.config["JSON_PROVIDER"] = "yaml"
+    with pytest.raises(ValueError):
+        init_json_provider(app)
+
+
+def test_default_provider_keeps_the_jsonify_output(app):
+    # the wire format clients had before the providers were added
+    body = app.json.response(PAYLOAD).get_data()
+    assert body == DefaultJSONProvider(app).response(PAYLOAD).get_data() == (
+        b'{"data":[{"ends_at":"Mon, 16 Nov 2026 21:43:49 GMT","id":1,"name":"Caf\\u00e9","price":9.5}],'
+        b'"error":null,"message":"ok"}\n'
+    )
+
+
+@pytest.mark.parametrize("provider", sorted(PROVIDERS))
+def test_exports_match_under_every_provider(app, client, admin_headers, seed_active, provider):
+    app.config.update({"JSON_PROVIDER": provider, "EXPORT_BATCH_SIZE": 4})
+    init_json_provider(app)
+    seed_active(10)
+    headers = admin_headers
+
+    buffered = client.get("/api/subscriptions/active/all", headers=headers)
+    assert buffered.get_json() == client.get("/api/subscriptions/active/all?format=json-stream", headers=headers).get_json()
+    assert len(buffered.get_json()["data"]) == 10
+
+
+def test_row_dicts_matches_the_mappings(app, seed_active):
+    seed_active(3)
+    query = "SELECT id, user_id, status FROM subscriptions ORDER BY id"
+    rows = db.session.execute(db.text(query)).fetchall()
+    assert row_dicts(rows) == [dict(row) for row in db.session.execute(db.text(query)).mappings()]
+    assert row_dicts([]) == []
@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_metrics_exposes_route_counts_and_latency(client):
+    client.get("/api/subscriptions/plans")
+    client.get("/api/subscriptions/active")
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.content_type.startswith("text/plain")
+    body = r.get_data(as_text=True)
+    assert 'http_requests_total{method="GET",route="/api/subscriptions/plans",status="200"}' in body
+    assert 'http_requests_total{method="GET",route="/api/subscriptions/active",status="401"}' in body
+    assert 'http_request_duration_seconds_bucket{le="0.005",method="GET",route="/api/subscriptions/plans"}' in body
+
+
+def test_metrics_aggregate_across_worker_processes(tmp_path):
+    # two processes stand in for gunicorn workers sharing PROMETHEUS_MULTIPROC_DIR
+    metrics_dir = tmp_path / "prometheus"
+    metrics_dir.mkdir()
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(metrics_dir), DATABASE_URL=f"sqlite:///{tmp_path}/metrics.db")
+    worker = textwrap.dedent("""
+        import sys
+        from app import create_app
+        client = create_app().test_client()
+        for _ in range(3):
+            client.get("/api/subscriptions/plans")
+        if sys.argv[1] == "scrape":
+            sys.stdout.write(client.get("/metrics").get_data(as_text=True))
+    """)
+    # the deploy step, the workers only check the schema version
+    subprocess.run([sys.executable, "-m", "flask", "--app", "app", "db", "upgrade"], cwd=ROOT, env=env, capture_output=True, check=True)
+    for role in ("work", "work", "scrape"):
+        result = subprocess.run(
+            [sys.executable, "-c", worker, role], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+        )
+
+    line = 'http_requests_total{method="GET",route="/api/subscriptions/plans",status="200"}'
+    counts = [l for l in result.stdout.splitlines() if l.startswith(line)]
+    assert counts == [f"{line} 9.0"]
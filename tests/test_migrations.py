@@ -0,0 +1,73 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import inspect, text
+from app import create_app
+from app.extensions import db
+from app.models import Subscription
+from app.utils import migrations
+
+
+def _schema(conn, tables):
+    inspector = inspect(conn)
+    return {
+        table: (
+            {(column["name"], column["nullable"]) for column in inspector.get_columns(table)},
+            {(index["name"], tuple(index["column_names"])) for index in inspector.get_indexes(table)},
+        )
+        for table in tables
+    }
+
+
+def test_migrations_build_the_models_schema(app):
+    tables = sorted(db.metadata.tables)
+    with db.engine.connect() as conn:
+        migrated = _schema(conn, tables)
+        assert migrations.current_version(conn) == migrations.head()
+    db.drop_all(bind_key=None)
+    db.create_all(bind_key=None)
+    with db.engine.connect() as conn:
+        assert migrated == _schema(conn, tables)
+
+
+def test_upgrade_adopts_a_database_created_at_boot(app):
+    # a database of an older release, created by db.create_all() before current_subscriptions
+    # and token_version existed, holding an active subscription
+    now = datetime.now()
+    db.session.add(Subscription(user_id=1, plan_id=1, status="active", starts_at=now, ends_at=now + timedelta(days=30)))
+    db.session.commit()
+    with db.engine.begin() as conn:
+        migrations.version_table.drop(conn)
+        conn.execute(text("DROP TABLE current_subscriptions"))
+        conn.execute(text("ALTER TABLE users DROP COLUMN token_version"))
+
+    done = migrations.upgrade(db.engine)
+
+    assert [migration.version for migration in done] == [migration.version for migration in migrations.available()]
+    with db.engine.connect() as conn:
+        assert "token_version" in {column["name"] for column in inspect(conn).get_columns("users")}
+        assert conn.execute(text("SELECT user_id, plan_id, name FROM current_subscriptions")).all() == [(1, 1, "Basic")]
+    assert migrations.upgrade(db.engine) == []
+
+
+def test_startup_checks_the_schema_version(app, caplog):
+    with db.engine.begin() as conn:
+        conn.execute(migrations.version_table.delete().where(migrations.version_table.c.version == migrations.head()))
+
+    with pytest.raises(migrations.SchemaOutOfDate):
+        create_app({"SCHEMA_CHECK": "strict", "PASSWORD_HASH_WORKERS": 0})
+    create_app({"SCHEMA_CHECK": "warn", "PASSWORD_HASH_WORKERS": 0})
+    assert "flask db upgrade" in caplog.text
+
+    result = app.test_cli_runner().invoke(args=["db", "upgrade"])
+    assert result.exit_code == 0, result.output
+    create_app({"SCHEMA_CHECK": "strict", "PASSWORD_HASH_WORKERS": 0})
+
+
+def test_startup_does_not_create_tables(app):
+    db.drop_all(bind_key=None)
+    migrations.version_table.drop(db.engine)
+
+    create_app({"SCHEMA_CHECK": "off", "PASSWORD_HASH_WORKERS": 0})
+
+    with db.engine.connect() as conn:
+        assert inspect(conn).get_table_names() == []
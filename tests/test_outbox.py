@@ -0,0 +1,231 @@
+import hashlib
+import hmac
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import pytest
+from sqlalchemy import event as sa_event, func, insert, select
+from app.extensions import db, expiry_sweeper, outbox_dispatcher
+from app.models import OutboxEvent
+from app.utils.outbox import OutboxDispatcher
+from app.utils.outbox_sinks import FileSink, MemorySink, WebhookSink, create_sink
+
+
+def _types(events):
+    return [event["type"] for event in events]
+
+
+def test_writes_append_events_delivered_in_order(client, sink, subscriber):
+    headers = subscriber("user@test.com")
+    first = client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers=headers).get_json()["data"]
+    second = client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers=headers).get_json()["data"]
+    client.post("/api/subscriptions/change-plan", json={"plan_id": 2}, headers=headers)
+    client.post("/api/subscriptions/cancel", headers=headers)
+    # nothing was cancelled, nothing to tell
+    client.post("/api/subscriptions/cancel", headers=headers)
+    client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 1}, headers=headers)
+    expiry_sweeper.run(now=datetime.now() + timedelta(days=2))
+
+    report = outbox_dispatcher.run()
+    assert report.delivered == 6 and report.error is None
+    events = sink.drain()
+    assert _types(events) == [
+        "subscription.created", "subscription.created", "subscription.plan_changed",
+        "subscription.cancelled", "subscription.created", "subscription.expired",
+    ]
+    assert [event["id"] for event in events] == sorted(event["id"] for event in events)
+    assert (events[0]["subscription_id"], events[0]["data"]["replaced"]) == (first["id"], False)
+    assert (events[1]["subscription_id"], events[1]["data"]["replaced"]) == (second["id"], True)
+    assert events[2]["data"]["plan_name"] == "Pro" and events[2]["subscription_id"] == second["id"]
+    assert events[3]["subscription_id"] == second["id"]
+
+    state = outbox_dispatcher.status()
+    assert (state.last_event_id, state.pending, state.lag, state.lease_owner) == (events[-1]["id"], 0, 0.0, None)
+    assert outbox_dispatcher.run().delivered == 0
+
+
+def test_nothing_is_appended_without_a_sink(client, subscriber):
+    headers = subscriber("user@test.com")
+    client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers=headers)
+    client.post("/api/subscriptions/cancel", headers=headers)
+    assert db.session.execute(select(func.count()).select_from(OutboxEvent)).scalar() == 0
+
+
+def test_rolled_back_attempts_leave_no_event(client, sink, subscriber, racing):
+    headers = subscriber("user@test.com")
+    racing(1)
+    assert client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers=headers).status_code == 200
+    assert client.post("/api/subscriptions/change-plan", json={"plan_id": 9}, headers=headers).status_code == 404
+    outbox_dispatcher.run()
+    assert _types(sink.drain()) == ["subscription.created"]
+
+
+def test_cancelled_event_names_the_subscription_without_returning(client, sink, subscriber, monkeypatch):
+    # MySQL has no UPDATE ... RETURNING, the id comes from the current_subscriptions projection
+    monkeypatch.setattr(db.engine.dialect, "update_returning", False)
+    headers = subscriber("user@test.com")
+    created = client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers=headers).get_json()["data"]
+    client.post("/api/subscriptions/cancel", headers=headers)
+    outbox_dispatcher.run()
+    cancelled = sink.drain()[-1]
+    assert (cancelled["type"], cancelled["subscription_id"]) == ("subscription.cancelled", created["id"])
+
+
+class FlakySink(MemorySink):
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def deliver(self, events):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("sink unavailable")
+        super().deliver(events)
+
+
+def test_failed_batches_are_retried_after_a_backoff(client, sink, subscriber):
+    headers = subscriber("user@test.com")
+    client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers=headers)
+    outbox_dispatcher.sink = flaky = FlakySink(failures=2)
+
+    report = outbox_dispatcher.run()
+    assert report.delivered == 0 and "sink unavailable" in report.error
+    state = outbox_dispatcher.status()
+    assert (state.last_event_id, state.pending, state.attempts) == (0, 1, 1)
+    # still backing off
+    assert outbox_dispatcher.dispatch_batch().delivered == 0 and flaky.failures == 1
+
+    later = datetime.now() + timedelta(seconds=outbox_dispatcher.max_backoff)
+    assert outbox_dispatcher.dispatch_batch(now=later).error
+    assert outbox_dispatcher.status().attempts == 2
+    assert outbox_dispatcher.dispatch_batch(now=later + timedelta(seconds=outbox_dispatcher.max_backoff)).delivered == 1
+    assert _types(flaky.drain()) == ["subscription.created"]
+    state = outbox_dispatcher.status()
+    assert (state.pending, state.attempts, state.last_error) == (0, 0, None)
+
+
+def test_only_the_lease_holder_delivers(client, sink, subscriber):
+    headers = subscriber("user@test.com")
+    client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers=headers)
+    other = OutboxDispatcher()
+    other.sink = MemorySink()
+
+    # the first dispatcher holds the lease between its batches
+    assert outbox_dispatcher.dispatch_batch().delivered == 1
+    client.post("/api/subscriptions/cancel", headers=headers)
+    assert other.dispatch_batch().delivered == 0
+    # until it lapses
+    later = datetime.now() + timedelta(seconds=outbox_dispatcher.lease_seconds + 1)
+    assert other.dispatch_batch(now=later).delivered == 1
+    assert _types(sink.drain()) == ["subscription.created"]
+    assert _types(other.sink.drain()) == ["subscription.cancelled"]
+
+
+def test_batches_stop_before_ids_that_may_still_commit(app, sink, caplog):
+    now = datetime.now()
+    event = {"event_type": "subscription.cancelled", "user_id": 1, "payload": "{}"}
+    db.session.execute(insert(OutboxEvent), [
+        {**event, "id": 1, "created_at": now - timedelta(minutes=1)},
+        # id 2 was allocated by a transaction that has not committed yet, or rolled back
+        {**event, "id": 3, "created_at": now},
+    ])
+    db.session.commit()
+    assert outbox_dispatcher.dispatch_batch(now=now).delivered == 1
+    assert outbox_dispatcher.dispatch_batch(now=now).delivered == 0
+    # once the gap is older than OUTBOX_GAP_TIMEOUT the missing id is skipped, and watched
+    later = now + timedelta(seconds=outbox_dispatcher.gap_timeout)
+    with caplog.at_level(logging.WARNING, logger="app.utils.outbox"):
+        assert outbox_dispatcher.dispatch_batch(now=later).delivered == 1
+    assert "outbox events 2-2 of 'default' still missing" in caplog.text
+    assert [e["id"] for e in sink.drain()] == [1, 3]
+    state = outbox_dispatcher.status()
+    assert (state.last_event_id, state.pending, state.gaps) == (3, 0, 1)
+
+    # a slow transaction commits it after all: it is delivered late, and only once
+    db.session.execute(insert(OutboxEvent), [{**event, "id": 2, "created_at": now}])
+    db.session.commit()
+    assert outbox_dispatcher.status().pending == 1
+    assert outbox_dispatcher.dispatch_batch(now=later).delivered == 1
+    assert [e["id"] for e in sink.drain()] == [2]
+    assert outbox_dispatcher.dispatch_batch(now=later).delivered == 0
+    state = outbox_dispatcher.status()
+    assert (state.last_event_id, state.pending, state.gaps) == (3, 0, 0)
+
+
+def test_gaps_are_checked_again_before_they_are_skipped(app, sink):
+    now = datetime.now()
+    event = {"event_type": "subscription.cancelled", "user_id": 1, "payload": "{}"}
+    db.session.execute(insert(OutboxEvent), [{**event, "id": 1, "created_at": now}, {**event, "id": 3, "created_at": now}])
+    db.session.commit()
+
+    def commit_late(conn, cursor, statement, parameters, context, executemany):
+        # id 2 commits between the read of the batch and the check of its gap
+        if "BETWEEN" in statement:
+            cursor.execute("INSERT INTO outbox_events (id, event_type, user_id, payload, created_at) VALUES (2, 'subscription.cancelled', 1, '{}', ?)", (str(now),))
+
+    later = now + timedelta(seconds=outbox_dispatcher.gap_timeout)
+    sa_event.listen(db.engine, "before_cursor_execute", commit_late)
+    try:
+        assert outbox_dispatcher.dispatch_batch(now=later).delivered == 1
+    finally:
+        sa_event.remove(db.engine, "before_cursor_execute", commit_late)
+    assert outbox_dispatcher.dispatch_batch(now=later).delivered == 2
+    assert [e["id"] for e in sink.drain()] == [1, 2, 3]
+    assert outbox_dispatcher.status().gaps == 0
+
+
+def test_file_sink_and_cli(app, client, tmp_path, subscriber):
+    path = tmp_path / "events.jsonl"
+    outbox_dispatcher.sink = create_sink(f"file://{path}")
+    assert isinstance(outbox_dispatcher.sink, FileSink)
+    try:
+        headers = subscriber("user@test.com")
+        for _ in range(3):
+            client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers=headers)
+        runner = app.test_cli_runner()
+        assert "3 pending" in runner.invoke(args=["outbox", "status"]).output
+        result = runner.invoke(args=["outbox", "dispatch"])
+        assert "Delivered 3 events in 1 batches" in result.output
+        lines = [json.loads(line) for line in path.read_text().splitlines()]
+        assert [line["type"] for line in lines] == ["subscription.created"] * 3
+
+        # delivered events are kept OUTBOX_RETENTION seconds, undelivered ones until delivered
+        client.post("/api/subscriptions/cancel", headers=headers)
+        outbox_dispatcher.retention = 0
+        assert "Deleted 3 outbox events." in runner.invoke(args=["outbox", "purge"]).output
+        assert db.session.execute(select(func.count()).select_from(OutboxEvent)).scalar() == 1
+    finally:
+        outbox_dispatcher.sink = None
+        outbox_dispatcher.retention = 7 * 86400
+    assert "set OUTBOX_SINK" in app.test_cli_runner().invoke(args=["outbox", "dispatch"]).output
+
+
+def test_webhook_sink_signs_and_raises_on_errors():
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            received.append((self.headers["X-Outbox-Signature"], body))
+            self.send_response(503 if len(received) > 1 else 204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        webhook = create_sink(f"http://127.0.0.1:{server.server_port}/events", secret="s3cret", timeout=5)
+        assert isinstance(webhook, WebhookSink)
+        webhook.deliver([{"id": 1, "type": "subscription.cancelled"}])
+        signature, body = received[0]
+        assert json.loads(body) == {"events": [{"id": 1, "type": "subscription.cancelled"}]}
+        assert signature == "sha256=" + hmac.new(b"s3cret", body, hashlib.sha256).hexdigest()
+        with pytest.raises(RuntimeError, match="503"):
+            webhook.deliver([{"id": 2}])
+    finally:
+        server.shutdown()
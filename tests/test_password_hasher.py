@@ -0,0 +1,69 @@
+import os
+import signal
+import threading
+from app import db
+from app.extensions import password_hasher
+from app.models import User
+from app.utils.password_hasher import PasswordHasher
+
+
+def test_login_upgrades_outdated_hashes(app, client):
+    admin = db.session.query(User).filter_by(email="admin@test.com").first()
+    old_hash = admin.password
+    assert not admin.password_needs_rehash()
+
+    password_hasher.method = "pbkdf2:sha256:2000"
+    password_hasher._method_prefix = None
+    assert admin.password_needs_rehash()
+
+    r = client.post("/api/login", json={"email": "admin@test.com", "password": "password"})
+    assert r.status_code == 200
+    db.session.refresh(admin)
+    assert admin.password != old_hash
+    assert admin.password.startswith("pbkdf2:sha256:2000$")
+
+    # the upgraded hash still verifies and is not rewritten again
+    r = client.post("/api/login", json={"email": "admin@test.com", "password": "password"})
+    assert r.status_code == 200
+    assert not admin.password_needs_rehash()
+
+
+def test_hashes_run_on_the_process_pool():
+    hasher = PasswordHasher(method="pbkdf2:sha256:1000", workers=1)
+    try:
+        pwhash = hasher.hash("secret")
+        assert hasher._executor is not None
+        assert hasher.verify(pwhash, "secret")
+        assert not hasher.verify(pwhash, "wrong")
+    finally:
+        hasher.shutdown()
+
+
+def test_logins_are_shed_when_every_slot_is_busy(app, client):
+    password_hasher._slots = threading.BoundedSemaphore(1)
+    password_hasher.workers = 1
+    password_hasher.queue_timeout = 0.01
+    password_hasher._slots.acquire()
+    try:
+        r = client.post("/api/login", json={"email": "admin@test.com", "password": "password"})
+    finally:
+        password_hasher._slots.release()
+        password_hasher.shutdown()
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "1"
+
+
+def test_the_pool_is_replaced_when_a_worker_dies():
+    hasher = PasswordHasher(method="pbkdf2:sha256:1000", workers=1)
+    try:
+        pwhash = hasher.hash("secret")
+        broken = hasher._executor
+        for process in list(broken._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+            process.join()
+
+        assert hasher.verify(pwhash, "secret")
+        assert hasher._executor is not broken
+        assert hasher.verify(hasher.hash("other"), "other")
+    finally:
+        hasher.shutdown()
@@ -0,0 +1,35 @@
+from app.utils.plan_catalog import PlanCatalog
+
+
+def test_list_plans_etag_and_invalidation(client, admin_headers):
+    r = client.get("/api/subscriptions/plans")
+    assert r.status_code == 200
+    etag = r.headers["ETag"]
+    assert [plan["name"] for plan in r.get_json()["data"]] == ["Basic", "Pro"]
+
+    r = client.get("/api/subscriptions/plans", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.data == b""
+
+    r = client.post(
+        "/api/subscriptions/plans",
+        json={"name": "Team", "description": "Team plan", "price_cents": 5000},
+        headers=admin_headers,
+    )
+    assert r.status_code == 201
+
+    r = client.get("/api/subscriptions/plans", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+    assert [plan["name"] for plan in r.get_json()["data"]] == ["Basic", "Pro", "Team"]
+
+
+def test_invalidation_reaches_other_workers(app):
+    # a second catalog sharing the version file stands in for another gunicorn worker
+    other_worker = PlanCatalog(version_file=app.extensions["plan_catalog"].version_file)
+    with app.test_request_context():
+        before = other_worker.snapshot()
+        assert other_worker.snapshot() is before
+
+        app.extensions["plan_catalog"].invalidate()
+        assert other_worker.snapshot() is not before
@@ -0,0 +1,47 @@
+from app import db
+
+
+def test_every_route_declares_a_query_budget(app):
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint != "static":
+            view = app.view_functions[rule.endpoint]
+            assert isinstance(getattr(view, "query_budget", None), int), rule.endpoint
+
+
+def test_write_paths_use_a_fixed_number_of_statements(client, count_statements, sink):
+    r = client.post("/api/register", json={"email": "user@test.com", "password": "password"})
+    headers = {"Authorization": f"Bearer {r.get_json()['data']['token']}"}
+    # warm the principal cache and the plan catalog
+    client.get("/api/subscriptions/plans")
+    client.get("/api/subscriptions/active", headers=headers)
+
+    with count_statements() as statements:
+        r = client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers=headers)
+    assert r.get_json()["data"]["plan"]["name"] == "Basic"
+    # plus the two rollup upserts (app/utils/rollups.py) and the outbox event (app/utils/outbox.py)
+    assert len(statements) == 6
+
+    with count_statements() as statements:
+        r = client.post("/api/subscriptions/change-plan", json={"plan_id": 2}, headers=headers)
+    assert r.get_json()["data"]["plan"]["id"] == 2
+    assert len(statements) == (5 if db.engine.dialect.update_returning else 6)
+
+    with count_statements() as statements:
+        client.post("/api/subscriptions/cancel", headers=headers)
+    assert len(statements) == 5
+
+    r = client.post("/api/subscriptions/change-plan", json={"plan_id": 2}, headers=headers)
+    assert r.status_code == 400
+
+
+def test_change_plan_without_returning(client, monkeypatch):
+    # MySQL has no UPDATE ... RETURNING, the row is read back with a SELECT instead
+    monkeypatch.setattr(db.engine.dialect, "update_returning", False)
+    r = client.post("/api/register", json={"email": "user@test.com", "password": "password"})
+    headers = {"Authorization": f"Bearer {r.get_json()['data']['token']}"}
+    client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers=headers)
+
+    r = client.post("/api/subscriptions/change-plan", json={"plan_id": 2}, headers=headers)
+    assert r.status_code == 200
+    assert r.get_json()["data"]["plan"]["id"] == 2
+    assert r.get_json()["data"]["status"] == "active"
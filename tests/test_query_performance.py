@@ -1,66 +1,26 @@
-import time
-from sqlalchemy import text
+from sqlalchemy import select
 from app import db
-from app.models import User, SubscriptionPlan, Subscription
-from datetime import datetime, timedelta
-
-def test_bulk_vs_naive(app):
-    with app.app_context():
-        p = SubscriptionPlan.query.first()
-
-        # create users + subs
-        users = []
-        for i in range(500):
-            u = User(email=f"user{i}@example.com")
-            u.set_password("x")
-            db.session.add(u)
-            users.append(u)
-        db.session.commit()
-
-        subs = [
-            Subscription(
-                user_id=u.id,
-                plan_id=p.id,
-                status="active",
-                starts_at=datetime.now(),
-                ends_at=datetime.now() + timedelta(days=30),
-            )
-            for u in users
-        ]
-        db.session.add_all(subs)
-        db.session.commit()
-
-        ids = [u.id for u in users]
-
-        # naive: N queries
-        start = time.time()
-        results_naive = []
-        for uid in ids:
-            query = text("SELECT * FROM subscriptions WHERE user_id = :uid AND status = 'active'")
-            row = db.session.execute(query, {"uid": uid}).fetchall()
-            results_naive.append(row)
-        naive_t = time.time() - start
-
-        # bulk: 1 query
-        start = time.time()
-        query_str = """
-            SELECT s.user_id, s.id, p.name, p.description, p.id as plan_id,
-                   s.starts_at, s.ends_at, s.status
-            FROM subscriptions s
-            JOIN plans p ON p.id = s.plan_id
-            WHERE s.status = 'active'
-            AND (s.ends_at IS NULL OR s.ends_at > :now)
-        """
-        params = {"now": datetime.now()}
-        placeholders = ", ".join(f":uid{i}" for i in range(len(ids)))
-        query_str += f" AND s.user_id IN ({placeholders})"
-        for i, uid in enumerate(ids):
-            params[f"uid{i}"] = uid
-
-        query = text(query_str)
-        subscriptions = db.session.execute(query, params).mappings().fetchall()
-        results_bulk = [dict(subscription) for subscription in subscriptions]
-        bulk_t = time.time() - start
-
-        assert len(results_bulk) == len(ids)
-        assert bulk_t * 5 < naive_t
+from app.models import User
+
+
+def test_bulk_vs_naive(app, client, admin_headers, seed_active, count_statements):
+    """
+    the batch lookup answers for any number of users, up to a chunk, with the same statements
+    where a naive loop needs one per user. statement counts are compared instead of timings,
+    which depend on the machine (latency numbers come from python -m benchmarks.run_suite)
+    """
+    app.config["BATCH_LOOKUP_CHUNK_SIZE"] = 500
+    seed_active(500)
+    ids = db.session.execute(select(User.id).where(User.is_admin.is_(False)).order_by(User.id)).scalars().all()
+
+    # warm the principal cache, so that only the lookup itself is counted
+    client.post("/api/subscriptions/active/batch", json={"user_ids": ids[:1]}, headers=admin_headers)
+    counts = {}
+    for size in (1, 10, 500):
+        with count_statements() as statements:
+            r = client.post("/api/subscriptions/active/batch", json={"user_ids": ids[:size]}, headers=admin_headers)
+        assert r.status_code == 200
+        assert sorted(row["user_id"] for row in r.get_json()["data"]) == ids[:size]
+        counts[size] = len(statements)
+
+    assert counts[1] == counts[10] == counts[500] == 1
@@ -0,0 +1,42 @@
+from sqlalchemy import text
+from app.utils import seed_data
+from app.utils.query_plans import check_all, check_statement
+from app.utils.statement_registry import RegisteredStatement
+
+
+def _report(checks):
+    lines = []
+    for check in checks:
+        if not check.ok:
+            lines.append(f"{check.name}: {check.sql}")
+            lines += [f"  {finding.kind} on {finding.table}: {finding.detail}" for finding in check.failures]
+            lines += [f"  suggestion: {suggestion}" for suggestion in check.suggestions]
+    return "\n".join(lines)
+
+
+def test_registered_statements_use_indexes(app):
+    seed_data.seed(500, plans=3, chunk_size=250, password_hash="x")
+
+    checks = check_all(analyze=True)
+    assert {"subscriptions.history_page", "subscriptions.all_active", "expiry.lapsed"} <= {c.name for c in checks}
+    assert all(check.ok for check in checks), _report(checks)
+
+    # the statements built from the configuration are checked in both variants
+    app.config["SUBSCRIPTION_STATUS_AUTHORITATIVE"] = True
+    checks = check_all()
+    assert all(check.ok for check in checks), _report(checks)
+
+
+def test_scans_and_temp_sorts_are_reported_with_an_index(app):
+    statement = RegisteredStatement(
+        "bad", text("SELECT s.id FROM subscriptions s WHERE s.plan_id = :plan_id ORDER BY s.ends_at DESC"),
+        {"plan_id": 1}, frozenset(),
+    )
+    check = check_statement(statement)
+    assert {finding.kind for finding in check.failures} == {"scan", "temp_btree"}
+    assert check.suggestions == [
+        "CREATE INDEX idx_subscriptions_plan_id_ends_at ON subscriptions (plan_id, ends_at)"
+    ]
+
+    allowed = check_statement(statement._replace(allow=frozenset({"scan", "temp_btree"})))
+    assert allowed.ok and allowed.suggestions == []
@@ -0,0 +1,72 @@
+import sqlite3
+import time
+import pytest
+from app import create_app
+from app.extensions import db
+from app.models import SubscriptionPlan, User
+from app.utils import migrations
+from app.utils.auth_utils import AuthUtils
+
+
+def replicate(primary, replica):
+    # stands in for replication catching up: the replica becomes a copy of the primary
+    with sqlite3.connect(primary) as source, sqlite3.connect(replica) as target:
+        source.backup(target)
+
+
+@pytest.fixture
+def replicated(tmp_path):
+    primary, replica = tmp_path / "primary.db", tmp_path / "replica.db"
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{primary}",
+        "SQLALCHEMY_BINDS": {"replica": f"sqlite:///{replica}"},
+        "READ_YOUR_WRITES_SECONDS": 0.3,
+        "READ_YOUR_WRITES_FILE": str(tmp_path / "pins"),
+        # the response cache would keep serving what the writer read from the primary
+        "RESPONSE_CACHE_TTL": 0,
+        "RESPONSE_CACHE_VERSIONS_FILE": str(tmp_path / "versions"),
+        "PASSWORD_HASH_WORKERS": 0,
+        "SCHEMA_CHECK": "off",
+        "TESTING": True,
+        "QUERY_BUDGET_ENFORCE": True,
+    })
+    with app.app_context():
+        migrations.upgrade(db.engine)
+        users = [User(email=f"user{i}@test.com", password="x") for i in range(2)]
+        db.session.add_all(users + [SubscriptionPlan(name="Basic", description="Basic plan", price_cents=1000)])
+        db.session.commit()
+        tokens = [{"Authorization": f"Bearer {AuthUtils.generate_token(user.id)}"} for user in users]
+        db.session.remove()
+        replicate(primary, replica)
+        yield app.test_client(), tokens, lambda: replicate(primary, replica)
+        db.session.remove()
+
+
+def test_reads_go_to_the_replica_and_writers_read_their_writes(replicated):
+    client, (writer, other), catch_up = replicated
+
+    assert client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers=writer).status_code == 200
+
+    # the replica has not seen the subscription yet, the writer is pinned to the primary
+    assert client.get("/api/subscriptions/active", headers=writer).get_json()["data"]["name"] == "Basic"
+    assert client.get("/api/subscriptions/history", headers=writer).get_json()["data"]
+    # once the window is over the writer reads the (lagging) replica like everybody else
+    time.sleep(0.35)
+    assert client.get("/api/subscriptions/active", headers=writer).get_json()["data"] is None
+
+    catch_up()
+    assert client.get("/api/subscriptions/active", headers=writer).get_json()["data"]["name"] == "Basic"
+    assert client.get("/api/subscriptions/active", headers=other).get_json()["data"] is None
+
+
+def test_writes_and_pins_go_to_the_primary(replicated):
+    client, (writer, _), _ = replicated
+
+    client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers=writer)
+    time.sleep(0.35)
+    # cancel runs on the primary even though the replica has no active subscription
+    assert client.post("/api/subscriptions/cancel", headers=writer).status_code == 200
+    with db.engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT status FROM subscriptions").scalar() == "cancelled"
+    with db.engines["replica"].connect() as conn:
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM subscriptions").scalar() == 0
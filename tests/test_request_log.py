@@ -0,0 +1,24 @@
+import json
+from app import create_app
+
+
+def test_requests_are_logged_without_passwords(app, tmp_path):
+    path = tmp_path / "requests.log"
+    logged = create_app({
+        "REQUEST_LOG_PATH": str(path),
+        "PASSWORD_HASH_WORKERS": 0,
+        "PASSWORD_HASH_METHOD": "pbkdf2:sha256:1000",
+    })
+    client = logged.test_client()
+
+    data = client.post("/api/register", json={"email": "user@test.com", "password": "password"}).get_json()["data"]
+    headers = {"Authorization": f"Bearer {data['token']}"}
+    client.get("/api/subscriptions/history?page_size=5", headers=headers)
+
+    register, history = [json.loads(line) for line in path.read_text().splitlines()]
+    assert register["method"] == "POST" and register["path"] == "/api/register"
+    assert register["json"] == {"email": "user@test.com", "password": None}
+    assert register["user_id"] is None and register["status"] == 201
+    assert history["path"] == "/api/subscriptions/history" and history["query"] == "page_size=5"
+    assert history["user_id"] == data["user_id"] and history["json"] is None
+    assert history["duration_ms"] >= 0
@@ -0,0 +1,84 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from app import db
+from app.extensions import expiry_sweeper, response_cache
+from app.models import Subscription
+from app.utils.response_cache import UserResponseCache
+
+
+def _register(client, email="user@test.com"):
+    r = client.post("/api/register", json={"email": email, "password": "password"})
+    return {"Authorization": f"Bearer {r.get_json()['data']['token']}"}
+
+
+def test_polling_is_served_from_the_cache_until_the_user_writes(client, count_statements):
+    headers = _register(client)
+    client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers=headers)
+
+    first = client.get("/api/subscriptions/active", headers=headers)
+    assert first.get_json()["data"]["name"] == "Basic"
+    client.get("/api/subscriptions/history", headers=headers)
+    with count_statements() as statements:
+        again = client.get("/api/subscriptions/active", headers=headers)
+        history = client.get("/api/subscriptions/history", headers=headers)
+    assert statements == []
+    assert again.data == first.data
+    assert len(history.get_json()["data"]) == 1
+    assert client.get("/api/subscriptions/active", headers={**headers, "If-None-Match": first.headers["ETag"]}).status_code == 304
+
+    client.post("/api/subscriptions/change-plan", json={"plan_id": 2}, headers=headers)
+    assert client.get("/api/subscriptions/active", headers=headers).get_json()["data"]["name"] == "Pro"
+    client.post("/api/subscriptions/cancel", headers=headers)
+    assert client.get("/api/subscriptions/active", headers=headers).get_json()["data"] is None
+    assert client.get("/api/subscriptions/history", headers=headers).get_json()["data"][0]["status"] == "cancelled"
+
+
+def test_the_sweeper_invalidates_the_users_it_expires(app, client):
+    app.config["SUBSCRIPTION_STATUS_AUTHORITATIVE"] = True
+    headers = _register(client)
+    client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers=headers)
+    assert client.get("/api/subscriptions/active", headers=headers).get_json()["data"] is not None
+
+    db.session.query(Subscription).update({"ends_at": datetime.now() - timedelta(days=1)})
+    db.session.commit()
+    expiry_sweeper.run(batch_size=10)
+    assert client.get("/api/subscriptions/active", headers=headers).get_json()["data"] is None
+
+
+def test_entries_end_at_the_given_expiry_and_within_the_byte_bound(app):
+    cache = UserResponseCache(max_bytes=3 * (100 + 256), ttl=60)
+    cache._versions = response_cache._versions
+    cache.invalidate(1, 2, 3, 4)
+
+    assert cache.get_or_load(1, "active", lambda: ("x" * 100, datetime.now() - timedelta(seconds=1))).body
+    assert cache.stats()["entries"] == 0
+    for user_id in (1, 2, 3):
+        cache.get_or_load(user_id, "active", lambda: ("x" * 100, None))
+    cache.get_or_load(1, "active", lambda: ("y", None))
+    cache.get_or_load(4, "active", lambda: ("x" * 100, None))
+    # user 2 was the least recently used
+    stats = cache.stats()
+    assert stats["entries"] == 3 and stats["bytes"] <= cache.max_bytes
+    assert cache.get_or_load(2, "active", lambda: ("reloaded", None)).body == "reloaded"
+    assert stats["hits"] == 1 and 0 < stats["hit_rate"] < 1
+
+
+def test_concurrent_misses_load_once(app):
+    calls = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.1)
+        return "body", None
+
+    response_cache.invalidate(42)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(response_cache.get_or_load(42, "active", load))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert len({r.etag for r in results}) == 1 and len(results) == 8
+    assert response_cache.stats()["coalesced"] == 7
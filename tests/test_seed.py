@@ -0,0 +1,41 @@
+from datetime import datetime
+from sqlalchemy import func, select
+from app import db
+from app.models import Subscription, SubscriptionPlan, User
+from app.utils import current_subscriptions, rollups
+from app.utils.seed_data import generate_chunk
+
+
+def test_seed_command_builds_consistent_histories(app, client):
+    result = app.test_cli_runner().invoke(args=["seed", "--users", "300", "--plans", "3", "--chunk-size", "100", "--workers", "1"])
+    assert result.exit_code == 0, result.output
+    assert "Seeded 300 users" in result.output
+    assert "rows/s" in result.output
+
+    assert db.session.query(User).count() == 301
+    assert db.session.query(SubscriptionPlan).count() == 3
+    statuses = dict(db.session.execute(select(Subscription.status, func.count()).group_by(Subscription.status)).all())
+    assert set(statuses) == {"active", "cancelled", "expired"}
+    # at most one active subscription per user, and the projection matches it
+    assert db.session.execute(
+        select(Subscription.user_id).where(Subscription.status == "active")
+        .group_by(Subscription.user_id).having(func.count() > 1)
+    ).first() is None
+    report = current_subscriptions.verify()
+    assert report.checked == statuses["active"]
+    assert (report.missing, report.stale, report.extra) == ([], [], [])
+    report = rollups.verify()
+    assert report.plans == 3 and report.days > 0
+    assert (report.stale_plans, report.stale_days) == ([], [])
+
+    # seeded users can log in with the shared password
+    r = client.post("/api/login", json={"email": "user2@seed.example.com", "password": "password"})
+    assert r.status_code == 200
+
+
+def test_chunks_are_deterministic():
+    plans = [(1, "Basic", "Basic plan"), (2, "Pro", "Pro plan")]
+    options = {"active_ratio": 0.6, "lapsed_ratio": 0.02, "switch_ratio": 0.3, "history_alpha": 1.5, "max_history": 50}
+    args = (7, 3, 1001, 50, plans, options, datetime(2025, 1, 1), "hash", "sqlite://")
+    assert generate_chunk(args) == generate_chunk(args)
+    assert generate_chunk(args) != generate_chunk((8,) + args[1:])
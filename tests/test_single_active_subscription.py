@@ -0,0 +1,134 @@
+import threading
+import time
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.exc import IntegrityError
+from app import create_app
+from app.extensions import db
+from app.models import CurrentSubscription, Subscription, SubscriptionPlan, User
+from app.utils import current_subscriptions, migrations, rollups
+from app.utils.auth_utils import AuthUtils
+
+
+def _active(user_id):
+    return db.session.execute(
+        select(Subscription.id, Subscription.plan_id).where(Subscription.user_id == user_id, Subscription.status == "active")
+    ).all()
+
+
+def test_the_database_rejects_a_second_active_subscription(app):
+    now = datetime.now()
+    db.session.add(Subscription(user_id=1, plan_id=1, status="active", starts_at=now, ends_at=now + timedelta(days=30)))
+    db.session.commit()
+    db.session.add(Subscription(user_id=1, plan_id=2, status="active", starts_at=now, ends_at=now + timedelta(days=30)))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+    # any number of inactive ones
+    db.session.add_all([
+        Subscription(user_id=1, plan_id=2, status=status, starts_at=now, ends_at=now)
+        for status in ("cancelled", "cancelled", "expired")
+    ])
+    db.session.commit()
+
+
+def test_subscribe_retries_when_it_loses_the_race(client, subscriber, racing):
+    headers = subscriber("user@test.com")
+    user_id = db.session.execute(select(User.id).where(User.email == "user@test.com")).scalar()
+    client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers=headers)
+
+    racing(2)
+    r = client.post("/api/subscriptions/subscribe", json={"plan_id": 2, "duration_days": 30}, headers=headers)
+    assert r.status_code == 200
+    before = _active(user_id)
+    assert before == [(r.get_json()["data"]["id"], 2)]
+
+    # the retries are bounded, the previous subscription is left untouched
+    racing(client.application.config["SUBSCRIBE_CONFLICT_RETRIES"] + 1)
+    r = client.post("/api/subscriptions/subscribe", json={"plan_id": 1, "duration_days": 30}, headers=headers)
+    assert r.status_code == 409
+    assert _active(user_id) == before
+    assert current_subscriptions.verify().stale == []
+
+
+def test_migration_keeps_the_latest_active_subscription(app):
+    now = datetime.now()
+    with db.engine.begin() as conn:
+        conn.execute(text("DROP INDEX uq_subscriptions_active_user_id"))
+        conn.execute(text("ALTER TABLE subscriptions DROP COLUMN active_user_id"))
+        conn.execute(migrations.version_table.delete().where(migrations.version_table.c.version >= 8))
+        for days, plan_id in ((-2, 1), (-1, 2), (-3, 1)):
+            conn.execute(
+                text("INSERT INTO subscriptions (user_id, plan_id, status, starts_at, ends_at) VALUES (1, :plan_id, 'active', :starts_at, :ends_at)"),
+                {"plan_id": plan_id, "starts_at": now + timedelta(days=days), "ends_at": now + timedelta(days=30)},
+            )
+    migrations.upgrade(db.engine)
+
+    assert [plan_id for _, plan_id in _active(1)] == [2]
+    ends = db.session.execute(text("SELECT ends_at FROM subscriptions WHERE status = 'cancelled'")).scalars().all()
+    assert set(ends) == {str(now + timedelta(days=-1))}
+
+
+@pytest.fixture
+def file_app(tmp_path):
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'race.db'}",
+        "RESPONSE_CACHE_VERSIONS_FILE": str(tmp_path / "versions"),
+        "READ_YOUR_WRITES_FILE": str(tmp_path / "pins"),
+        "PASSWORD_HASH_WORKERS": 0,
+        "SCHEMA_CHECK": "off",
+        "TESTING": True,
+        "QUERY_BUDGET_ENFORCE": True,
+    })
+    with app.app_context():
+        migrations.upgrade(db.engine)
+        user = User(email="user@test.com", password="x")
+        db.session.add_all([user] + [
+            SubscriptionPlan(name=name, description=f"{name} plan", price_cents=price)
+            for name, price in (("Basic", 1000), ("Pro", 2000))
+        ])
+        db.session.commit()
+        token = AuthUtils.generate_token(user.id)
+        db.session.remove()
+        yield app, user.id, {"Authorization": f"Bearer {token}"}
+        db.session.remove()
+
+
+def test_concurrent_writes_keep_one_active_subscription(file_app):
+    app, user_id, headers = file_app
+    threads, rounds = 8, 25
+    statuses = []
+
+    def hammer(worker):
+        client = app.test_client()
+        for i in range(rounds):
+            if (worker + i) % 2:
+                r = client.post("/api/subscriptions/subscribe", json={"plan_id": 1 + i % 2, "duration_days": 30}, headers=headers)
+            else:
+                r = client.post("/api/subscriptions/change-plan", json={"plan_id": 2 - i % 2}, headers=headers)
+            statuses.append(r.status_code)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=hammer, args=(worker,)) for worker in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    # change-plan may only run before the first subscribe committed
+    assert len(statuses) == threads * rounds
+    assert set(statuses) <= {200, 400}
+    assert statuses.count(200) > threads * rounds * 0.9
+    # no lock convoy: a few hundred writes per second on SQLite, even on one CPU
+    assert threads * rounds / elapsed > 50
+
+    with app.app_context():
+        active = _active(user_id)
+        assert len(active) == 1
+        current = db.session.get(CurrentSubscription, user_id)
+        assert (current.subscription_id, current.plan_id) == active[0]
+        report = rollups.verify()
+        assert (report.stale_plans, report.stale_days) == ([], [])
+        assert current_subscriptions.verify() == (1, [], [], [])